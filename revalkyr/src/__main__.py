@@ -1,5 +1,4 @@
 import argparse
-import os
 import subprocess
 import time
 import sys
@@ -7,12 +6,12 @@ import sys
 from pathlib import Path
 
 
-from . import services
-
 from .config import Config, load_config
-from .context import Context
-from .plugins import PluginResult
-from .services.service_mgr import ServiceMgr
+from .project import Project
+from .services.session_store import SESSION_DIRNAME, SESSION_FILENAME
+from .shared import SharedResources
+
+TESTS_DIR = Path(__file__).resolve().parents[2].joinpath("tests")
 
 
 def parse_args():
@@ -21,8 +20,31 @@ def parse_args():
     parser.add_argument(
         "-c",
         "--config",
-        default="revalkyr.yaml",
-        help="Specify the configuration file. Default i 'revalkyr.yaml'.",
+        action="append",
+        help="Specify the configuration file. Default i 'revalkyr.yaml'. Can be given several times in daemon mode.",
+    )
+
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep serving all configured projects from this process.",
+    )
+
+    parser.add_argument(
+        "--ai-backend",
+        choices=["live", "record", "replay"],
+        help="Override the AI backend. 'replay' answers from a recording without calling the AI.",
+    )
+
+    parser.add_argument(
+        "--ai-recording",
+        help="Override the file AI responses are recorded to or replayed from.",
+    )
+
+    parser.add_argument(
+        "--ai-latency",
+        type=float,
+        help="Seconds the replay backend waits before each response.",
     )
 
     parser.add_argument(
@@ -41,35 +63,50 @@ def parse_args():
     return args
 
 
-def run_test(test_dir, clean):
+def load_configs(config_files, args) -> list[Config]:
+    configs = [load_config(config_file) for config_file in config_files]
+
+    for config in configs:
+        if args.ai_backend is not None:
+            config.ai_backend = args.ai_backend
+        if args.ai_recording is not None:
+            config.ai_recording = Path(args.ai_recording).resolve()
+        if args.ai_latency is not None:
+            config.ai_latency = args.ai_latency
+
+    return configs
+
+
+def run_test(test_dir, clean, args):
     print(f"---- running test {test_dir.name} ---")
 
-    cwd = Path.cwd().resolve()
-    os.chdir(str(test_dir.resolve()))
-    try:
-        if clean:
-            subprocess.run(["npm", "i"], capture_output=True, check=True)
-            subprocess.run(["npm", "run", "clean"], capture_output=True, check=True)
+    def npm(*args):
+        subprocess.run(["npm", *args], capture_output=True, check=True, cwd=test_dir)
 
-        config = load_config("revalkyr.yaml")
-        run(config)
+    if clean:
+        npm("i")
+        npm("run", "clean")
+        # Restored threads would skip the docs, so the conversation wouldn't
+        # match a recording anymore.
+        test_dir.joinpath(SESSION_DIRNAME, SESSION_FILENAME).unlink(missing_ok=True)
 
-        subprocess.run(["npm", "run", "build"], capture_output=True, check=True)
-        subprocess.run(["npm", "start"], capture_output=True, check=True)
-    finally:
-        os.chdir(str(cwd))
+    (config,) = load_configs([test_dir.joinpath("revalkyr.yaml")], args)
+    run(config)
 
+    npm("run", "build")
+    npm("start")
 
-def run_tests(clean):
+
+def run_tests(clean, args):
     successes = []
     failures = []
 
-    test_dirs = Path("../tests").iterdir()
+    test_dirs = TESTS_DIR.iterdir()
     for test_dir in test_dirs:
         if test_dir.is_dir():
             start = time.time()
             try:
-                run_test(test_dir, clean)
+                run_test(test_dir, clean, args)
                 finish = time.time()
                 print()
                 print(f" ---- {test_dir.name} ok after {finish - start:.1f}s ----")
@@ -94,39 +131,43 @@ def run_tests(clean):
 def main() -> int:
     args = parse_args()
     if args.run_tests or args.run_tests_dirty:
-        return run_tests(not args.run_tests_dirty)
+        return run_tests(not args.run_tests_dirty, args)
 
-    config = load_config(args.config)
-    os.chdir(config.root_dir)
-    run(config)
+    configs = load_configs(args.config or ["revalkyr.yaml"], args)
+    if args.daemon:
+        run_daemon(configs)
+        return 0
+
+    for config in configs:
+        run(config)
 
     return 0
 
 
 def run(config: Config) -> None:
-    ctx = Context(config)
-
-    service_mgr = ServiceMgr(ctx, services.__all__)
-    service_mgr.init()
+    project = Project(config)
+    project.init()
 
-    plugins = config.plugins
+    while project.run_plugins():
+        time.sleep(1)
 
-    for plugin in plugins:
-        plugin.ctx = ctx
-        plugin.log = ctx.log
-        plugin.service_mgr = service_mgr
 
-    for plugin in plugins:
-        plugin.init()
+def run_daemon(configs: list[Config]) -> None:
+    # All projects share caches and HTTP connections, but each gets its own
+    # context, services and plugins.
+    shared = SharedResources()
+    projects = [Project(config, shared) for config in configs]
 
-    while plugins:
-        plugins_to_keep = []
+    for project in projects:
+        project.log.info(
+            f"Serving project {project.name} ({project.ctx.config.root_dir})"
+        )
+        project.init()
 
-        for plugin in plugins:
-            if plugin.run() != PluginResult.NOTHING_TO_DO:
-                plugins_to_keep.append(plugin)
+    while True:
+        for project in projects:
+            project.run_plugins(keep_idle=True)
 
-        plugins = plugins_to_keep
         time.sleep(1)
 
 
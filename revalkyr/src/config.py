@@ -1,24 +1,158 @@
+import os
 import yaml
 from pathlib import Path
 
-from .plugins import AutoBindings
+from .log import Level
+from .plugins.plugin_host import ProcessLimits
+from .plugins.registry import PluginSpec
+
+# The bindings that ship with Revalkyr live at the root of the repository.
+DEFAULT_BINDINGS_DIR = Path(__file__).resolve().parents[2].joinpath("bindings")
+
+# Local state shared by every project on this machine.
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get("XDG_CACHE_HOME", Path.home().joinpath(".cache"))
+).joinpath("revalkyr")
+
+
+DEFAULT_ASSISTANT_ID = "asst_3MpzZ2qz0xPimu4UvjyGVD8P"
+
+ISOLATION_KEYS = {"memory_mb", "cpu_seconds", "timeout", "max_restarts"}
 
 
 class Config:
-    def __init__(self, root_dir: Path, src_dir: Path, plugins):
-        self.root_dir = Path(root_dir)
-        self.src_dir = Path(src_dir).relative_to(root_dir)
+    def __init__(
+        self,
+        root_dir: Path,
+        src_dir: Path,
+        plugins: list[PluginSpec],
+        log_level: str = "info",
+        log_file: Path | None = None,
+        log_buffered: bool = True,
+        bindings_dir: Path = DEFAULT_BINDINGS_DIR,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        ai_backend: str = "live",
+        ai_assistant_id: str = DEFAULT_ASSISTANT_ID,
+        ai_recording: Path | None = None,
+        ai_latency: float = 0.0,
+        ai_fallback: str | None = None,
+        ai_requests_per_minute: int = 500,
+        ai_tokens_per_minute: int = 150_000,
+        http_requests_per_minute: int = 600,
+    ):
+        # Everything is kept absolute so that nothing depends on the current
+        # working directory, which lets one process serve several projects.
+        self.root_dir = Path(root_dir).resolve()
+        self.src_dir = self.root_dir.joinpath(src_dir).resolve()
         self.plugins = plugins
+        # Checked here so that a typo fails when the config is loaded.
+        self.log_level = Level.parse(log_level).name.lower()
+        self.log_file = self.root_dir.joinpath(log_file) if log_file else None
+        self.log_buffered = log_buffered
+        self.bindings_dir = Path(bindings_dir).resolve()
+        self.cache_dir = Path(cache_dir).expanduser().resolve()
+        # 'live', 'record' (live, saving responses to ai_recording) or 'replay'
+        # (answer from ai_recording without touching the network).
+        self.ai_backend = ai_backend
+        self.ai_assistant_id = ai_assistant_id
+        self.ai_recording = (
+            Path(ai_recording)
+            if ai_recording
+            else self.cache_dir.joinpath("recordings", f"{self.name}.jsonl")
+        )
+        self.ai_latency = ai_latency
+        self.ai_fallback = ai_fallback
+        # Starting points only; the AI limits are kept in sync with what the
+        # provider reports in its responses.
+        self.ai_requests_per_minute = ai_requests_per_minute
+        self.ai_tokens_per_minute = ai_tokens_per_minute
+        self.http_requests_per_minute = http_requests_per_minute
+
+    @property
+    def name(self) -> str:
+        return self.root_dir.name
+
+
+def load_plugin_specs(entries: list, isolation: dict) -> list[PluginSpec]:
+    """
+    Reads the plugins list, where each entry is either a plugin name or a
+    mapping with name, options and isolated. isolated is true to run the
+    plugin in a worker process with the limits in the isolation section, or
+    a mapping that overrides some of them.
+    """
 
+    specs = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("name"), str):
+            raise ValueError(f"Plugin entries need a name: {entry!r}")
 
-def load_config(filename: str) -> Config:
-    s = Path(filename).read_text()
+        isolated = entry.get("isolated", False)
+        limits = None
+        if isolated:
+            limits = dict(isolation)
+            if isinstance(isolated, dict):
+                limits.update(isolated)
+
+            unknown = limits.keys() - ISOLATION_KEYS
+            if unknown:
+                raise ValueError(
+                    f"Unknown isolation settings for {entry['name']}: "
+                    f"{', '.join(sorted(unknown))}"
+                )
+            limits = ProcessLimits(
+                memory_mb=limits.get("memory_mb"),
+                cpu_seconds=limits.get("cpu_seconds"),
+                timeout=limits.get("timeout"),
+                max_restarts=int(limits.get("max_restarts", 3)),
+            )
+
+        specs.append(PluginSpec(entry["name"], entry.get("options", {}), limits))
+
+    return specs
+
+
+def load_config(filename: str | Path) -> Config:
+    filename = Path(filename).resolve()
+
+    s = filename.read_text()
     c = yaml.safe_load(s)
 
-    root_dir = c.get("root_dir", ".")
-    src_dir = c.get("src_dir", "./src")
-    plugins = [AutoBindings()]
+    # Paths in the config file are relative to the config file itself.
+    base_dir = filename.parent
+
+    root_dir = base_dir.joinpath(c.get("root_dir", "."))
+    src_dir = base_dir.joinpath(c.get("src_dir", "./src"))
+    bindings_dir = base_dir.joinpath(c.get("bindings_dir", DEFAULT_BINDINGS_DIR))
+    cache_dir = base_dir.joinpath(
+        Path(c.get("cache_dir", DEFAULT_CACHE_DIR)).expanduser()
+    )
+    plugins = load_plugin_specs(
+        c.get("plugins", ["AutoBindings"]), c.get("isolation", {})
+    )
+
+    log = c.get("log", {})
+    ai = c.get("ai", {})
+    http = c.get("http", {})
 
-    config = Config(root_dir, src_dir, plugins)
+    config = Config(
+        root_dir,
+        src_dir,
+        plugins,
+        log_level=log.get("level", "info"),
+        log_file=base_dir.joinpath(log["file"]) if "file" in log else None,
+        log_buffered=log.get("buffered", True),
+        bindings_dir=bindings_dir,
+        cache_dir=cache_dir,
+        ai_backend=ai.get("backend", "live"),
+        ai_assistant_id=ai.get("assistant_id", DEFAULT_ASSISTANT_ID),
+        ai_recording=base_dir.joinpath(ai["recording"]) if "recording" in ai else None,
+        ai_latency=float(ai.get("latency", 0.0)),
+        ai_fallback=ai.get("fallback"),
+        ai_requests_per_minute=int(ai.get("requests_per_minute", 500)),
+        ai_tokens_per_minute=int(ai.get("tokens_per_minute", 150_000)),
+        http_requests_per_minute=int(http.get("requests_per_minute", 600)),
+    )
 
     return config
@@ -1,10 +1,20 @@
-from .log import Log
+from .log import ConsoleSink, JsonLinesSink, Level, Log
+from .shared import SharedResources
 
 
 class Context:
     def __init__(
         self,
         config,
+        shared: SharedResources | None = None,
     ):
         self.config = config
-        self.log = Log()
+        self.shared = shared if shared is not None else SharedResources()
+
+        sinks = [ConsoleSink()]
+        if config.log_file:
+            sinks.append(JsonLinesSink(config.log_file))
+
+        self.log = Log(
+            Level.parse(config.log_level), sinks, buffered=config.log_buffered
+        )
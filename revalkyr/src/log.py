@@ -1,18 +1,167 @@
+import atexit
+import json
+import queue
+import threading
+import time
+
+from enum import IntEnum
+from pathlib import Path
+
 from rich import print
 
 
+class Level(IntEnum):
+    DEBUG = 10
+    INFO = 20
+    WARN = 30
+    ERROR = 40
+
+    @classmethod
+    def parse(cls, name: str) -> "Level":
+        key = name.strip().upper()
+        key = LEVEL_ALIASES.get(key, key)
+        if key not in cls.__members__:
+            valid = ", ".join(m.lower() for m in cls.__members__)
+            raise ValueError(f"Unknown log level {name!r}, expected one of: {valid}")
+        return cls[key]
+
+
+LEVEL_ALIASES = {
+    "WARNING": "WARN",
+    "ERR": "ERROR",
+    "INFORMATION": "INFO",
+}
+
+STYLES = {
+    "debug": "magenta",
+    "good": "green",
+    "info": "white",
+    "warn": "yellow",
+    "error": "red",
+}
+
+
+class Record:
+    def __init__(self, level: str, args: tuple[any, ...]):
+        self.time = time.time()
+        self.level = level
+        self.args = args
+
+    @property
+    def message(self) -> str:
+        # Formatting is deferred until a sink actually needs the text, so that
+        # buffered sinks do it on the writer thread.
+        return " ".join(map(str, self.args))
+
+
+class ConsoleSink:
+    def write(self, record: Record) -> None:
+        style = STYLES[record.level]
+        print(f"[{style}]{record.message}[/{style}]")
+
+    def flush(self) -> None:
+        pass
+
+
+class JsonLinesSink:
+    def __init__(self, path: Path | str):
+        self._file = Path(path).open("a", encoding="utf-8")
+
+    def write(self, record: Record) -> None:
+        self._file.write(
+            json.dumps(
+                {"time": record.time, "level": record.level, "message": record.message}
+            )
+            + "\n"
+        )
+
+    def flush(self) -> None:
+        self._file.flush()
+
+
+class BufferedSink:
+    """
+    Hands records over to a background thread that writes them to the wrapped
+    sinks, so that logging never blocks on formatting or terminal I/O.
+    """
+
+    def __init__(self, sinks: list, capacity: int = 10000):
+        self._sinks = sinks
+        self._queue: queue.Queue[Record | None] = queue.Queue(capacity)
+        self._dropped = 0
+
+        self._thread = threading.Thread(target=self._write_records, daemon=True)
+        self._thread.start()
+
+        atexit.register(self.flush)
+
+    def write(self, record: Record) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def _write_records(self) -> None:
+        while True:
+            record = self._queue.get()
+            try:
+                if self._dropped > 0:
+                    dropped, self._dropped = self._dropped, 0
+                    self._write(Record("warn", (f"Dropped {dropped} log records",)))
+
+                self._write(record)
+
+                if self._queue.empty():
+                    for sink in self._sinks:
+                        sink.flush()
+            finally:
+                self._queue.task_done()
+
+    def _write(self, record: Record) -> None:
+        for sink in self._sinks:
+            try:
+                sink.write(record)
+            except Exception:
+                # Logging must never take the writer thread down.
+                pass
+
+
 class Log:
+    def __init__(
+        self, level: Level = Level.DEBUG, sinks: list = None, buffered: bool = False
+    ):
+        self.level = level
+
+        sinks = sinks if sinks is not None else [ConsoleSink()]
+        self._sinks = [BufferedSink(sinks)] if buffered else sinks
+
     def debug(self, *args: tuple[any, ...]) -> None:
-        print(f"[magenta]{' '.join(map(str, args))}[/magenta]")
+        if self.level <= Level.DEBUG:
+            self._write(Record("debug", args))
 
     def good(self, *args: tuple[any, ...]) -> None:
-        print(f"[green]{' '.join(map(str, args))}[/green]")
+        if self.level <= Level.INFO:
+            self._write(Record("good", args))
 
     def info(self, *args: tuple[any, ...]) -> None:
-        print(f"[white]{' '.join(map(str, args))}[/white]")
+        if self.level <= Level.INFO:
+            self._write(Record("info", args))
 
     def warn(self, *args: tuple[any, ...]) -> None:
-        print(f"[yellow]{' '.join(map(str, args))}[/yellow]")
+        if self.level <= Level.WARN:
+            self._write(Record("warn", args))
 
     def error(self, *args: tuple[any, ...]) -> None:
-        print(f"[red]{' '.join(map(str, args))}[/red]")
+        if self.level <= Level.ERROR:
+            self._write(Record("error", args))
+
+    def flush(self) -> None:
+        for sink in self._sinks:
+            sink.flush()
+
+    def _write(self, record: Record) -> None:
+        for sink in self._sinks:
+            sink.write(record)
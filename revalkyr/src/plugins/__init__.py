@@ -1,2 +1,11 @@
-from .auto_bindings import AutoBindings
-from .plugin import PluginResult
+from .plugin import Plugin, PluginResult
+
+
+def __getattr__(name: str):
+    # Plugins are imported on first use, so a project only pays for the ones
+    # it enables.
+    from .registry import BUILTIN_PLUGINS, load_plugin_class
+
+    if name in BUILTIN_PLUGINS:
+        return load_plugin_class(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
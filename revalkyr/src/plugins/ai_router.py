@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+
+from enum import Enum
+from pathlib import Path
+
+from ..rescript.rescript_errors import (
+    CompilationError,
+    MissingModuleCompilationError,
+    MissingValueCompilationError,
+    SyntaxCompilationError,
+    UnknownCompilationError,
+    WrongTypeCompilationError,
+)
+
+
+class Route(Enum):
+    # Stateless chat completion with a fast model.
+    FAST = "fast"
+    # Assistant thread, which keeps the docs and earlier attempts around.
+    ASSISTANT = "assistant"
+
+
+# The route for each kind of error, when the prompt is small enough for the
+# fast path. Errors that need the package's docs to be fixed properly go to
+# the assistant.
+ERROR_ROUTES: dict[type[CompilationError], Route] = {
+    SyntaxCompilationError: Route.FAST,
+    WrongTypeCompilationError: Route.FAST,
+    MissingValueCompilationError: Route.FAST,
+    MissingModuleCompilationError: Route.ASSISTANT,
+    UnknownCompilationError: Route.ASSISTANT,
+}
+
+
+class Decision:
+    def __init__(self, route: Route, error_kind: str, prompt_chars: int, reason: str):
+        self.route = route
+        self.error_kind = error_kind
+        self.prompt_chars = prompt_chars
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Decision(route={self.route.value}, error={self.error_kind}, reason='{self.reason}')"
+
+
+class RouteStats:
+    def __init__(self):
+        self.count = 0
+        self.total_latency = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.count if self.count else 0.0
+
+
+class AIRouter:
+    """
+    Decides whether a fix goes to the fast, stateless completion path or to
+    an assistant thread, based on the kind of error and how big the prompt
+    is. Every decision is appended to log_file along with how long the AI
+    took, so that the policy can be tuned.
+    """
+
+    def __init__(
+        self,
+        fast_max_prompt_chars: int = 12_000,
+        log_file: Path | None = None,
+        routes: dict[type[CompilationError], Route] = ERROR_ROUTES,
+    ):
+        self.fast_max_prompt_chars = fast_max_prompt_chars
+        self.log_file = log_file
+        self.routes = routes
+
+        self._lock = threading.Lock()
+        # (error kind, route) -> stats.
+        self.stats: dict[tuple[str, Route], RouteStats] = dict()
+
+    def choose(
+        self,
+        error: CompilationError,
+        prompt_chars: int,
+        has_bindings: bool,
+    ) -> Decision:
+        error_kind = type(error).__name__
+
+        route = Route.ASSISTANT
+        for error_type in type(error).__mro__:
+            if error_type in self.routes:
+                route = self.routes[error_type]
+                break
+
+        if route == Route.FAST and not has_bindings:
+            return Decision(Route.ASSISTANT, error_kind, prompt_chars, "no bindings")
+        if route == Route.FAST and prompt_chars > self.fast_max_prompt_chars:
+            return Decision(Route.ASSISTANT, error_kind, prompt_chars, "large prompt")
+
+        return Decision(route, error_kind, prompt_chars, "error kind")
+
+    def record(self, decision: Decision, module_name: str, latency: float) -> None:
+        with self._lock:
+            stats = self.stats.setdefault(
+                (decision.error_kind, decision.route), RouteStats()
+            )
+            stats.count += 1
+            stats.total_latency += latency
+
+            if self.log_file is None:
+                return
+
+            line = json.dumps(
+                {
+                    "time": time.time(),
+                    "module": module_name,
+                    "error": decision.error_kind,
+                    "route": decision.route.value,
+                    "reason": decision.reason,
+                    "prompt_chars": decision.prompt_chars,
+                    "latency": round(latency, 3),
+                }
+            )
+            self.log_file.parent.mkdir(parents=True, exist_ok=True)
+            with self.log_file.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def summary(self) -> str:
+        with self._lock:
+            return ", ".join(
+                f"{error_kind}/{route.value}: {stats.count}x {stats.mean_latency:.1f}s"
+                for (error_kind, route), stats in sorted(
+                    self.stats.items(), key=lambda item: item[0][0]
+                )
+            )
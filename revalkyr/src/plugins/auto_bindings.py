@@ -1,9 +1,21 @@
+import hashlib
+import openai
 import re
+import time
 
 from pathlib import Path
 from textwrap import dedent
 
+from .ai_router import AIRouter, Decision, Route
+from .fix_tracker import FixTracker, Verdict
 from .plugin import Plugin, PluginResult
+from .prefetcher import Prefetcher
+from .template_fixer import FixInput, apply_rules, fix_default_scopes
+from ..rescript.rescript_decls import (
+    declared_values,
+    merge_declarations,
+    parse_declarations,
+)
 from ..rescript.rescript_errors import (
     CompilationError,
     MissingModuleCompilationError,
@@ -12,11 +24,60 @@ from ..rescript.rescript_errors import (
     UnknownCompilationError,
     WrongTypeCompilationError,
 )
-from ..services import BindingsStore, GitHub, NPM, OpenAI, ReScript, SourceFileMgr
-from ..services.ai import AssistantThread
+from ..rescript.rescript_lint import autofix, check_declaration
+from ..services import (
+    BindingsStore,
+    Dependencies,
+    GitHub,
+    NPM,
+    OpenAI,
+    ReScript,
+    SessionStore,
+    SourceFileMgr,
+)
+from ..services.ai import AssistantThread, AssistantThreadPool, ChatThread
+from ..services.scheduler import Priority
 
 
 class AutoBindings(Plugin):
+    def __init__(
+        self,
+        patch_mode: bool = True,
+        patch_min_declarations: int = 6,
+        streaming: bool = False,
+        lint_retries: int = 1,
+        max_threads: int = 16,
+        max_thread_turns: int = 6,
+        attempt_budget: int = 8,
+        fast_model: str = "gpt-3.5-turbo-1106",
+        fast_max_prompt_chars: int = 12_000,
+        prefetch: bool = True,
+        pregenerate: bool = False,
+    ):
+        super().__init__()
+
+        # Once a bindings file has grown this large, only ask the AI for the
+        # declarations it adds or changes instead of the whole file.
+        self.patch_mode = patch_mode
+        self.patch_min_declarations = patch_min_declarations
+        # Stream replies so that broken ones can be abandoned early.
+        self.streaming = streaming
+        # How many times to send code that fails the local checks back to the
+        # AI before handing it to the compiler anyway.
+        self.lint_retries = lint_retries
+        # Bounds on the AI threads kept alive, see AssistantThreadPool.
+        self.max_threads = max_threads
+        self.max_thread_turns = max_thread_turns
+        # How many fixes to try per module before giving up on it.
+        self.attempt_budget = attempt_budget
+        # Small fixes skip the assistant and go to this model, see AIRouter.
+        self.fast_model = fast_model
+        self.fast_max_prompt_chars = fast_max_prompt_chars
+        # Warm the caches for dependencies without bindings in the background,
+        # and optionally write the bindings before they're needed.
+        self.prefetch = prefetch
+        self.pregenerate = pregenerate
+
     def is_revalkyr_bindings_file(self, file: Path):
         source_file_mgr = self.get_service(SourceFileMgr)
         return source_file_mgr.is_revalkyr_file(file) and str(
@@ -26,25 +87,38 @@ class AutoBindings(Plugin):
     def get_bindings_dir(self) -> str:
         return self.ctx.config.src_dir.joinpath("autobindings")
 
-    def get_thread(self, name: str) -> [AssistantThread, bool]:
-        self.log.info("Asking the AI assistant for help...")
-
-        openai = self.get_service(OpenAI)
-
-        is_new = False
+    def get_thread(
+        self, name: str, decision: Decision = None
+    ) -> [AssistantThread | ChatThread, bool]:
+        if decision is not None and decision.route == Route.FAST:
+            self.log.info("Asking the AI for a quick fix...")
+            # The fast path only gets the error and the code, never the docs,
+            # so it doesn't count as a new thread.
+            return (self.get_service(OpenAI).create_chat_thread(self.fast_model), False)
 
-        if name not in self.threads:
-            self.log.debug(f"Created new AI thread (name='{name}')")
-            self.threads[name] = openai.create_assistant_thread()
-            is_new = True
+        self.log.info("Asking the AI assistant for help...")
+        return self.threads.get(name)
 
-        return (self.threads[name], is_new)
+    def route(
+        self, error: CompilationError, bindings_file: Path, *sources: str
+    ) -> Decision:
+        rescript = self.get_service(ReScript)
 
-    def add_readme_and_source(self, thread: AssistantThread, package_name: str) -> None:
+        prompt_chars = len(rescript.get_compiler_output()) + sum(map(len, sources))
+        decision = self.router.choose(error, prompt_chars, bindings_file.exists())
+        self.log.debug(f"Routing {bindings_file.name}: {decision}")
+        return decision
+
+    def add_readme_and_source(
+        self,
+        thread: AssistantThread | ChatThread,
+        package_name: str,
+        priority: Priority = Priority.USER_BLOCKING,
+    ) -> None:
         github = self.get_service(GitHub)
 
-        github_readme = github.download_readme(package_name)
-        github_source = github.download_source_code(package_name)
+        github_readme = github.download_readme(package_name, priority)
+        github_source = github.download_source_code(package_name, priority)
         if github_readme:
             thread.add_message(
                 f"""
@@ -67,20 +141,62 @@ class AutoBindings(Plugin):
             )
             thread.add_source_code(github_source, "typescript")
 
-    def generate_bindings(self, file: Path, module_name: str) -> PluginResult:
+    def generate_bindings(
+        self, file: Path, module_name: str, error: CompilationError
+    ) -> PluginResult:
+        # The known bindings and whatever is added to them land together.
+        with self.get_service(SourceFileMgr).batch():
+            return self._generate_bindings(file, module_name, error)
+
+    def _generate_bindings(
+        self, file: Path, module_name: str, error: CompilationError
+    ) -> PluginResult:
         bindings_store = self.get_service(BindingsStore)
         npm = self.get_service(NPM)
         rescript = self.get_service(ReScript)
         source_file_mgr = self.get_service(SourceFileMgr)
 
-        if not npm.is_npm_package(module_name.lower()):
+        bindings_file = self.get_bindings_dir().joinpath(f"{module_name}.res")
+
+        known_bindings = None
+        if not source_file_mgr.exists(bindings_file):
+            known_bindings = bindings_store.get_known_bindings(module_name)
+            if known_bindings is None:
+                known_bindings = self.prefetcher.get_bindings(module_name)
+
+        if known_bindings is None and not npm.is_npm_package(module_name.lower()):
             # We only deal with NPM packages.
             return PluginResult.NOTHING_TO_DO
 
         ast = rescript.get_ast(file)
         refs = ast.find_references(module_name)
 
-        thread, is_new_thread = self.get_thread(f"{module_name}.res")
+        if known_bindings is not None:
+            declared = declared_values(known_bindings)
+            missing_refs = [ref for ref in refs if ref.name not in declared]
+
+            if not missing_refs:
+                if self.use_known_bindings(bindings_file, module_name, known_bindings):
+                    return PluginResult.RUN_AGAIN
+            else:
+                # Start from the known bindings and only ask the AI for what's
+                # missing from them.
+                self.log.info(
+                    f"Known {module_name} bindings are missing {', '.join(set(ref.name for ref in missing_refs))}"
+                )
+                source_file_mgr.write_file(bindings_file, known_bindings, True)
+                refs = missing_refs
+
+        if self.apply_template_fix(error, module_name, bindings_file, refs):
+            return PluginResult.RUN_AGAIN
+
+        source = source_file_mgr.read_file(file)
+        bindings_source = ""
+        if source_file_mgr.exists(bindings_file):
+            bindings_source = source_file_mgr.read_file(bindings_file)
+
+        decision = self.route(error, bindings_file, source, bindings_source)
+        thread, is_new_thread = self.get_thread(f"{module_name}.res", decision)
 
         if is_new_thread:
             self.add_readme_and_source(thread, module_name.lower())
@@ -94,7 +210,7 @@ class AutoBindings(Plugin):
             """
         )
 
-        thread.add_source_code(source_file_mgr.read_file(file), "rescript")
+        thread.add_source_code(source, "rescript")
 
         thread.add_message(
             """
@@ -104,11 +220,13 @@ class AutoBindings(Plugin):
         )
         thread.add_source_code(rescript.get_compiler_output(), "shell")
 
-        bindings_file = self.get_bindings_dir().joinpath(f"{module_name}.res")
-        if bindings_file.exists():
-            bindings_source = source_file_mgr.read_file(bindings_file)
+        patch = False
+        if source_file_mgr.exists(bindings_file):
+            patch = self.use_patch_mode(bindings_source)
             # Need more than 10 chars for the file to be intersting.
-            if len(bindings_source) > 10:
+            if len(bindings_source) > 10 and not self.thread_has_seen(
+                thread, bindings_source
+            ):
                 thread.add_message(
                     f"""
                     Here's the current {module_name}.res file, by the way. You
@@ -133,8 +251,8 @@ class AutoBindings(Plugin):
         {lf.join(map(lambda ref: f'@module("{module_name.lower()}"){lf}external {ref.name}: ... = "{ref.name}"{lf}', refs))}
         """
 
-        if bindings_store.has_known_bindings(module_name):
-            bindings_suggestion_source = bindings_store.get_known_bindings(module_name)
+        if known_bindings is not None and not source_file_mgr.exists(bindings_file):
+            bindings_suggestion_source = known_bindings
 
         bindings_suggestion = f"""
         Here's a suggestion for how the bindings might look:
@@ -154,23 +272,29 @@ class AutoBindings(Plugin):
         possible, so that they fit with my particular code.
         """
 
-        thread.add_message(bindings_suggestion)
+        if patch:
+            thread.add_message(self.patch_instructions(f"{module_name}.res"))
+        else:
+            thread.add_message(bindings_suggestion)
 
-        thread.run()
-        bindings_source = thread.get_last_message().content
-        bindings_source = self.clean_bindings_source(bindings_source, module_name)
-        source_file_mgr.write_file(bindings_file, bindings_source, True)
+        self.run_thread(thread, bindings_file, patch, decision)
+        self.write_bindings_reply(thread, bindings_file, patch)
 
         return PluginResult.RUN_AGAIN
 
-    def fix_bindings(self, file: Path) -> PluginResult:
+    def fix_bindings(self, file: Path, error: CompilationError) -> PluginResult:
         rescript = self.get_service(ReScript)
         source_file_mgr = self.get_service(SourceFileMgr)
 
-        thread, is_new_thread = self.get_thread(file.name)
+        bindings_source = source_file_mgr.read_file(file)
+
+        decision = self.route(error, file, bindings_source)
+        thread, is_new_thread = self.get_thread(file.name, decision)
 
         if is_new_thread:
-            self.add_readme_and_source(thread, module_name.lower())
+            self.add_readme_and_source(thread, file.stem.lower())
+
+        patch = self.use_patch_mode(bindings_source)
 
         thread.add_message("There's a problem with the file you gave me:")
         thread.add_source_code(rescript.get_compiler_output(), "shell")
@@ -182,8 +306,13 @@ class AutoBindings(Plugin):
             """
         )
 
-        thread.add_message("Here's the file I have right now:")
-        thread.add_source_code(source_file_mgr.read_file(file), "rescript")
+        if self.thread_has_seen(thread, bindings_source):
+            thread.add_message(
+                "The file I have right now is the one you know about, with your changes."
+            )
+        else:
+            thread.add_message("Here's the file I have right now:")
+            thread.add_source_code(bindings_source, "rescript")
 
         thread.add_message(
             """
@@ -198,13 +327,212 @@ class AutoBindings(Plugin):
             """
         )
 
-        thread.run()
-        bindings_source = thread.get_last_message().content
-        bindings_source = self.clean_bindings_source(bindings_source, file.stem)
-        source_file_mgr.write_file(file, bindings_source, True)
+        if patch:
+            thread.add_message(self.patch_instructions(file.name))
+
+        self.run_thread(thread, file, patch, decision)
+        self.write_bindings_reply(thread, file, patch)
 
         return PluginResult.RUN_AGAIN
 
+    def run_thread(
+        self,
+        thread: AssistantThread | ChatThread,
+        bindings_file: Path,
+        patch: bool,
+        decision: Decision = None,
+    ) -> None:
+        start = time.monotonic()
+
+        if self.streaming:
+            thread.run_streamed(check_declaration)
+        else:
+            thread.run()
+            if thread.thread_id is not None:
+                # Save the run before waiting for it, so that a restart can
+                # pick up the reply instead of paying for a new one.
+                self.pending_runs[thread.thread_id] = {
+                    "run_id": thread.run_id,
+                    "file": str(bindings_file),
+                    "patch": patch,
+                }
+                self.session_changed()
+                self.get_service(SessionStore).save()
+            thread.wait_until_ready()
+
+        if decision is not None:
+            self.router.record(decision, bindings_file.stem, time.monotonic() - start)
+
+    def use_patch_mode(self, bindings_source: str) -> bool:
+        return (
+            self.patch_mode
+            and len(parse_declarations(bindings_source)) >= self.patch_min_declarations
+        )
+
+    def patch_instructions(self, filename: str) -> str:
+        return f"""
+            {filename} is large, so don't give me the whole file. Reply with a
+            single rescript code block holding only the declarations (types,
+            externals and lets) that you add or change, each one complete with
+            its attributes. I'll merge them into my file by name, replacing any
+            declaration with the same name. Don't repeat declarations that stay
+            the same. If a declaration has to go, add a line like this to the
+            code block:
+
+            // remove: <name>
+            """
+
+    def write_bindings_reply(
+        self, thread: AssistantThread, bindings_file: Path, patch: bool
+    ) -> None:
+        npm = self.get_service(NPM)
+        source_file_mgr = self.get_service(SourceFileMgr)
+
+        for attempt in range(self.lint_retries + 1):
+            reply = thread.get_last_message().content
+            bindings_source = self.clean_bindings_source(reply, bindings_file.stem)
+
+            if patch:
+                current_source = source_file_mgr.read_file(bindings_file)
+                bindings_source = merge_declarations(current_source, bindings_source)
+
+            # Catch what we can before paying for a compile and another round
+            # trip to the AI.
+            bindings_source, fixed, problems = autofix(bindings_source)
+            for problem in fixed:
+                self.log.debug(f"Fixed a problem in the AI's code: {problem}")
+
+            package_name = bindings_file.stem.lower()
+            bindings_source, rescoped = fix_default_scopes(
+                bindings_source, package_name, npm.get_typings(package_name)
+            )
+            for name in rescoped:
+                self.log.debug(f'Added @scope("default") to {name}')
+
+            if not problems or attempt == self.lint_retries:
+                break
+
+            self.log.warn("The AI's code is broken, asking for a new version...")
+            thread.add_message(
+                f"""
+                That doesn't look right:
+
+                {" ".join(str(problem) for problem in problems)}
+
+                Please fix it and give me a new version.
+                """
+            )
+            self.run_thread(thread, bindings_file, patch)
+
+        source_file_mgr.write_file(bindings_file, bindings_source, True)
+        self.unverified_files.add(bindings_file)
+
+        # The assistant knows what the file looks like now, so there's no need
+        # to send it again unless something else changes it.
+        if thread.thread_id is not None:
+            self.thread_sources[thread.thread_id] = self.hash_source(bindings_source)
+            self.pending_runs.pop(thread.thread_id, None)
+            self.session_changed()
+
+    def apply_template_fix(
+        self,
+        error: CompilationError,
+        module_name: str,
+        bindings_file: Path,
+        refs: list,
+    ) -> bool:
+        """
+        Tries the mechanical fixes in template_fixer before bothering the AI.
+        A fix that doesn't compile is rolled back.
+        """
+
+        npm = self.get_service(NPM)
+        rescript = self.get_service(ReScript)
+        source_file_mgr = self.get_service(SourceFileMgr)
+
+        package_name = module_name.lower()
+        typings = npm.get_typings(package_name)
+        if typings is None:
+            return False
+
+        bindings_source = None
+        if source_file_mgr.exists(bindings_file):
+            bindings_source = source_file_mgr.read_file(bindings_file)
+
+        declared = declared_values(bindings_source or "")
+        value_names = [
+            ref.name
+            for ref in refs
+            if ref.module_name == module_name and ref.name not in declared
+        ]
+        if isinstance(error, MissingValueCompilationError):
+            value_names.append(error.value_name)
+
+        result = apply_rules(
+            FixInput(
+                error, module_name, package_name, value_names, bindings_source, typings
+            )
+        )
+        if result is None:
+            return False
+
+        rule, source = result
+        self.log.info(f"Fixing {module_name} with the {rule} template")
+        source_file_mgr.write_file(bindings_file, source, True)
+
+        rescript.compile()
+        if rescript.has_errors_in(bindings_file):
+            self.log.warn(f"The {rule} template didn't work for {module_name}")
+            if bindings_source is None:
+                source_file_mgr.delete_file(bindings_file)
+            else:
+                source_file_mgr.write_file(bindings_file, bindings_source, True)
+            return False
+
+        self.unverified_files.add(bindings_file)
+        return True
+
+    def thread_has_seen(self, thread: AssistantThread, source: str) -> bool:
+        return self.thread_sources.get(thread.thread_id) == self.hash_source(source)
+
+    def hash_source(self, source: str) -> str:
+        return hashlib.sha256(source.strip().encode("utf-8")).hexdigest()
+
+    def use_known_bindings(
+        self, bindings_file: Path, module_name: str, bindings_source: str
+    ) -> bool:
+        rescript = self.get_service(ReScript)
+        source_file_mgr = self.get_service(SourceFileMgr)
+
+        self.log.info(
+            f"Known {module_name} bindings cover everything, skipping the AI assistant"
+        )
+        source_file_mgr.write_file(bindings_file, bindings_source, True)
+
+        rescript.compile()
+        if rescript.has_errors_in(bindings_file):
+            self.log.warn(f"Known {module_name} bindings don't compile here")
+            source_file_mgr.delete_file(bindings_file)
+            return False
+
+        self.unverified_files.add(bindings_file)
+        return True
+
+    def promote_verified_bindings(self) -> None:
+        bindings_store = self.get_service(BindingsStore)
+        source_file_mgr = self.get_service(SourceFileMgr)
+
+        for file in self.unverified_files:
+            if self.is_revalkyr_bindings_file(file):
+                bindings_store.promote_bindings(
+                    file.stem, source_file_mgr.read_file(file)
+                )
+
+        self.unverified_files.clear()
+
+        if self.router.stats:
+            self.log.debug(f"AI routing so far: {self.router.summary()}")
+
     def clean_bindings_source(self, source: str, module_name: str) -> str:
         # Remove backticks and crap.
         pattern = r"```.*?\n(.*?)```"
@@ -239,58 +567,237 @@ class AutoBindings(Plugin):
         return "\n".join(a)
 
     def init(self) -> None:
-        self.threads: dict[str, AssistantThread] = dict()
+        self.threads = AssistantThreadPool(
+            self.get_service(OpenAI), self.max_threads, self.max_thread_turns
+        )
+        # Thread id -> hash of the bindings source the thread last saw.
+        self.thread_sources: dict[str, str] = dict()
+        # Thread id -> the run we're waiting for and the file it's for.
+        self.pending_runs: dict[str, dict] = dict()
+        self.restore_session()
+        self.fix_tracker = FixTracker(self.attempt_budget)
+        config = self.ctx.config
+        self.router = AIRouter(
+            self.fast_max_prompt_chars,
+            config.cache_dir.joinpath("routing", f"{config.name}.jsonl"),
+        )
+
+        self.prefetcher = Prefetcher(self, self.pregenerate)
+        if self.prefetch:
+            self.prefetcher.start()
+        # Bindings files we wrote that the project hasn't compiled with yet.
+        self.unverified_files: set[Path] = set()
+        # Ids of errors that get_error_module() has nothing for.
+        self.unfixable_errors: set[str] = set()
+
+    def restore_session(self) -> None:
+        session = self.get_service(SessionStore)
+
+        state = session.get("auto_bindings", {})
+        self.threads.restore(state.get("threads", {}))
+        self.thread_sources.update(state.get("thread_sources", {}))
+        self.pending_runs.update(state.get("pending_runs", {}))
+
+        if self.pending_runs:
+            self.log.info(
+                f"Resuming {len(self.pending_runs)} AI runs from the last session"
+            )
+
+        def get_state() -> dict:
+            threads = self.threads.get_state()
+            thread_ids = {thread["thread_id"] for thread in threads.values()}
+            return {
+                "threads": threads,
+                "thread_sources": {
+                    thread_id: source_hash
+                    for thread_id, source_hash in self.thread_sources.items()
+                    if thread_id in thread_ids
+                },
+                "pending_runs": self.pending_runs,
+            }
+
+        session.register("auto_bindings", get_state)
+
+    def session_changed(self) -> None:
+        self.get_service(SessionStore).mark_dirty("auto_bindings")
+
+    def resume_pending_runs(self) -> PluginResult:
+        """
+        Collects the replies to runs that were started before a restart.
+        """
+
+        with self.get_service(SourceFileMgr).batch():
+            for thread_id, pending in list(self.pending_runs.items()):
+                self.pending_runs.pop(thread_id)
+                self.session_changed()
+
+                thread = self.threads.find(thread_id)
+                if thread is None:
+                    continue
+
+                file = Path(pending["file"])
+                self.log.info(f"Collecting the AI's reply for {file.name}...")
+
+                thread.run_id = pending["run_id"]
+                try:
+                    thread.wait_until_ready()
+                    self.write_bindings_reply(thread, file, pending["patch"])
+                except (openai.OpenAIError, RuntimeError, KeyError, OSError) as e:
+                    self.log.warn(f"Couldn't collect the reply for {file.name}: {e}")
+
+        return PluginResult.RUN_AGAIN
+
+    def dependencies_changed(self, package_names: set[str]) -> None:
+        """
+        Throws away the bindings we generated for packages whose version
+        changed, along with the threads and attempts that went into them.
+        Bindings for every other package are left alone.
+        """
+
+        source_file_mgr = self.get_service(SourceFileMgr)
+
+        with source_file_mgr.batch():
+            for file in self.get_bindings_dir().glob("*.res"):
+                if file.stem.lower() not in package_names:
+                    continue
+
+                if self.is_revalkyr_bindings_file(file):
+                    self.log.info(f"Regenerating {file.name} for the new version")
+                    source_file_mgr.delete_file(file)
+                    self.unverified_files.discard(file)
+
+                self.threads.remove(file.name)
+                self.fix_tracker.forget_module(file.stem)
+                self.session_changed()
+
+        self.unfixable_errors.clear()
+        if self.prefetch:
+            self.prefetcher.start()
 
     def run(self) -> PluginResult:
         rescript = self.get_service(ReScript)
-        source_file_mgr = self.get_service(SourceFileMgr)
 
-        error = rescript.get_compilation_error()
+        changed = self.get_service(Dependencies).poll()
+        if changed:
+            self.dependencies_changed(changed)
+
+        if self.pending_runs:
+            return self.resume_pending_runs()
+
+        errors = rescript.get_compilation_errors()
+
+        # Errors we've already found we can't do anything about stay that way
+        # until they go away, so there's no need to look at them again.
+        for e in rescript.get_diagnostics_diff(self.name).resolved:
+            self.unfixable_errors.discard(e.id)
+
+        if not errors:
+            if self.unverified_files:
+                self.promote_verified_bindings()
+            self.fix_tracker.reset()
+            return PluginResult.NOTHING_TO_DO
+
+        # The errors come upstream first, so fix the first one we can and let
+        # the ones it might have caused wait for the next compile.
+        error, module_name = None, None
+        for e in errors:
+            if e.id in self.unfixable_errors:
+                continue
+
+            module_name = self.get_error_module(e)
+            if module_name is not None:
+                error = e
+                break
+
+            self.unfixable_errors.add(e.id)
+            if isinstance(e, UnknownCompilationError):
+                self.log.warn("It's not compiling, but it's not something I can fix.")
+
         if error is None:
+            self.log.debug("Nothing to do...")
             return PluginResult.NOTHING_TO_DO
 
+        # Don't go around in circles if our fixes don't change anything.
+        key = self.get_fix_key(error, module_name)
+        verdict = self.fix_tracker.check(key, module_name)
+        if verdict == Verdict.GIVE_UP:
+            if self.fix_tracker.report_once(module_name):
+                self.log.error(
+                    f"Giving up on {module_name}, the same errors keep coming back."
+                )
+            return PluginResult.NOTHING_TO_DO
+        if verdict == Verdict.WAIT:
+            return PluginResult.RUN_AGAIN
+
+        if self.fix_tracker.is_repeat(key):
+            self.log.warn(f"Trying to fix the same error in {module_name} again...")
+        self.fix_tracker.record(key, module_name)
+
+        return self.fix_error(error, module_name)
+
+    def get_error_module(self, error: CompilationError) -> str | None:
+        """
+        Returns the name of the bindings module that the error can be fixed
+        in, if any.
+        """
+
+        source_file_mgr = self.get_service(SourceFileMgr)
+
+        if source_file_mgr.is_revalkyr_file(error.file):
+            return error.file.stem
+
+        if isinstance(
+            error, (MissingModuleCompilationError, MissingValueCompilationError)
+        ):
+            return error.module_name
+
+        if isinstance(error, WrongTypeCompilationError):
+            given = error.given_type.split(".")[0]
+            wanted = error.wanted_type.split(".")[0]
+
+            # If given or wanted refers to a Revalkyr bindings file.
+            for module_name in (given, wanted):
+                if self.is_revalkyr_bindings_file(
+                    self.get_bindings_dir().joinpath(f"{module_name}.res")
+                ):
+                    return module_name
+
+        return None
+
+    def get_fix_key(self, error: CompilationError, module_name: str) -> str:
+        rescript = self.get_service(ReScript)
+        source_file_mgr = self.get_service(SourceFileMgr)
+
+        bindings_file = self.get_bindings_dir().joinpath(f"{module_name}.res")
+        bindings_source = None
+        if bindings_file.exists():
+            bindings_source = source_file_mgr.read_file(bindings_file)
+
+        return self.fix_tracker.make_key(
+            error.file,
+            type(error).__name__,
+            rescript.get_compiler_output(),
+            bindings_source,
+        )
+
+    def fix_error(self, error: CompilationError, module_name: str) -> PluginResult:
+        source_file_mgr = self.get_service(SourceFileMgr)
+
         # Is there a problem in a Revalkyr generated ifle? If so, we introduced an error.
         if source_file_mgr.is_revalkyr_file(error.file):
             self.log.warn("Hrm, we might have introduced broken code...")
             if isinstance(error, SyntaxCompilationError):
                 source_file_mgr.delete_file(error.file)
-            else:
-                self.fix_bindings(error.file)
+                self.unverified_files.discard(error.file)
+                return PluginResult.RUN_AGAIN
 
-        elif isinstance(error, MissingModuleCompilationError):
-            self.log.info(f"Module {error.module_name} is missing. Trying to fix...")
-            return self.generate_bindings(error.file, error.module_name)
+            return self.fix_bindings(error.file, error)
 
+        if isinstance(error, MissingModuleCompilationError):
+            self.log.info(f"Module {error.module_name} is missing. Trying to fix...")
         elif isinstance(error, MissingValueCompilationError):
             self.log.info(
                 f"Value {error.value_name} is missing in {error.module_name}. Trying to fix..."
             )
-            return self.generate_bindings(error.file, error.module_name)
-
-        elif isinstance(error, UnknownCompilationError):
-            self.log.warn("It's not compiling, but it's not something I can fix.")
-            return PluginResult.NOTHING_TO_DO
-
-        elif isinstance(error, WrongTypeCompilationError):
-            given = error.given_type.split(".")[0]
-            wanted = error.wanted_type.split(".")[0]
-
-            try_to_fix = False
-
-            # If given or wanted refers to a Revalkyr bindings file.
-            if self.is_revalkyr_bindings_file(
-                self.get_bindings_dir().joinpath(f"{given}.res")
-            ):
-                try_to_fix = True
-                module_name = given
-            elif self.is_revalkyr_bindings_file(
-                self.get_bindings_dir().joinpath(f"{wanted}.res")
-            ):
-                try_to_fix = True
-                module_name = wanted
-
-            if try_to_fix:
-                return self.generate_bindings(error.file, module_name)
 
-        self.log.debug("Nothing to do...")
-        return PluginResult.NOTHING_TO_DO
+        return self.generate_bindings(error.file, module_name, error)
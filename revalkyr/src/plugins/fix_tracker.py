@@ -0,0 +1,103 @@
+import hashlib
+import time
+
+from enum import Enum, auto
+from pathlib import Path
+
+from ..rescript.rescript_errors import normalize_compiler_output
+
+
+class Verdict(Enum):
+    ATTEMPT = auto()
+    WAIT = auto()
+    GIVE_UP = auto()
+
+
+class FixTracker:
+    """
+    Remembers which (file, error, bindings) states we've already tried to
+    fix. Running into the same state again means the last fix didn't help,
+    so the next attempt is delayed exponentially, and after max_repeats the
+    state is given up on. Every module also has a total attempt budget.
+    """
+
+    def __init__(
+        self,
+        attempt_budget: int = 8,
+        max_repeats: int = 3,
+        backoff: float = 2.0,
+        max_backoff: float = 120.0,
+    ):
+        self.attempt_budget = attempt_budget
+        self.max_repeats = max_repeats
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        # Key -> (number of attempts, time of the last attempt).
+        self._attempts: dict[str, tuple[int, float]] = dict()
+        self._module_attempts: dict[str, int] = dict()
+        self._reported: set[str] = set()
+
+    def make_key(
+        self,
+        file: Path,
+        error_kind: str,
+        compiler_output: str,
+        bindings_source: str | None,
+    ) -> str:
+        h = hashlib.sha256()
+        for part in (
+            str(file),
+            error_kind,
+            normalize_compiler_output(compiler_output or ""),
+            bindings_source or "",
+        ):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def check(self, key: str, module_name: str) -> Verdict:
+        if self._module_attempts.get(module_name, 0) >= self.attempt_budget:
+            return Verdict.GIVE_UP
+
+        if key not in self._attempts:
+            return Verdict.ATTEMPT
+
+        count, last_time = self._attempts[key]
+        if count >= self.max_repeats:
+            return Verdict.GIVE_UP
+
+        delay = min(self.backoff * 2 ** (count - 1), self.max_backoff)
+        if time.monotonic() - last_time < delay:
+            return Verdict.WAIT
+
+        return Verdict.ATTEMPT
+
+    def record(self, key: str, module_name: str) -> None:
+        count, _ = self._attempts.get(key, (0, 0.0))
+        self._attempts[key] = (count + 1, time.monotonic())
+        self._module_attempts[module_name] = (
+            self._module_attempts.get(module_name, 0) + 1
+        )
+
+    def is_repeat(self, key: str) -> bool:
+        return key in self._attempts
+
+    def report_once(self, module_name: str) -> bool:
+        if module_name in self._reported:
+            return False
+        self._reported.add(module_name)
+        return True
+
+    def forget_module(self, module_name: str) -> None:
+        self._module_attempts.pop(module_name, None)
+        self._reported.discard(module_name)
+
+    def reset(self) -> None:
+        """
+        Forgets everything, e.g. when the project compiles again.
+        """
+
+        self._attempts.clear()
+        self._module_attempts.clear()
+        self._reported.clear()
@@ -15,6 +15,10 @@ class Plugin:
         self.log = None
         self.service_mgr = None
 
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
     def get_service(self, service_type: type[T] | str) -> T:
         return self.service_mgr.get_service(service_type)
 
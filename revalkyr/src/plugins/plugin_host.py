@@ -0,0 +1,549 @@
+import atexit
+import copy
+import itertools
+import math
+import multiprocessing
+import pickle
+import threading
+import time
+import traceback
+
+from multiprocessing.connection import Connection
+
+from typing import TYPE_CHECKING
+
+from .plugin import Plugin, PluginResult
+from ..context import Context
+from ..services import SessionStore
+
+if TYPE_CHECKING:
+    from .registry import PluginSpec
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows, so no limits there.
+    resource = None
+
+# The first object each side of a channel hands out: the service manager on
+# the host side, the plugin (wrapped in a _Worker) on the worker side.
+ROOT = 0
+
+
+class ChannelClosed(ConnectionError):
+    pass
+
+
+class _Method:
+    # Sent back instead of the value when an attribute is a method.
+    pass
+
+
+# Protocol methods a RemoteObject forwards that are builtins rather than
+# attributes on the other side.
+_PROTOCOLS = {
+    "__bool__": bool,
+    "__len__": len,
+    "__iter__": iter,
+    "__next__": next,
+}
+
+
+class _Ref:
+    def __init__(self, side: str, obj_id: int):
+        self.side = side
+        self.obj_id = obj_id
+
+
+class RemoteObject:
+    """
+    Stands in for an object on the other side of a channel. Attribute reads
+    and writes and method calls are sent over as messages, and what comes
+    back is a copy if it pickles, or another RemoteObject if it doesn't.
+    """
+
+    def __init__(self, channel: "Channel", obj_id: int):
+        object.__setattr__(self, "_channel", channel)
+        object.__setattr__(self, "_obj_id", obj_id)
+
+    def __getattr__(self, name: str) -> any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        methods = self._channel.get_method_names(self._obj_id)
+        if name not in methods:
+            value = self._channel.request("getattr", self._obj_id, name)
+            if value is not _Method:
+                return value
+            methods.add(name)
+
+        return lambda *args, **kwargs: self._channel.request(
+            "call", self._obj_id, name, (args, kwargs)
+        )
+
+    def __setattr__(self, name: str, value: any) -> None:
+        self._channel.request("setattr", self._obj_id, name, value)
+
+    def __call__(self, *args, **kwargs) -> any:
+        return self._call("__call__", *args, **kwargs)
+
+    # Python looks these up on the type, so __getattr__() never sees them.
+
+    def __enter__(self) -> any:
+        return self._call("__enter__")
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        # The traceback can't be sent, and the error is sent as a copy.
+        if exc is not None:
+            exc = self._channel.portable_error(exc)
+            exc_type = type(exc)
+        return self._call("__exit__", exc_type, exc, None)
+
+    def __iter__(self) -> any:
+        return self._call("__iter__")
+
+    def __next__(self) -> any:
+        return self._call("__next__")
+
+    def __len__(self) -> int:
+        return self._call("__len__")
+
+    def __bool__(self) -> bool:
+        return self._call("__bool__")
+
+    def _call(self, name: str, *args, **kwargs) -> any:
+        return self._channel.request("call", self._obj_id, name, (args, kwargs))
+
+    def __reduce__(self):
+        # Channel.encode() sends a reference instead.
+        raise TypeError("RemoteObject can't be pickled")
+
+    def __repr__(self) -> str:
+        return f"RemoteObject(obj_id={self._obj_id})"
+
+
+class Channel:
+    """
+    One side of a two-way connection between the host and a worker process.
+    Either side can make requests to objects on the other while serving the
+    other side's requests, nested as deep as needed. Whichever thread waits
+    for a reply reads the connection, or leaves it to the one that already
+    is.
+    """
+
+    def __init__(self, conn: Connection, side: str):
+        self.side = side
+        self.closed = False
+
+        self._conn = conn
+        self._send_lock = threading.Lock()
+        self._read_lock = threading.RLock()
+        self._replied = threading.Condition()
+        self._replies: dict[int, tuple[bool, any]] = dict()
+        self._next_msg_id = itertools.count()
+
+        self._objects: list[any] = []
+        # id() of a local object -> its object id.
+        self._obj_ids: dict[int, int] = dict()
+        # Object id on the other side -> proxy, and its known method names.
+        self._remotes: dict[int, RemoteObject] = dict()
+        self._methods: dict[int, set[str]] = dict()
+
+    def add(self, obj: any) -> int:
+        """
+        Makes a local object reachable from the other side, returning its id.
+        """
+
+        obj_id = self._obj_ids.get(id(obj))
+        if obj_id is None:
+            obj_id = len(self._objects)
+            self._objects.append(obj)
+            self._obj_ids[id(obj)] = obj_id
+        return obj_id
+
+    def remote(self, obj_id: int) -> RemoteObject:
+        if obj_id not in self._remotes:
+            self._remotes[obj_id] = RemoteObject(self, obj_id)
+        return self._remotes[obj_id]
+
+    def owns(self, obj: any) -> bool:
+        """
+        Returns whether the object is a proxy for one on the other side.
+        """
+
+        return (
+            isinstance(obj, RemoteObject)
+            and object.__getattribute__(obj, "_channel") is self
+        )
+
+    def get_method_names(self, obj_id: int) -> set[str]:
+        return self._methods.setdefault(obj_id, set())
+
+    def request(
+        self,
+        op: str,
+        obj_id: int,
+        name: str,
+        payload: any = None,
+        timeout: float | None = None,
+    ) -> any:
+        msg_id = next(self._next_msg_id)
+        self._send(("request", msg_id, op, obj_id, name, self.encode(payload)))
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._replied:
+                if msg_id in self._replies:
+                    ok, value = self._replies.pop(msg_id)
+                    break
+                if self.closed:
+                    raise ChannelClosed("The other process has gone away")
+
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"No reply to {name}() within {timeout}s")
+
+            if self._read_lock.acquire(blocking=False):
+                try:
+                    self._pump(0.05)
+                finally:
+                    self._read_lock.release()
+            else:
+                with self._replied:
+                    if msg_id not in self._replies and not self.closed:
+                        self._replied.wait(0.05)
+
+        value = self.decode(value)
+        if not ok:
+            raise value
+        return value
+
+    def serve_forever(self) -> None:
+        while not self.closed:
+            with self._read_lock:
+                self._pump(0.1)
+
+    def close(self) -> None:
+        with self._replied:
+            self.closed = True
+            self._replied.notify_all()
+
+        try:
+            self._conn.close()
+        except OSError:
+            pass
+
+    def encode(self, value: any) -> any:
+        try:
+            # RemoteObjects refuse, so anything containing one ends up below.
+            pickle.dumps(value)
+            return value
+        except Exception:
+            pass
+
+        if isinstance(value, RemoteObject):
+            return _Ref("remote", object.__getattribute__(value, "_obj_id"))
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.encode(v) for v in value)
+        if isinstance(value, dict):
+            return {k: self.encode(v) for k, v in value.items()}
+        return _Ref(self.side, self.add(value))
+
+    def decode(self, value: any) -> any:
+        if isinstance(value, _Ref):
+            # A reference to one of our own objects comes back as "remote".
+            if value.side == "remote":
+                return self._objects[value.obj_id]
+            return self.remote(value.obj_id)
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.decode(v) for v in value)
+        if isinstance(value, dict):
+            return {k: self.decode(v) for k, v in value.items()}
+        return value
+
+    def _send(self, message: tuple) -> None:
+        try:
+            with self._send_lock:
+                self._conn.send(message)
+        except (OSError, ValueError) as e:
+            self.close()
+            raise ChannelClosed(str(e)) from e
+
+    def _pump(self, timeout: float) -> None:
+        try:
+            if not self._conn.poll(timeout):
+                return
+            message = self._conn.recv()
+        except (EOFError, OSError) as e:
+            self.close()
+            raise ChannelClosed("The other process has gone away") from e
+
+        if message[0] == "reply":
+            _, msg_id, ok, value = message
+            with self._replied:
+                self._replies[msg_id] = (ok, value)
+                self._replied.notify_all()
+        else:
+            self._serve(*message[1:])
+
+    def _serve(
+        self, msg_id: int, op: str, obj_id: int, name: str, payload: any
+    ) -> None:
+        try:
+            obj = self._objects[obj_id]
+            if op == "getattr":
+                value = getattr(obj, name)
+                if callable(value) and not isinstance(value, type):
+                    value = _Method
+            elif op == "setattr":
+                setattr(obj, name, self.decode(payload))
+                value = None
+            elif name in _PROTOCOLS:
+                args, kwargs = self.decode(payload)
+                value = _PROTOCOLS[name](obj, *args, **kwargs)
+            else:
+                args, kwargs = self.decode(payload)
+                value = getattr(obj, name)(*args, **kwargs)
+
+            reply = ("reply", msg_id, True, self.encode(value))
+        except Exception as e:
+            reply = ("reply", msg_id, False, self.portable_error(e))
+
+        self._send(reply)
+
+    def portable_error(self, e: Exception) -> Exception:
+        """
+        Returns a copy of the error that can be sent to the other side.
+        """
+
+        try:
+            error = pickle.loads(pickle.dumps(e))
+        except Exception:
+            error = RuntimeError(f"{type(e).__name__}: {e}")
+
+        error.add_note(
+            f"Raised in the {self.side} process:\n{''.join(traceback.format_exception(e))}"
+        )
+        return error
+
+
+class ProcessLimits:
+    def __init__(
+        self,
+        memory_mb: int | None = None,
+        cpu_seconds: int | None = None,
+        timeout: float | None = None,
+        max_restarts: int = 3,
+    ):
+        # Address space of the worker process and CPU time per init() or
+        # run(), enforced by the OS (where there's resource.setrlimit). The
+        # CPU time includes whatever the worker's own threads use meanwhile.
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        # How long a single init() or run() may take.
+        self.timeout = timeout
+        # Crashes in a row before the plugin is given up on.
+        self.max_restarts = max_restarts
+
+    def apply(self) -> None:
+        if resource is None:
+            return
+
+        if self.memory_mb:
+            n = self.memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (n, n))
+        self.renew_cpu_time()
+
+    def renew_cpu_time(self) -> None:
+        """
+        Allows the worker cpu_seconds of CPU time from now on. RLIMIT_CPU
+        counts the process's whole life, so this is called before every call
+        to make it a limit per call instead.
+        """
+
+        if resource is None or not self.cpu_seconds:
+            return
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = math.ceil(usage.ru_utime + usage.ru_stime) + self.cpu_seconds
+        # Only the soft limit moves; a lowered hard limit couldn't be raised.
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+class _Worker:
+    # What the host calls in the worker process: the plugin's init() and
+    # run(), each with CPU time of its own. The plugin is only created in
+    # init(), so that errors creating it (e.g. bad options) are raised in the
+    # host like any other.
+
+    def __init__(
+        self, ctx: Context, spec: "PluginSpec", limits: ProcessLimits, service_mgr
+    ):
+        self.ctx = ctx
+        self.spec = spec
+        self.limits = limits
+        self.service_mgr = service_mgr
+        self.plugin: Plugin | None = None
+
+    def init(self) -> None:
+        self.limits.renew_cpu_time()
+
+        self.plugin = self.spec.create()
+        self.plugin.ctx = self.ctx
+        self.plugin.log = self.ctx.log
+        self.plugin.service_mgr = self.service_mgr
+        self.plugin.init()
+
+    def run(self) -> PluginResult:
+        self.limits.renew_cpu_time()
+        return self.plugin.run()
+
+
+def _run_worker(conn: Connection, config, spec: "PluginSpec", limits: ProcessLimits):
+    # Runs in the worker process, which is the only one that imports the
+    # plugin.
+    limits.apply()
+
+    channel = Channel(conn, "worker")
+    channel.add(_Worker(Context(config), spec, limits, channel.remote(ROOT)))
+
+    try:
+        channel.serve_forever()
+    except ChannelClosed:
+        pass
+
+
+class ProcessPlugin(Plugin):
+    """
+    Runs a plugin in a worker process of its own, so it gets a core (and a
+    GIL) to itself and can't take the main loop down with it. The plugin
+    reaches the services through proxies that pass messages back to this
+    process. If the worker dies or times out, it's restarted with a fresh
+    instance of the plugin.
+    """
+
+    def __init__(self, spec: "PluginSpec", limits: ProcessLimits | None = None):
+        super().__init__()
+
+        self.spec = spec
+        self.limits = limits or ProcessLimits()
+
+        self._process: multiprocessing.Process | None = None
+        self._channel: Channel | None = None
+        self._crashes = 0
+        self._given_up = False
+        self._stop_at_exit = False
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    def init(self) -> None:
+        try:
+            self._start()
+        except (ChannelClosed, TimeoutError) as e:
+            if self._restart(e) == PluginResult.NOTHING_TO_DO:
+                raise
+        except Exception:
+            # The plugin's own init() failed; it won't be run.
+            self._stop()
+            raise
+
+    def run(self) -> PluginResult:
+        if self._given_up:
+            return PluginResult.NOTHING_TO_DO
+
+        try:
+            result = self._channel.request(
+                "call", ROOT, "run", ((), {}), timeout=self.limits.timeout
+            )
+        except (ChannelClosed, TimeoutError) as e:
+            return self._restart(e)
+
+        self._crashes = 0
+        return result
+
+    def _start(self) -> None:
+        mp = multiprocessing.get_context("spawn")
+        conn, child_conn = mp.Pipe()
+
+        # The worker logs straight to the sinks; a buffered record would be
+        # lost if the worker is killed.
+        config = copy.copy(self.ctx.config)
+        config.plugins = []
+        config.log_buffered = False
+
+        self._process = mp.Process(
+            target=_run_worker,
+            args=(child_conn, config, self.spec, self.limits),
+            name=f"revalkyr-{self.name}",
+            # Not a daemon, so the plugin can have processes of its own (like
+            # the prefetcher's pool); it's stopped explicitly instead.
+            daemon=False,
+        )
+        self._process.start()
+        child_conn.close()
+
+        if not self._stop_at_exit:
+            # Registered after multiprocessing's own exit handler, which
+            # would otherwise wait for the worker forever, so it runs first.
+            atexit.register(self._stop)
+            self._stop_at_exit = True
+
+        self._channel = Channel(conn, "host")
+        self._channel.add(self.service_mgr)
+        threading.Thread(target=self._serve, args=(self._channel,), daemon=True).start()
+
+        self.log.debug(f"Started {self.name} in process {self._process.pid}")
+        self._channel.request(
+            "call", ROOT, "init", ((), {}), timeout=self.limits.timeout
+        )
+
+    def _serve(self, channel: Channel) -> None:
+        # Serves the worker's background threads between runs.
+        try:
+            channel.serve_forever()
+        except ChannelClosed:
+            pass
+
+    def _stop(self) -> None:
+        if self._channel is not None:
+            # Whatever the worker registered can't be called anymore.
+            self.get_service(SessionStore).unregister_where(self._channel.owns)
+            self._channel.close()
+
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(5)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join()
+
+    def _restart(self, error: Exception) -> PluginResult:
+        self._stop()
+        self.log.error(
+            f"{self.name} crashed (exit code {self._process.exitcode}): {error}"
+        )
+
+        while self._crashes < self.limits.max_restarts:
+            self._crashes += 1
+            self.log.warn(
+                f"Restarting {self.name} ({self._crashes}/{self.limits.max_restarts})"
+            )
+            try:
+                self._start()
+                return PluginResult.RUN_AGAIN
+            except (ChannelClosed, TimeoutError) as e:
+                self._stop()
+                self.log.error(f"{self.name} crashed again: {e}")
+            except Exception as e:
+                # Its init() failed, which restarting won't fix.
+                self._stop()
+                self.log.error(f"{self.name} failed to start again: {e}")
+                break
+
+        self.log.error(f"Giving up on {self.name}")
+        self._given_up = True
+        return PluginResult.NOTHING_TO_DO
@@ -0,0 +1,180 @@
+import json
+import multiprocessing
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .template_fixer import function_stubs
+from ..rescript.rescript_graph import scan_qualified_values
+from ..rescript.rescript_lint import autofix
+from ..services import BindingsStore, GitHub, NPM, OpenAI
+from ..services.scheduler import Priority
+
+if TYPE_CHECKING:
+    from .auto_bindings import AutoBindings
+
+
+def _scan_file(file: Path) -> dict[str, set[str]]:
+    # Runs in a worker process.
+    try:
+        return scan_qualified_values(file.read_text(encoding="utf-8"))
+    except OSError:
+        return dict()
+
+
+class Prefetcher:
+    """
+    Looks for modules the project uses that are NPM dependencies without
+    bindings yet, and gets everything needed to write them (package page,
+    docs, source and typings) into the caches in a background thread before
+    the compiler gets around to complaining. With pregenerate set, it also
+    writes the bindings themselves, at background priority, for
+    AutoBindings to pick up.
+    """
+
+    def __init__(
+        self,
+        plugin: "AutoBindings",
+        pregenerate: bool = False,
+        max_workers: int = 4,
+    ):
+        self.plugin = plugin
+        self.log = plugin.log
+        self.pregenerate = pregenerate
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        # Module -> pregenerated bindings source.
+        self._bindings: dict[str, str] = dict()
+
+    def start(self) -> None:
+        """
+        Starts a pass in the background, unless one is already running.
+        """
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._run, name="revalkyr-prefetch", daemon=True
+            )
+            self._thread.start()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_bindings(self, module_name: str) -> str | None:
+        with self._lock:
+            return self._bindings.pop(module_name, None)
+
+    def find_candidates(self) -> dict[str, set[str]]:
+        """
+        Returns the modules worth prefetching and the values used from each.
+        """
+
+        config = self.plugin.ctx.config
+        bindings_store = self.plugin.get_service(BindingsStore)
+
+        packages = self._get_dependencies()
+        if not packages:
+            return dict()
+
+        files = list(config.src_dir.rglob("*.res"))
+        bindings_dir = self.plugin.get_bindings_dir().resolve()
+
+        values: dict[str, set[str]] = dict()
+        # Not forked: this runs in a background thread, and a child forked
+        # while another thread (like the log writer) holds a lock could hang.
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            for file, refs in zip(files, executor.map(_scan_file, files, chunksize=16)):
+                if file.resolve().is_relative_to(bindings_dir):
+                    continue
+                for module_name, value_names in refs.items():
+                    values.setdefault(module_name, set()).update(value_names)
+
+        return {
+            module_name: value_names
+            for module_name, value_names in values.items()
+            if module_name.lower() in packages
+            and not bindings_dir.joinpath(f"{module_name}.res").exists()
+            and not bindings_store.has_known_bindings(module_name)
+        }
+
+    def _get_dependencies(self) -> set[str]:
+        package_json = self.plugin.ctx.config.root_dir.joinpath("package.json")
+        try:
+            package = json.loads(package_json.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return set()
+
+        return {
+            name.lower()
+            for key in ("dependencies", "devDependencies")
+            for name in package.get(key, {})
+        }
+
+    def _run(self) -> None:
+        try:
+            candidates = self.find_candidates()
+            if candidates:
+                self.log.debug(f"Prefetching for {', '.join(sorted(candidates))}")
+
+            for module_name, value_names in candidates.items():
+                self._prefetch(module_name, sorted(value_names))
+        except Exception as e:
+            # It's only a head start, the normal path still works without it.
+            self.log.warn(f"Prefetching failed: {e}")
+
+    def _prefetch(self, module_name: str, value_names: list[str]) -> None:
+        github = self.plugin.get_service(GitHub)
+        npm = self.plugin.get_service(NPM)
+
+        package_name = module_name.lower()
+        background = Priority.BACKGROUND
+
+        npm.get_github_repo_url(package_name, background)
+        github.download_readme(package_name, background)
+        github.download_source_code(package_name, background)
+        typings = npm.get_typings(package_name)
+
+        if not self.pregenerate:
+            return
+
+        # Free and instant if the typings tell us enough.
+        source = function_stubs(package_name, value_names, typings)
+        if source is None:
+            source = self._ask_ai(module_name, value_names)
+
+        if source:
+            self.log.debug(f"Pregenerated bindings for {module_name}")
+            with self._lock:
+                self._bindings[module_name] = source
+
+    def _ask_ai(self, module_name: str, value_names: list[str]) -> str | None:
+        ai = self.plugin.get_service(OpenAI)
+
+        thread = ai.create_chat_thread(self.plugin.fast_model, Priority.BACKGROUND)
+        self.plugin.add_readme_and_source(
+            thread, module_name.lower(), Priority.BACKGROUND
+        )
+        thread.add_message(
+            f"""
+            Write the ReScript bindings file {module_name}.res for me. My code
+            uses these values from it: {", ".join(value_names)}
+
+            Reply with the contents of the file only, in a rescript code block.
+            """
+        )
+        thread.run()
+
+        reply = thread.get_last_message().content
+        source = self.plugin.clean_bindings_source(reply, module_name)
+        source, _, problems = autofix(source)
+        return source if source and not problems else None
@@ -0,0 +1,66 @@
+import importlib
+
+from importlib.metadata import entry_points
+
+from .plugin import Plugin
+from .plugin_host import ProcessLimits
+
+# Other packages can provide plugins through this entry point group.
+ENTRY_POINT_GROUP = "revalkyr.plugins"
+
+# Plugin name -> the module it lives in, imported only when it's enabled.
+BUILTIN_PLUGINS = {
+    "AutoBindings": ".auto_bindings",
+}
+
+
+def plugin_exists(name: str) -> bool:
+    """
+    Returns whether the named plugin is built in or installed, without
+    importing it.
+    """
+
+    return name in BUILTIN_PLUGINS or bool(
+        entry_points(group=ENTRY_POINT_GROUP, name=name)
+    )
+
+
+def load_plugin_class(name: str) -> type[Plugin]:
+    """
+    Imports the named plugin, built in or from an installed package.
+    """
+
+    if name in BUILTIN_PLUGINS:
+        module = importlib.import_module(BUILTIN_PLUGINS[name], __package__)
+        return getattr(module, name)
+
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP, name=name):
+        plugin_class = entry_point.load()
+        if not issubclass(plugin_class, Plugin):
+            raise TypeError(f"{entry_point.value} is not a plugin")
+        return plugin_class
+
+    raise KeyError(f"No such plugin: {name}")
+
+
+class PluginSpec:
+    """
+    A plugin as configured in revalkyr.yaml: its name, the options it's
+    created with and, if it runs in a worker process, the limits there.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        options: dict | None = None,
+        isolation: ProcessLimits | None = None,
+    ):
+        self.name = name
+        self.options = dict(options or {})
+        self.isolation = isolation
+
+    def __repr__(self):
+        return f"PluginSpec(name={self.name}, isolated={self.isolation is not None})"
+
+    def create(self) -> Plugin:
+        return load_plugin_class(self.name)(**self.options)
@@ -0,0 +1,176 @@
+import re
+
+from ..rescript.rescript_decls import (
+    Declaration,
+    merge_declarations,
+    parse_declarations,
+)
+from ..rescript.rescript_errors import (
+    CompilationError,
+    MissingModuleCompilationError,
+    MissingValueCompilationError,
+)
+from ..utils.typings import Typings
+
+
+class FixInput:
+    """
+    Everything a template rule gets to look at.
+    """
+
+    def __init__(
+        self,
+        error: CompilationError,
+        module_name: str,
+        package_name: str,
+        value_names: list[str],
+        bindings_source: str | None,
+        typings: Typings | None,
+    ):
+        self.error = error
+        self.module_name = module_name
+        self.package_name = package_name
+        # The values used from the module that the bindings don't have.
+        self.value_names = value_names
+        self.bindings_source = bindings_source
+        self.typings = typings
+
+
+class TemplateRule:
+    """
+    A mechanical fix for a common error. apply() returns the new bindings
+    source, or None if the rule doesn't apply.
+    """
+
+    name = "rule"
+
+    def apply(self, fix: FixInput) -> str | None:
+        return None
+
+
+def _is_missing_binding(error: CompilationError) -> bool:
+    return isinstance(
+        error, (MissingModuleCompilationError, MissingValueCompilationError)
+    )
+
+
+class MissingFunctionRule(TemplateRule):
+    name = "missing-function"
+
+    def apply(self, fix: FixInput) -> str | None:
+        if not _is_missing_binding(fix.error) or fix.bindings_source is None:
+            return None
+
+        stubs = function_stubs(fix.package_name, fix.value_names, fix.typings)
+        if stubs is None:
+            return None
+
+        return merge_declarations(fix.bindings_source, stubs)
+
+
+class NewModuleRule(TemplateRule):
+    name = "new-module"
+
+    def apply(self, fix: FixInput) -> str | None:
+        if not _is_missing_binding(fix.error) or fix.bindings_source is not None:
+            return None
+
+        return function_stubs(fix.package_name, fix.value_names, fix.typings)
+
+
+RULES: list[TemplateRule] = [MissingFunctionRule(), NewModuleRule()]
+
+
+def function_stubs(
+    package_name: str, value_names: list[str], typings: Typings | None
+) -> str | None:
+    """
+    Writes an external for each of the named functions, typed only by how
+    many arguments it takes. Returns None unless the typings have all of
+    them.
+    """
+
+    if typings is None or not value_names:
+        return None
+
+    stubs = []
+    for name in dict.fromkeys(value_names):
+        function = typings.get_function(name)
+        if function is None:
+            return None
+
+        arity, is_default_member = function
+        attributes = f'@module("{package_name}")'
+        if is_default_member:
+            attributes += ' @scope("default")'
+
+        stubs.append(f'{attributes}\nexternal {name}: {_stub_type(arity)} = "{name}"')
+
+    return "\n\n".join(stubs) + "\n"
+
+
+def _stub_type(arity: int) -> str:
+    type_vars = [f"'{chr(ord('a') + i)}" for i in range(min(arity, 25) + 1)]
+    if arity == 0:
+        return f"unit => {type_vars[0]}"
+    if arity == 1:
+        return f"{type_vars[0]} => {type_vars[1]}"
+    return f"({', '.join(type_vars[:-1])}) => {type_vars[-1]}"
+
+
+def fix_default_scopes(
+    source: str, package_name: str, typings: Typings | None
+) -> tuple[str, list[str]]:
+    """
+    Adds @scope("default") to @module externals of the package that only
+    exist as members of its default export. Returns the fixed source and the
+    names of the externals that were changed.
+    """
+
+    if typings is None or not typings.default_members:
+        return (source, [])
+
+    module_attribute = re.compile(rf'@module\(\s*"{re.escape(package_name)}"\s*\)')
+
+    fixed = []
+    patch = []
+    for decl in _externals(source):
+        if "scope" in decl.attributes or "send" in decl.attributes:
+            continue
+
+        function = typings.get_function(decl.name)
+        if function is None or not function[1]:
+            continue
+
+        m = module_attribute.search(decl.source)
+        if m:
+            patch.append(
+                decl.source[: m.end()] + ' @scope("default")' + decl.source[m.end() :]
+            )
+            fixed.append(decl.name)
+
+    if not patch:
+        return (source, [])
+
+    return (merge_declarations(source, "\n\n".join(patch)), fixed)
+
+
+def _externals(source: str) -> list[Declaration]:
+    return [
+        decl
+        for decl in parse_declarations(source)
+        if decl.kind == "external" and "module" in decl.attributes
+    ]
+
+
+def apply_rules(fix: FixInput) -> tuple[str, str] | None:
+    """
+    Returns the name of the first rule that applies and the bindings source
+    it came up with.
+    """
+
+    for rule in RULES:
+        source = rule.apply(fix)
+        if source is not None:
+            return (rule.name, source)
+    return None
@@ -0,0 +1,87 @@
+import time
+import traceback
+
+from . import services
+
+from .config import Config
+from .context import Context
+from .plugins import Plugin, PluginResult
+from .plugins.plugin_host import ProcessPlugin
+from .plugins.registry import PluginSpec, plugin_exists
+from .services.service_mgr import ServiceMgr
+from .shared import SharedResources
+
+
+class Project:
+    def __init__(self, config: Config, shared: SharedResources | None = None):
+        self.ctx = Context(config, shared)
+        self.log = self.ctx.log
+
+        self.service_mgr = ServiceMgr(self.ctx, services.__all__)
+        self.plugins: list[Plugin] = []
+
+    @property
+    def name(self) -> str:
+        return self.ctx.config.name
+
+    def init(self) -> None:
+        self.service_mgr.init()
+
+        for spec in self.ctx.config.plugins:
+            start = time.perf_counter()
+            try:
+                plugin = self.create_plugin(spec)
+                plugin.init()
+            except Exception:
+                self.log.error(
+                    f"{spec.name} failed to start:\n{traceback.format_exc()}"
+                )
+                continue
+
+            self.log.info(f"Started {spec.name} in {time.perf_counter() - start:.3f}s")
+            self.plugins.append(plugin)
+
+    def create_plugin(self, spec: PluginSpec) -> Plugin:
+        # An isolated plugin is only imported in its worker process, but its
+        # name is checked here, rather than have the worker fail over and over.
+        if spec.isolation is not None:
+            if not plugin_exists(spec.name):
+                raise KeyError(f"No such plugin: {spec.name}")
+            plugin = ProcessPlugin(spec, spec.isolation)
+        else:
+            plugin = spec.create()
+
+        plugin.ctx = self.ctx
+        plugin.log = self.ctx.log
+        plugin.service_mgr = self.service_mgr
+        return plugin
+
+    def run_plugins(self, keep_idle: bool = False) -> bool:
+        """
+        Runs every active plugin once. Plugins that have nothing to do are
+        dropped unless keep_idle is set. Returns whether any plugin is still
+        active.
+        """
+
+        plugins_to_keep = []
+
+        for plugin in self.plugins:
+            try:
+                result = plugin.run()
+            except Exception:
+                # One broken plugin shouldn't stop the others; it gets
+                # another go on the next tick.
+                self.log.error(f"{plugin.name} failed:\n{traceback.format_exc()}")
+                result = PluginResult.RUN_AGAIN
+
+            if result != PluginResult.NOTHING_TO_DO or keep_idle:
+                plugins_to_keep.append(plugin)
+
+        self.plugins = plugins_to_keep
+
+        try:
+            self.service_mgr.get_service(services.SessionStore).save()
+        except Exception:
+            self.log.error(f"Couldn't save the session:\n{traceback.format_exc()}")
+
+        return len(self.plugins) > 0
@@ -1,6 +1,17 @@
 import re
 
 
+# Parsetree nodes that hold a (possibly module qualified) path.
+_MODULE_PATH_NODES = {
+    "Pexp_ident",
+    "Pexp_construct",
+    "Ppat_construct",
+    "Ptyp_constr",
+    "Pmod_ident",
+    "Pexp_field",
+}
+
+
 class Ident:
     def __init__(self, name: str):
         self.module_name: str | None = None
@@ -54,6 +65,27 @@ class AST:
 
         return [Ident(ref) if isinstance(ref, str) else ref for ref in refs]
 
+    def find_module_references(self, root: Node = None) -> set[str]:
+        """
+        Returns the names of the other modules this one refers to.
+        """
+
+        if root is None:
+            root = self.root
+
+        modules = set()
+
+        for child in root.children:
+            if child.type in _MODULE_PATH_NODES and len(child.data) > 1:
+                path = child.data[1].split(".")
+                if child.type == "Pmod_ident" or len(path) > 1:
+                    if path[0][:1].isupper():
+                        modules.add(path[0])
+
+            modules |= self.find_module_references(child)
+
+        return modules
+
     @staticmethod
     def parse(compiler_output: str):
         l = compiler_output.splitlines()
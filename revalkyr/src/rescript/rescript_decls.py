@@ -0,0 +1,247 @@
+import re
+
+from textwrap import dedent
+
+KEYWORDS = ("external", "let", "type", "module", "open", "include", "exception")
+
+_NAME_PATTERNS = {
+    "external": re.compile(r"^external\s+(\\?\"[^\"]+\"|\w+)"),
+    "let": re.compile(r"^let\s+(?:rec\s+)?(\\?\"[^\"]+\"|\w+)"),
+    "type": re.compile(r"^type\s+(?:rec\s+)?(\w+)"),
+    "module": re.compile(r"^module\s+(?:type\s+|rec\s+)?(\w+)"),
+    "open": re.compile(r"^open!?\s+([\w.]+)"),
+    "include": re.compile(r"^include\s+([\w.]+)"),
+    "exception": re.compile(r"^exception\s+(\w+)"),
+}
+
+_ATTRIBUTE = re.compile(r"@(@?[\w.]+)(\((?:[^()]|\([^()]*\))*\))?\s*")
+
+
+class Declaration:
+    """
+    A top-level declaration in a ReScript source file, including the comments
+    and attributes in front of it.
+    """
+
+    def __init__(self, source: str):
+        self.source = source.strip("\n")
+        self.attributes: list[str] = []
+        self.kind: str | None = None
+        self.name: str | None = None
+
+        body = self._strip_comments(self.source).strip()
+        while body.startswith("@"):
+            m = _ATTRIBUTE.match(body)
+            if not m:
+                break
+            self.attributes.append(m.group(1))
+            body = body[m.end() :]
+
+        self.body = body
+
+        for kind, pattern in _NAME_PATTERNS.items():
+            m = pattern.match(body)
+            if m:
+                self.kind = kind
+                self.name = m.group(1).lstrip("\\").strip('"')
+                break
+
+    @property
+    def key(self) -> tuple[str, str] | None:
+        # Values and externals share a namespace, so redefining one with the
+        # other replaces it.
+        if self.name is None:
+            return None
+        kind = "value" if self.kind in ("let", "external") else self.kind
+        return (kind, self.name)
+
+    def __repr__(self):
+        return f"Declaration(kind={self.kind}, name={self.name})"
+
+    @staticmethod
+    def _strip_comments(source: str) -> str:
+        source = re.sub(r"/\*.*?\*/", "", source, flags=re.DOTALL)
+        return "\n".join(
+            line for line in source.splitlines() if not line.lstrip().startswith("//")
+        )
+
+
+def bracket_depth(
+    line: str, depth: int = 0, in_comment: bool = False
+) -> tuple[int, bool]:
+    """
+    Returns the bracket depth after the given line and whether the line ends
+    inside a block comment. Strings and comments are skipped.
+    """
+
+    i = 0
+    n = len(line)
+    while i < n:
+        c = line[i]
+        if in_comment:
+            if line.startswith("*/", i):
+                in_comment = False
+                i += 1
+        elif line.startswith("//", i):
+            break
+        elif line.startswith("/*", i):
+            in_comment = True
+            i += 1
+        elif c in '"`':
+            i += 1
+            while i < n and line[i] != c:
+                if line[i] == "\\":
+                    i += 1
+                i += 1
+        elif c in "([{":
+            depth += 1
+        elif c in ")]}":
+            depth -= 1
+        i += 1
+
+    return depth, in_comment
+
+
+def parse_declarations(source: str) -> list[Declaration]:
+    """
+    Splits ReScript source into its top-level declarations. This is not a
+    real parser, it only knows enough to tell where one declaration ends and
+    the next begins.
+    """
+
+    declarations = []
+    current: list[str] = []
+    # Whether the current chunk holds anything but comments and attributes.
+    has_body = False
+
+    depth = 0
+    in_comment = False
+
+    for line in dedent(source).splitlines():
+        stripped = line.strip()
+
+        if depth == 0 and not in_comment and not line[:1].isspace():
+            is_prefix = stripped.startswith(("@", "//", "/*"))
+            # Attributes can share the line with the declaration they belong to.
+            starts_declaration = _ATTRIBUTE.sub("", stripped).startswith(KEYWORDS)
+
+            # 'and' continues a recursive type or let binding.
+            if stripped.startswith("and "):
+                pass
+            elif (starts_declaration or is_prefix) and has_body:
+                declarations.append(Declaration("\n".join(current)))
+                current = []
+                has_body = False
+
+            if starts_declaration:
+                has_body = True
+
+        current.append(line)
+        depth, in_comment = bracket_depth(line, depth, in_comment)
+
+    if "".join(current).strip():
+        declarations.append(Declaration("\n".join(current)))
+
+    return declarations
+
+
+def declared_values(source: str) -> set[str]:
+    """
+    Returns the names of all top-level externals and let bindings.
+    """
+
+    return set(
+        decl.name
+        for decl in parse_declarations(source)
+        if decl.kind in ("external", "let")
+    )
+
+
+_REMOVE_DIRECTIVE = re.compile(r"^\s*//\s*remove:\s*(\S+)\s*$", re.MULTILINE)
+
+
+def merge_declarations(source: str, patch: str) -> str:
+    """
+    Merges a patch consisting of new or changed declarations into source.
+    Declarations in the patch replace the ones in source with the same name,
+    and new ones are added (types after the existing types, everything else
+    at the end). A '// remove: <name>' line in the patch removes the named
+    declaration.
+    """
+
+    removed = set(_REMOVE_DIRECTIVE.findall(patch))
+    patch = _REMOVE_DIRECTIVE.sub("", patch)
+
+    declarations = [
+        decl for decl in parse_declarations(source) if decl.name not in removed
+    ]
+    index = {decl.key: i for i, decl in enumerate(declarations) if decl.key}
+
+    for decl in parse_declarations(patch):
+        if decl.key is None:
+            continue
+
+        if decl.key in index:
+            declarations[index[decl.key]] = decl
+            continue
+
+        if decl.kind == "type":
+            types = [i for i, d in enumerate(declarations) if d.kind == "type"]
+            i = types[-1] + 1 if types else 0
+            declarations.insert(i, decl)
+            index = {d.key: j for j, d in enumerate(declarations) if d.key}
+        else:
+            index[decl.key] = len(declarations)
+            declarations.append(decl)
+
+    return "\n\n".join(decl.source for decl in declarations) + "\n"
+
+
+class DeclarationStream:
+    """
+    Extracts the first fenced code block from a reply as it streams in and
+    hands out declarations as soon as they're known to be complete.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._emitted = 0
+
+    @property
+    def code(self) -> str:
+        start = self.text.find("```")
+        if start == -1:
+            return ""
+
+        start = self.text.find("\n", start)
+        if start == -1:
+            return ""
+
+        end = self.text.find("```", start)
+        return self.text[start + 1 : end if end != -1 else len(self.text)]
+
+    @property
+    def is_closed(self) -> bool:
+        return self.text.count("```") >= 2
+
+    def feed(self, chunk: str) -> list[Declaration]:
+        self.text += chunk
+
+        # Declarations can only be completed by a new line.
+        if "\n" not in chunk and "`" not in chunk:
+            return []
+
+        declarations = parse_declarations(self.code)
+        if not self.is_closed:
+            # The last declaration might still be growing.
+            declarations = declarations[:-1]
+
+        return self._take(declarations)
+
+    def finish(self) -> list[Declaration]:
+        return self._take(parse_declarations(self.code))
+
+    def _take(self, declarations: list[Declaration]) -> list[Declaration]:
+        new = declarations[self._emitted :]
+        self._emitted = max(self._emitted, len(declarations))
+        return new
@@ -1,14 +1,66 @@
+import hashlib
+import re
+
 from pathlib import Path
 
 
+def normalize_compiler_output(compiler_output: str) -> str:
+    """
+    Strips the parts of the compiler output that change between builds
+    without the error itself changing (line and column numbers, the code
+    excerpt gutter and timing lines).
+    """
+
+    s = re.sub(r"(\.res):\d+(:\d+)?(-\d+(:\d+)?)?", r"\1", compiler_output)
+    s = re.sub(r"^\s*\d+\s*[│|┆].*$", "", s, flags=re.MULTILINE)
+    s = re.sub(r"^.*\d+(\.\d+)?\s*m?s\s*$", "", s, flags=re.MULTILINE)
+    return "\n".join(line.strip() for line in s.splitlines() if line.strip())
+
+
 class CompilationError:
     def __init__(self, file: Path, line: int):
         self.file = file
         self.line = line
+        # The error's part of the compiler output.
+        self.text = ""
+        # Counts the errors before this one with the same text in the same
+        # file, so that identical errors get ids of their own.
+        self.occurrence = 0
 
     def __repr__(self):
         return f"{type(self).__name__}(file={self.file}, line={self.line})"
 
+    @property
+    def id(self) -> str:
+        """
+        Identifies the error across builds. Line numbers aren't part of it,
+        so the error keeps its id when code above it moves.
+        """
+
+        h = hashlib.sha256()
+        for part in (
+            type(self).__name__,
+            str(self.file),
+            normalize_compiler_output(self.text),
+            str(self.occurrence),
+        ):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()[:16]
+
+
+def number_occurrences(errors: list[CompilationError]) -> None:
+    """
+    Sets the occurrence of each error, in the order they were reported.
+    """
+
+    seen: dict[str, int] = dict()
+    for error in errors:
+        error.occurrence = 0
+        key = error.id
+        error.occurrence = seen.get(key, 0)
+        seen[key] = error.occurrence + 1
+
 
 class MissingModuleCompilationError(CompilationError):
     def __init__(self, file: str, line: int, module_name: str):
@@ -39,3 +91,40 @@ class WrongTypeCompilationError(CompilationError):
 
 class UnknownCompilationError(CompilationError):
     pass
+
+
+class DiagnosticsDiff:
+    """
+    How the errors of one build compare to the ones of the build before.
+    """
+
+    def __init__(
+        self,
+        build_id: int,
+        new: list[CompilationError],
+        resolved: list[CompilationError],
+        persisting: list[CompilationError],
+    ):
+        self.build_id = build_id
+        self.new = new
+        self.resolved = resolved
+        self.persisting = persisting
+
+    def __repr__(self):
+        return f"DiagnosticsDiff(build={self.build_id}, new={len(self.new)}, resolved={len(self.resolved)}, persisting={len(self.persisting)})"
+
+    @staticmethod
+    def between(
+        previous: list[CompilationError],
+        current: list[CompilationError],
+        build_id: int,
+    ) -> "DiagnosticsDiff":
+        previous_ids = {error.id for error in previous}
+        current_ids = {error.id for error in current}
+
+        return DiagnosticsDiff(
+            build_id,
+            [error for error in current if error.id not in previous_ids],
+            [error for error in previous if error.id not in current_ids],
+            [error for error in current if error.id in previous_ids],
+        )
@@ -0,0 +1,100 @@
+import re
+
+from pathlib import Path
+
+_COMMENT = re.compile(r"/\*.*?\*/|//[^\n]*", re.DOTALL)
+_STRING = re.compile(r'"(?:\\.|[^"\\])*"|`(?:\\.|[^`\\])*`')
+_MODULE_PATH = re.compile(r"\b([A-Z]\w*)\s*\.")
+_QUALIFIED_VALUE = re.compile(r"\b([A-Z]\w*)\.([a-z_]\w*)")
+_MODULE_STATEMENT = re.compile(
+    r"\b(?:open!?|include|module\s+\w+\s*=)\s+([A-Z]\w*)", re.MULTILINE
+)
+
+
+def module_name_of(file: Path) -> str:
+    # Foo.res and foo.res both define the module Foo.
+    return file.stem[:1].upper() + file.stem[1:]
+
+
+def scan_module_references(source: str) -> set[str]:
+    """
+    Finds the modules a source file refers to without a parser, for when
+    there's no parsetree to go by.
+    """
+
+    source = _COMMENT.sub("", source)
+    source = _STRING.sub('""', source)
+    return set(_MODULE_PATH.findall(source)) | set(_MODULE_STATEMENT.findall(source))
+
+
+def scan_qualified_values(source: str) -> dict[str, set[str]]:
+    """
+    Finds the values used from other modules, like get in Ky.get, grouped
+    by module.
+    """
+
+    source = _COMMENT.sub("", source)
+    source = _STRING.sub('""', source)
+
+    values: dict[str, set[str]] = dict()
+    for module_name, value_name in _QUALIFIED_VALUE.findall(source):
+        values.setdefault(module_name, set()).add(value_name)
+    return values
+
+
+class ModuleGraph:
+    """
+    Which modules in the project depend on which. Kept up to date one file
+    at a time, as files change.
+    """
+
+    def __init__(self):
+        self._files: dict[Path, str] = dict()
+        # Module -> the modules it refers to.
+        self._dependencies: dict[str, set[str]] = dict()
+
+    def __contains__(self, module_name: str) -> bool:
+        return module_name in self._dependencies
+
+    def __len__(self) -> int:
+        return len(self._dependencies)
+
+    def update(self, file: Path, references: set[str]) -> None:
+        module_name = module_name_of(file)
+        self._files[file] = module_name
+
+        self._dependencies[module_name] = references - {module_name}
+
+    def remove(self, file: Path) -> None:
+        module_name = self._files.pop(file, None)
+        if module_name is not None:
+            del self._dependencies[module_name]
+
+    def order(self, module_names: list[str]) -> list[str]:
+        """
+        Sorts the modules so that every module comes after the modules it
+        depends on. Modules in a cycle keep their relative order.
+        """
+
+        depths: dict[str, int] = dict()
+
+        def depth(module_name: str, visiting: set[str]) -> int:
+            if module_name in depths:
+                return depths[module_name]
+            if module_name in visiting:
+                return 0
+
+            visiting.add(module_name)
+            d = 1 + max(
+                (
+                    depth(dependency, visiting)
+                    for dependency in self._dependencies.get(module_name, ())
+                ),
+                default=-1,
+            )
+            visiting.discard(module_name)
+
+            depths[module_name] = d
+            return d
+
+        return sorted(module_names, key=lambda m: depth(m, set()))
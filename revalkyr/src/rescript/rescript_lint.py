@@ -0,0 +1,149 @@
+import re
+
+from .rescript_decls import Declaration, bracket_depth, parse_declarations
+
+# Modules and types that come with ReScript and must never be redefined by
+# bindings.
+BUILTIN_MODULES = {"Js", "Belt", "Array", "List", "Option", "Promise", "String"}
+BUILTIN_TYPES = {
+    "array",
+    "bool",
+    "dict",
+    "float",
+    "int",
+    "list",
+    "option",
+    "promise",
+    "result",
+    "string",
+    "unit",
+}
+
+
+class Problem:
+    def __init__(self, rule: str, message: str, fixable: bool = False):
+        self.rule = rule
+        self.message = message
+        self.fixable = fixable
+
+    def __repr__(self):
+        return f"Problem(rule={self.rule}, message='{self.message}')"
+
+    def __str__(self):
+        return self.message
+
+
+class Rule:
+    """
+    Checks one declaration at a time. fix() returns the fixed declaration, or
+    None if the declaration should be dropped.
+    """
+
+    name = "rule"
+
+    def check(self, decl: Declaration) -> str | None:
+        return None
+
+    def fix(self, decl: Declaration) -> Declaration | None:
+        return decl
+
+
+class ModuleWithSendRule(Rule):
+    name = "module-with-send"
+
+    def check(self, decl: Declaration) -> str | None:
+        if decl.kind == "external" and {"module", "send"} <= set(decl.attributes):
+            return (
+                f"{decl.name} uses @module and @send together, it's one or the other."
+            )
+        return None
+
+    def fix(self, decl: Declaration) -> Declaration | None:
+        # An @send external is called on its first argument, so the @module
+        # is the one that's wrong.
+        return Declaration(re.sub(r"@module(\([^)]*\))?\s*", "", decl.source, count=1))
+
+
+class BuiltinRedefinitionRule(Rule):
+    name = "builtin-redefinition"
+
+    def check(self, decl: Declaration) -> str | None:
+        if decl.kind == "module" and decl.name in BUILTIN_MODULES:
+            return f"{decl.name} is a built-in module and must not be redefined."
+        if decl.kind == "type" and decl.name in BUILTIN_TYPES:
+            return f"{decl.name} is a built-in type and must not be redefined."
+        return None
+
+    def fix(self, decl: Declaration) -> Declaration | None:
+        return None
+
+
+RULES: list[Rule] = [ModuleWithSendRule(), BuiltinRedefinitionRule()]
+
+
+def check_declaration(decl: Declaration) -> str | None:
+    """
+    Runs the per-declaration rules, returning the first problem found.
+    """
+
+    for rule in RULES:
+        problem = rule.check(decl)
+        if problem:
+            return problem
+    return None
+
+
+def autofix(source: str) -> tuple[str, list[Problem], list[Problem]]:
+    """
+    Checks generated bindings for known-bad patterns and repairs the ones
+    that have a deterministic fix. Returns the (possibly) fixed source, the
+    problems that were fixed and the problems that remain.
+    """
+
+    fixed: list[Problem] = []
+    remaining: list[Problem] = []
+
+    depth, in_comment = 0, False
+    for line in source.splitlines():
+        depth, in_comment = bracket_depth(line, depth, in_comment)
+    if depth != 0 or in_comment:
+        remaining.append(
+            Problem(
+                "unbalanced", "The file has unbalanced braces, brackets or comments."
+            )
+        )
+        # Nothing else can be trusted if we can't tell declarations apart.
+        return source, fixed, remaining
+
+    declarations = []
+    for decl in parse_declarations(source):
+        for rule in RULES:
+            message = rule.check(decl)
+            if message:
+                fixed.append(Problem(rule.name, message, True))
+                decl = rule.fix(decl)
+                if decl is None:
+                    break
+        if decl is not None:
+            declarations.append(decl)
+
+    # Keep the last of duplicated declarations, since that's usually the one
+    # the AI meant to write. Only declarations of the same kind are
+    # duplicates; a let with the name of an external shadows it, which
+    # bindings often do to wrap the external.
+    last = {(decl.kind, decl.key): i for i, decl in enumerate(declarations) if decl.key}
+    for i, decl in enumerate(declarations):
+        if decl.key and last[(decl.kind, decl.key)] != i:
+            fixed.append(
+                Problem("duplicate", f"{decl.name} is defined more than once.", True)
+            )
+    declarations = [
+        decl
+        for i, decl in enumerate(declarations)
+        if not decl.key or last[(decl.kind, decl.key)] == i
+    ]
+
+    if fixed:
+        source = "\n\n".join(decl.source for decl in declarations) + "\n"
+
+    return source, fixed, remaining
@@ -2,18 +2,24 @@ from .service_mgr import ServiceMgr
 
 from .ai import OpenAI
 from .bindings_store import BindingsStore
+from .dependencies import Dependencies
 from .github import GitHub
 from .npm import NPM
 from .rescript import ReScript
+from .scheduler import Scheduler
+from .session_store import SessionStore
 from .source_file_mgr import SourceFileMgr
 from .url_fetcher import URLFetcher
 
 __all__ = [
     BindingsStore,
+    Dependencies,
     GitHub,
     NPM,
     OpenAI,
     ReScript,
+    Scheduler,
+    SessionStore,
     SourceFileMgr,
     URLFetcher,
 ]
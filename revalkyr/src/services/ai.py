@@ -1,109 +1,531 @@
 import openai
 import time
 
+from collections import OrderedDict
 from textwrap import dedent
+from typing import Callable, Iterator, TypeVar
 
+from .ai_backends import (
+    AIBackend,
+    LiveBackend,
+    Message,
+    RecordingBackend,
+    ReplayBackend,
+)
+from .scheduler import Priority, Scheduler, backoff_delay, retry_after
 from .service import Service
+from ..rescript.rescript_decls import Declaration, DeclarationStream
 
+T = TypeVar("T")
 
-class Message:
-    def __init__(self, created_at, role, content):
-        self.created_at = int(created_at)
-        self.role = role
-        self.content = content
 
-    def __repr__(self):
-        return f"{self.role}: '{self.content}'"
+def estimate_tokens(messages: list[dict[str, str]]) -> int:
+    # Roughly four characters per token, which is close enough for rate
+    # limiting.
+    return sum(len(message["content"]) for message in messages) // 4
+
+
+def stream_reply(
+    ai: "OpenAI",
+    messages: list[dict[str, str]],
+    check: Callable[[Declaration], str | None],
+    attempts: int,
+    model: str,
+    priority: Priority,
+) -> str:
+    """
+    Streams a reply and checks every declaration in its code block as soon as
+    it's complete. If check() finds a problem, the reply is abandoned right
+    away and the AI is asked again. The last attempt is kept no matter what.
+    """
+
+    for attempt in range(attempts):
+        stream = DeclarationStream()
+        problem = None
+
+        chunks = ai.stream_chat_completion(messages, model, priority)
+        try:
+            for chunk in chunks:
+                for decl in stream.feed(chunk):
+                    problem = check(decl)
+                    if problem:
+                        break
+                if problem or stream.is_closed:
+                    break
+        finally:
+            chunks.close()
+
+        if problem is None:
+            for decl in stream.finish():
+                problem = check(decl)
+                if problem:
+                    break
+
+        if problem is None or attempt == attempts - 1:
+            break
+
+        ai.log.warn(f"Aborted the AI's reply early: {problem}")
+        messages = [
+            *messages,
+            {"role": "assistant", "content": stream.text},
+            {"role": "user", "content": f"That's not right: {problem} Try again."},
+        ]
+
+    return stream.text
 
 
 class AssistantThread:
-    def __init__(self, assistant_id):
+    def __init__(
+        self,
+        assistant_id,
+        ai: "OpenAI",
+        priority: Priority = Priority.USER_BLOCKING,
+        thread_id: str = None,
+        turns: int = 0,
+    ):
         self.assistant_id = assistant_id
-        self.thread_id = openai.beta.threads.create().id
+        self.ai = ai
+        self.backend = ai.backend
+        self.priority = priority
+        # An existing thread_id reattaches to a thread from an earlier session.
+        self.thread_id = thread_id or ai.call(
+            self.backend.create_thread, priority=priority
+        )
         self.run_id: str | None = None
+        # Number of runs so far, used to decide when to compact the thread.
+        self.turns = turns
+
+        # Local copy of the conversation, used for streamed runs.
+        self.history: list[dict[str, str]] = []
+        self._streamed_message: Message | None = None
+        # The run whose reply is in the history already.
+        self._history_run_id: str | None = None
 
     def add_message(self, content: str) -> None:
         # Dedent everything just to normalize.
         content = dedent(content)
         # print(content)
         # print("-" * 80)
-        openai.beta.threads.messages.create(
-            thread_id=self.thread_id, role="user", content=content
+        self.ai.call(
+            self.backend.add_message, self.thread_id, content, priority=self.priority
         )
+        self.history.append({"role": "user", "content": content})
 
     def add_source_code(self, source_code: str, language: str) -> None:
         source_code = f"```{language}\n{dedent(source_code.strip())}\n```"
         self.add_message(source_code)
 
     def run(self, instructions: str = None) -> None:
-        run = openai.beta.threads.runs.create(
-            thread_id=self.thread_id,
-            assistant_id=self.assistant_id,
-            instructions=instructions,
+        # The whole thread counts towards the token limit on every run.
+        self.run_id = self.ai.call(
+            self.backend.create_run,
+            self.thread_id,
+            self.assistant_id,
+            instructions,
+            priority=self.priority,
+            tokens=estimate_tokens(self.history),
         )
+        self.turns += 1
+        self._streamed_message = None
 
-        self.run_id = run.id
+    def run_streamed(
+        self,
+        check: Callable[[Declaration], str | None],
+        attempts: int = 3,
+        model: str = "gpt-4-1106-preview",
+    ) -> None:
+        """
+        Like run(), but streams the reply through the chat completions API, see
+        stream_reply().
+        """
+
+        # The assistants API can't stream runs, so the conversation is sent
+        # with the assistant's instructions through chat completions instead.
+        messages = [
+            {
+                "role": "system",
+                "content": self.ai.get_assistant_instructions(self.assistant_id),
+            },
+            *self.history,
+        ]
+
+        self.turns += 1
+
+        content = stream_reply(self.ai, messages, check, attempts, model, self.priority)
+
+        # Runs on the thread should see the reply too, like their own.
+        self.ai.call(
+            self.backend.add_message,
+            self.thread_id,
+            content,
+            "assistant",
+            priority=self.priority,
+        )
+        self.history.append({"role": "assistant", "content": content})
+        self._streamed_message = Message(time.time(), "assistant", content)
 
     def is_ready(self) -> bool:
         if self.run_id is None:
             return False
 
-        run = openai.beta.threads.runs.retrieve(
-            thread_id=self.thread_id, run_id=self.run_id
+        status = self.ai.call(
+            self.backend.get_run_status,
+            self.thread_id,
+            self.run_id,
+            priority=self.priority,
         )
-        return run.status == "completed"
+        if status in ("failed", "cancelled", "expired"):
+            raise RuntimeError(f"The AI run {self.run_id} {status}")
+        return status == "completed"
 
     def get_last_message(self) -> Message:
-        messages = self.get_messages()
-        # print(messages[-1])
-        return messages[-1]
+        if self._streamed_message is not None:
+            return self._streamed_message
+
+        self.wait_until_ready()
+        message = self.ai.call(
+            self.backend.get_last_message, self.thread_id, priority=self.priority
+        )
+
+        # And streamed runs should see the run's reply.
+        if self._history_run_id != self.run_id:
+            self.history.append({"role": "assistant", "content": message.content})
+            self._history_run_id = self.run_id
+
+        return message
 
     def get_messages(self) -> list[Message]:
         self.wait_until_ready()
+        return self.ai.call(
+            self.backend.get_messages, self.thread_id, priority=self.priority
+        )
+
+    def wait_until_ready(self) -> None:
+        if self.run_id is None:
+            raise RuntimeError("You must run the thread_first")
+
+        # Every poll counts against the rate limit, so poll less and less
+        # often while a run takes its time.
+        attempt = 0
+        while not self.is_ready():
+            time.sleep(backoff_delay(attempt, 0.5, 8.0))
+            attempt += 1
+
+    def delete(self) -> None:
+        try:
+            # Nobody is waiting for the cleanup.
+            self.ai.call(
+                self.backend.delete_thread,
+                self.thread_id,
+                priority=Priority.BACKGROUND,
+                attempts=1,
+            )
+        except openai.OpenAIError:
+            # It's only cleanup, the thread is abandoned either way.
+            pass
+
+
+class ChatThread:
+    """
+    Works like an AssistantThread, but keeps the conversation locally and
+    gets replies through stateless chat completions. That's a lot quicker
+    than an assistant run, and lets small fixes use a faster model. A chat
+    thread is used for a single fix and its runs finish before run() returns,
+    so it isn't saved with the session and there's nothing to resume.
+    """
 
-        messages = openai.beta.threads.messages.list(thread_id=self.thread_id)
+    def __init__(
+        self,
+        ai: "OpenAI",
+        model: str,
+        system: str,
+        priority: Priority = Priority.USER_BLOCKING,
+    ):
+        self.ai = ai
+        self.model = model
+        self.system = system
+        self.priority = priority
+        # Nothing is kept on the server, so there's no id and nothing to
+        # delete.
+        self.thread_id = None
+        self.turns = 0
 
-        m = []
+        self.history: list[dict[str, str]] = []
+        self._reply: Message | None = None
 
-        for message in messages:
-            created_at = message.created_at
-            role = message.role
-            content = message.content[0].text.value
+    def add_message(self, content: str) -> None:
+        self.history.append({"role": "user", "content": dedent(content)})
 
-            m.append(Message(created_at, role, content))
+    def add_source_code(self, source_code: str, language: str) -> None:
+        source_code = f"```{language}\n{dedent(source_code.strip())}\n```"
+        self.add_message(source_code)
 
-        return sorted(m, key=lambda msg: msg.created_at)
+    def run(self, instructions: str = None) -> None:
+        messages = [
+            {"role": "system", "content": instructions or self.system},
+            *self.history,
+        ]
+        self._add_reply(self.ai.complete(messages, self.model, self.priority))
+
+    def run_streamed(
+        self,
+        check: Callable[[Declaration], str | None],
+        attempts: int = 3,
+        model: str = None,
+    ) -> None:
+        messages = [{"role": "system", "content": self.system}, *self.history]
+        self._add_reply(
+            stream_reply(
+                self.ai,
+                messages,
+                check,
+                attempts,
+                model or self.model,
+                self.priority,
+            )
+        )
 
     def wait_until_ready(self) -> None:
-        if self.run_id is None:
+        if self._reply is None:
             raise RuntimeError("You must run the thread_first")
 
-        while not self.is_ready():
-            time.sleep(1)
+    def get_last_message(self) -> Message:
+        self.wait_until_ready()
+        return self._reply
+
+    def delete(self) -> None:
+        pass
+
+    def _add_reply(self, content: str) -> None:
+        self.turns += 1
+        self.history.append({"role": "assistant", "content": content})
+        self._reply = Message(time.time(), "assistant", content)
+
+
+class AssistantThreadPool:
+    """
+    Keeps a bounded number of named threads around. The least recently used
+    thread is deleted when there are too many, and a thread that has had
+    max_turns runs is replaced by a fresh one so prompts don't keep growing.
+    """
+
+    def __init__(
+        self,
+        ai: "OpenAI",
+        max_threads: int = 16,
+        max_turns: int = 6,
+        priority: Priority = Priority.USER_BLOCKING,
+    ):
+        self.ai = ai
+        self.max_threads = max_threads
+        self.max_turns = max_turns
+        self.priority = priority
+
+        self._threads: OrderedDict[str, AssistantThread] = OrderedDict()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._threads
+
+    def find(self, thread_id: str) -> AssistantThread | None:
+        for thread in self._threads.values():
+            if thread.thread_id == thread_id:
+                return thread
+        return None
+
+    def remove(self, name: str) -> None:
+        thread = self._threads.pop(name, None)
+        if thread is not None:
+            thread.delete()
+
+    def get_state(self) -> dict[str, dict]:
+        # The local history goes along, streamed runs are made from it.
+        return {
+            name: {
+                "thread_id": thread.thread_id,
+                "turns": thread.turns,
+                "history": thread.history,
+            }
+            for name, thread in self._threads.items()
+        }
+
+    def restore(self, state: dict[str, dict]) -> None:
+        """
+        Reattaches to the threads of an earlier session, as returned by
+        get_state().
+        """
+
+        for name, thread in state.items():
+            self._threads[name] = self.ai.create_assistant_thread(
+                priority=self.priority,
+                thread_id=thread["thread_id"],
+                turns=thread.get("turns", 0),
+            )
+            self._threads[name].history = list(thread.get("history", []))
+
+    def get(self, name: str) -> tuple[AssistantThread, bool]:
+        """
+        Returns the named thread and whether it's brand new. A compacted
+        thread doesn't count as new; it's up to the caller to send the current
+        file and error again, which it does on every turn anyway.
+        """
+
+        thread = self._threads.get(name)
+
+        if thread is not None and thread.turns < self.max_turns:
+            self._threads.move_to_end(name)
+            return (thread, False)
+
+        if thread is not None:
+            self.ai.log.debug(
+                f"Compacting AI thread (name='{name}') after {thread.turns} turns"
+            )
+            thread.delete()
+        else:
+            self.ai.log.debug(f"Created new AI thread (name='{name}')")
+
+        is_new = thread is None
+        self._threads[name] = self.ai.create_assistant_thread(priority=self.priority)
+        self._threads.move_to_end(name)
+
+        while len(self._threads) > self.max_threads:
+            evicted_name, evicted = self._threads.popitem(last=False)
+            self.ai.log.debug(f"Evicted AI thread (name='{evicted_name}')")
+            evicted.delete()
+
+        return (self._threads[name], is_new)
 
 
 class OpenAI(Service):
+    def init(self) -> None:
+        self._instructions: dict[str, str] = dict()
+        self.scheduler = self.get_service(Scheduler)
+        self.backend = self.create_backend()
+
+    def create_backend(self) -> AIBackend:
+        config = self.ctx.config
+
+        if config.ai_backend == "live":
+            return LiveBackend(self.scheduler.ai.update_limits)
+
+        if config.ai_backend == "record":
+            self.log.info(f"Recording AI responses to {config.ai_recording}")
+            return RecordingBackend(
+                LiveBackend(self.scheduler.ai.update_limits),
+                config.ai_recording,
+                config.root_dir,
+            )
+
+        if config.ai_backend == "replay":
+            self.log.info(f"Replaying AI responses from {config.ai_recording}")
+            return ReplayBackend(
+                config.ai_recording,
+                config.ai_latency,
+                config.ai_fallback,
+                config.root_dir,
+            )
+
+        raise ValueError(f"Unknown AI backend: {config.ai_backend}")
+
     def create_assistant_thread(
-        self, assistant_id: str = "asst_3MpzZ2qz0xPimu4UvjyGVD8P"
+        self,
+        assistant_id: str = None,
+        priority: Priority = Priority.USER_BLOCKING,
+        thread_id: str = None,
+        turns: int = 0,
     ) -> AssistantThread:
-        return AssistantThread(assistant_id)
+        return AssistantThread(
+            assistant_id or self.ctx.config.ai_assistant_id,
+            self,
+            priority,
+            thread_id,
+            turns,
+        )
+
+    def create_chat_thread(
+        self, model: str, priority: Priority = Priority.USER_BLOCKING
+    ) -> ChatThread:
+        # Same instructions as the assistant, so replies look the same.
+        system = self.get_assistant_instructions(self.ctx.config.ai_assistant_id)
+        return ChatThread(self, model, system, priority)
+
+    def call(
+        self,
+        fn: Callable[..., T],
+        *args,
+        priority: Priority = Priority.USER_BLOCKING,
+        tokens: int = 0,
+        attempts: int = 5,
+    ) -> T:
+        """
+        Calls the backend once the rate limits allow it. Failed calls are
+        retried with exponential backoff, and when rate limited, every
+        project backs off for as long as the provider asks.
+        """
+
+        for attempt in range(attempts):
+            self.scheduler.ai.acquire(self.scheduler.project, priority, tokens)
+
+            try:
+                return fn(*args)
+            except openai.RateLimitError as e:
+                if attempt == attempts - 1:
+                    raise
+
+                delay = retry_after(e.response.headers) or backoff_delay(attempt)
+                self.log.warn(f"Rate limited by the AI, backing off for {delay:.1f}s")
+                self.scheduler.ai.back_off(delay)
+            except (openai.APIConnectionError, openai.InternalServerError):
+                if attempt == attempts - 1:
+                    raise
+
+                time.sleep(backoff_delay(attempt))
+
+    def get_assistant_instructions(self, assistant_id: str) -> str:
+        if assistant_id not in self._instructions:
+            self._instructions[assistant_id] = self.call(
+                self.backend.get_assistant_instructions, assistant_id
+            )
+
+        return self._instructions[assistant_id]
 
     def get_chat_completion(
-        self, system: str, user: str, model: str = "gpt-4-1106-preview"
+        self,
+        system: str,
+        user: str,
+        model: str = "gpt-4-1106-preview",
+        priority: Priority = Priority.USER_BLOCKING,
     ) -> str:
         messages = [
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ]
 
-        # Retry a few times since the API sometimes fails randomly.
-        attempts = 5
-        while attempts > 0:
-            attempts -= 1
+        return self.complete(messages, model, priority)
 
-            try:
-                response = openai.ChatCompletion.create(model=model, messages=messages)
-                return response.choices[0].message.content
-            except openai.error.OpenAIError:
-                if attempts == 0:
-                    raise
+    def complete(
+        self,
+        messages: list[dict[str, str]],
+        model: str = "gpt-4-1106-preview",
+        priority: Priority = Priority.USER_BLOCKING,
+    ) -> str:
+        return self.call(
+            self.backend.chat_completion,
+            messages,
+            model,
+            priority=priority,
+            tokens=estimate_tokens(messages),
+        )
+
+    def stream_chat_completion(
+        self,
+        messages: list[dict[str, str]],
+        model: str = "gpt-4-1106-preview",
+        priority: Priority = Priority.USER_BLOCKING,
+    ) -> Iterator[str]:
+        return self.call(
+            self.backend.stream_chat_completion,
+            messages,
+            model,
+            priority=priority,
+            tokens=estimate_tokens(messages),
+        )
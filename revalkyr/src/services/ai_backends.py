@@ -0,0 +1,423 @@
+import hashlib
+import itertools
+import json
+import openai
+import os
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Iterator, Mapping
+
+
+class Message:
+    def __init__(self, created_at, role, content):
+        self.created_at = int(created_at)
+        self.role = role
+        self.content = content
+
+    def __repr__(self):
+        return f"{self.role}: '{self.content}'"
+
+
+class AIBackend(ABC):
+    """
+    Everything Revalkyr needs from an AI provider. The assistants part mirrors
+    the OpenAI threads/runs workflow.
+    """
+
+    @abstractmethod
+    def create_thread(self) -> str:
+        pass
+
+    @abstractmethod
+    def delete_thread(self, thread_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def add_message(self, thread_id: str, content: str, role: str = "user") -> None:
+        pass
+
+    @abstractmethod
+    def create_run(
+        self, thread_id: str, assistant_id: str, instructions: str | None
+    ) -> str:
+        pass
+
+    @abstractmethod
+    def get_run_status(self, thread_id: str, run_id: str) -> str:
+        pass
+
+    @abstractmethod
+    def get_last_message(self, thread_id: str) -> Message:
+        pass
+
+    @abstractmethod
+    def get_messages(self, thread_id: str) -> list[Message]:
+        pass
+
+    @abstractmethod
+    def get_assistant_instructions(self, assistant_id: str) -> str:
+        pass
+
+    @abstractmethod
+    def chat_completion(self, messages: list[dict[str, str]], model: str) -> str:
+        pass
+
+    @abstractmethod
+    def stream_chat_completion(
+        self, messages: list[dict[str, str]], model: str
+    ) -> Iterator[str]:
+        pass
+
+
+class LiveBackend(AIBackend):
+    def __init__(self, on_headers: Callable[[Mapping[str, str]], None] = None):
+        # Called with the headers of every response, e.g. to keep track of
+        # rate limits.
+        self.on_headers = on_headers
+
+    def create_thread(self) -> str:
+        return self._parse(openai.beta.threads.with_raw_response.create()).id
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._parse(openai.beta.threads.with_raw_response.delete(thread_id))
+
+    def add_message(self, thread_id: str, content: str, role: str = "user") -> None:
+        self._parse(
+            openai.beta.threads.messages.with_raw_response.create(
+                thread_id=thread_id, role=role, content=content
+            )
+        )
+
+    def create_run(
+        self, thread_id: str, assistant_id: str, instructions: str | None
+    ) -> str:
+        run = self._parse(
+            openai.beta.threads.runs.with_raw_response.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                instructions=instructions,
+            )
+        )
+        return run.id
+
+    def get_run_status(self, thread_id: str, run_id: str) -> str:
+        run = self._parse(
+            openai.beta.threads.runs.with_raw_response.retrieve(
+                thread_id=thread_id, run_id=run_id
+            )
+        )
+        return run.status
+
+    def get_last_message(self, thread_id: str) -> Message:
+        # Only fetch the newest message instead of listing the whole thread.
+        messages = self._parse(
+            openai.beta.threads.messages.with_raw_response.list(
+                thread_id=thread_id, order="desc", limit=1
+            )
+        )
+        message = messages.data[0]
+        return Message(message.created_at, message.role, message.content[0].text.value)
+
+    def get_messages(self, thread_id: str, page_size: int = 100) -> list[Message]:
+        m = []
+
+        # Page by page rather than letting the client do it, so that every
+        # request goes through _parse().
+        kwargs = dict()
+        while True:
+            page = self._parse(
+                openai.beta.threads.messages.with_raw_response.list(
+                    thread_id=thread_id, limit=page_size, **kwargs
+                )
+            )
+
+            for message in page.data:
+                created_at = message.created_at
+                role = message.role
+                content = message.content[0].text.value
+
+                m.append(Message(created_at, role, content))
+
+            if len(page.data) < page_size:
+                break
+            kwargs["after"] = page.data[-1].id
+
+        return sorted(m, key=lambda msg: msg.created_at)
+
+    def get_assistant_instructions(self, assistant_id: str) -> str:
+        assistant = self._parse(
+            openai.beta.assistants.with_raw_response.retrieve(assistant_id)
+        )
+        return assistant.instructions or ""
+
+    def chat_completion(self, messages: list[dict[str, str]], model: str) -> str:
+        response = self._parse(
+            openai.chat.completions.with_raw_response.create(
+                model=model, messages=messages
+            )
+        )
+        return response.choices[0].message.content
+
+    def stream_chat_completion(
+        self, messages: list[dict[str, str]], model: str
+    ) -> Iterator[str]:
+        # The request is made right away, so that errors like rate limiting
+        # are raised here rather than when the reply is first read.
+        stream = self._parse(
+            openai.chat.completions.with_raw_response.create(
+                model=model, messages=messages, stream=True
+            )
+        )
+        return self._read_stream(stream)
+
+    def _read_stream(self, stream) -> Iterator[str]:
+        try:
+            for chunk in stream:
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+        finally:
+            # Closing the response is what cancels the generation.
+            stream.response.close()
+
+    def _parse(self, response):
+        if self.on_headers is not None:
+            self.on_headers(response.headers)
+        return response.parse()
+
+
+def request_key(kind: str, *parts: any, root_dir: Path | None = None) -> str:
+    """
+    Identifies a request by its content, so that it can be matched up with a
+    recording no matter which thread or run ids it got. Paths in root_dir
+    (e.g. in compiler output) count as relative, so that a recording works
+    wherever the project is checked out.
+    """
+
+    s = json.dumps([kind, *parts], sort_keys=True)
+    if root_dir is not None:
+        root = json.dumps(str(root_dir))[1:-1]
+        for sep in {"/", json.dumps(os.sep)[1:-1]}:
+            s = s.replace(root + sep, "")
+        s = s.replace(root, ".")
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+
+class _ConversationTracker:
+    # Keeps track of what's been said in each thread, to compute request keys.
+
+    def __init__(self, root_dir: Path | None = None):
+        self.root_dir = root_dir
+        self.threads: dict[str, list[str]] = dict()
+
+    def key(self, kind: str, *parts: any) -> str:
+        return request_key(kind, *parts, root_dir=self.root_dir)
+
+    def run_key(self, thread_id: str, assistant_id: str, instructions: str | None):
+        return self.key("run", assistant_id, instructions, self.threads[thread_id])
+
+
+class RecordingBackend(AIBackend):
+    """
+    Passes everything through to another backend and appends every model
+    response to a JSON-lines file, for ReplayBackend to play back later.
+    """
+
+    def __init__(
+        self, backend: AIBackend, path: Path | str, root_dir: Path | None = None
+    ):
+        self.backend = backend
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conversations = _ConversationTracker(root_dir)
+        # Thread id -> key of the run whose reply hasn't been recorded yet.
+        self._pending: dict[str, str] = dict()
+
+    def create_thread(self) -> str:
+        thread_id = self.backend.create_thread()
+        self._conversations.threads[thread_id] = []
+        return thread_id
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.backend.delete_thread(thread_id)
+        self._conversations.threads.pop(thread_id, None)
+
+    def add_message(self, thread_id: str, content: str, role: str = "user") -> None:
+        self.backend.add_message(thread_id, content, role)
+        self._conversations.threads.setdefault(thread_id, []).append(content)
+
+    def create_run(
+        self, thread_id: str, assistant_id: str, instructions: str | None
+    ) -> str:
+        self._conversations.threads.setdefault(thread_id, [])
+        run_id = self.backend.create_run(thread_id, assistant_id, instructions)
+        self._pending[thread_id] = self._conversations.run_key(
+            thread_id, assistant_id, instructions
+        )
+        return run_id
+
+    def get_run_status(self, thread_id: str, run_id: str) -> str:
+        return self.backend.get_run_status(thread_id, run_id)
+
+    def get_last_message(self, thread_id: str) -> Message:
+        message = self.backend.get_last_message(thread_id)
+
+        key = self._pending.pop(thread_id, None)
+        if key is not None:
+            self._record(key, "run", message.content)
+            self._conversations.threads[thread_id].append(message.content)
+
+        return message
+
+    def get_messages(self, thread_id: str) -> list[Message]:
+        return self.backend.get_messages(thread_id)
+
+    def get_assistant_instructions(self, assistant_id: str) -> str:
+        instructions = self.backend.get_assistant_instructions(assistant_id)
+        self._record(
+            self._conversations.key("instructions", assistant_id),
+            "instructions",
+            instructions,
+        )
+        return instructions
+
+    def chat_completion(self, messages: list[dict[str, str]], model: str) -> str:
+        content = self.backend.chat_completion(messages, model)
+        self._record(self._conversations.key("chat", model, messages), "chat", content)
+        return content
+
+    def stream_chat_completion(
+        self, messages: list[dict[str, str]], model: str
+    ) -> Iterator[str]:
+        chunks = self.backend.stream_chat_completion(messages, model)
+        return self._record_stream(
+            self._conversations.key("chat", model, messages), chunks
+        )
+
+    def _record_stream(self, key: str, chunks: Iterator[str]) -> Iterator[str]:
+        content = []
+        try:
+            for chunk in chunks:
+                content.append(chunk)
+                yield chunk
+        finally:
+            chunks.close()
+
+        # Only complete replies are recorded; abandoned ones never finish.
+        self._record(key, "chat", "".join(content))
+
+    def _record(self, key: str, kind: str, response: str) -> None:
+        line = json.dumps({"key": key, "kind": kind, "response": response})
+        with self._lock:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class ReplayBackend(AIBackend):
+    """
+    A local stand-in for the AI that answers from a recording made by
+    RecordingBackend, with a configurable latency per request. Requests that
+    aren't in the recording get the fallback reply, or raise KeyError if there
+    is none.
+    """
+
+    def __init__(
+        self,
+        path: Path | str | None = None,
+        latency: float = 0.0,
+        fallback: str | None = None,
+        root_dir: Path | None = None,
+    ):
+        self.latency = latency
+        self.fallback = fallback
+
+        self._responses: dict[str, str] = dict()
+        if path is not None and Path(path).exists():
+            with Path(path).open("r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        r = json.loads(line)
+                        self._responses[r["key"]] = r["response"]
+
+        self._ids = itertools.count(1)
+        self._conversations = _ConversationTracker(root_dir)
+        # Run id -> (key, time when it completes).
+        self._runs: dict[str, tuple[str, float]] = dict()
+        self._messages: dict[str, list[Message]] = dict()
+
+    def create_thread(self) -> str:
+        thread_id = f"replay_thread_{next(self._ids)}"
+        self._conversations.threads[thread_id] = []
+        self._messages[thread_id] = []
+        return thread_id
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._conversations.threads.pop(thread_id, None)
+        self._messages.pop(thread_id, None)
+
+    def add_message(self, thread_id: str, content: str, role: str = "user") -> None:
+        # Threads from an earlier session are taken to be empty.
+        self._conversations.threads.setdefault(thread_id, []).append(content)
+        self._messages.setdefault(thread_id, []).append(
+            Message(time.time(), role, content)
+        )
+
+    def create_run(
+        self, thread_id: str, assistant_id: str, instructions: str | None
+    ) -> str:
+        run_id = f"replay_run_{next(self._ids)}"
+        self._conversations.threads.setdefault(thread_id, [])
+        self._messages.setdefault(thread_id, [])
+        key = self._conversations.run_key(thread_id, assistant_id, instructions)
+        self._runs[run_id] = (key, time.monotonic() + self.latency)
+
+        # The reply is part of the conversation as soon as the run completes.
+        content = self._respond(key)
+        self._conversations.threads[thread_id].append(content)
+        self._messages[thread_id].append(Message(time.time(), "assistant", content))
+
+        return run_id
+
+    def get_run_status(self, thread_id: str, run_id: str) -> str:
+        if run_id not in self._runs:
+            # Runs from an earlier session are gone.
+            return "expired"
+        _, done_at = self._runs[run_id]
+        return "completed" if time.monotonic() >= done_at else "in_progress"
+
+    def get_last_message(self, thread_id: str) -> Message:
+        return self._messages[thread_id][-1]
+
+    def get_messages(self, thread_id: str) -> list[Message]:
+        return list(self._messages[thread_id])
+
+    def get_assistant_instructions(self, assistant_id: str) -> str:
+        key = self._conversations.key("instructions", assistant_id)
+        return self._responses.get(key, "")
+
+    def chat_completion(self, messages: list[dict[str, str]], model: str) -> str:
+        time.sleep(self.latency)
+        return self._respond(self._conversations.key("chat", model, messages))
+
+    def stream_chat_completion(
+        self, messages: list[dict[str, str]], model: str
+    ) -> Iterator[str]:
+        content = self._respond(self._conversations.key("chat", model, messages))
+
+        # Spread the latency over the reply, a line at a time.
+        lines = content.splitlines(keepends=True) or [""]
+        for line in lines:
+            time.sleep(self.latency / len(lines))
+            yield line
+
+    def _respond(self, key: str) -> str:
+        if key in self._responses:
+            return self._responses[key]
+        if self.fallback is not None:
+            return self.fallback
+        raise KeyError(f"No recorded AI response for request {key}")
@@ -1,17 +1,285 @@
+import hashlib
+import os
+import threading
+import yaml
+
 from pathlib import Path
 
+from .npm import NPM
 from .service import Service
+from ..utils.file_lock import file_lock
+from ..utils.semver import satisfies
+
+MANIFEST_FILENAME = "manifest.yaml"
+# Held while a process changes the manifest of the local bindings cache.
+LOCK_FILENAME = ".manifest.lock"
+
+
+class KnownBindings:
+    def __init__(
+        self,
+        module_name: str,
+        package_name: str,
+        file: Path,
+        versions: str = "*",
+        aliases: list[str] | None = None,
+        content_hash: str | None = None,
+        version: str | None = None,
+        successes: int = 0,
+    ):
+        self.module_name = module_name
+        self.package_name = package_name
+        self.file = file
+        self.versions = versions
+        self.aliases = list(aliases or [])
+        self.content_hash = content_hash
+        # Only used for bindings promoted into the local cache.
+        self.version = version
+        self.successes = successes
+
+    def __repr__(self):
+        return (
+            f"KnownBindings(module_name={self.module_name}, versions='{self.versions}')"
+        )
+
+
+def load_manifest(bindings_dir: Path) -> list[KnownBindings]:
+    entries = []
+
+    manifest = bindings_dir.joinpath(MANIFEST_FILENAME)
+    if manifest.exists():
+        m = yaml.safe_load(manifest.read_text(encoding="utf-8")) or {}
+        for e in m.get("bindings", []):
+            module_name = e["module"]
+            entries.append(
+                KnownBindings(
+                    module_name,
+                    e.get("package", module_name.lower()),
+                    bindings_dir.joinpath(
+                        e.get("file", f"{module_name}/{module_name}.res")
+                    ),
+                    versions=str(e.get("versions", "*")),
+                    aliases=e.get("aliases", []),
+                    content_hash=e.get("hash"),
+                    version=e.get("version"),
+                    successes=e.get("successes", 0),
+                )
+            )
+
+    return entries
+
+
+def save_manifest(bindings_dir: Path, entries: list[KnownBindings]) -> None:
+    bindings = []
+    for entry in entries:
+        e = {
+            "module": entry.module_name,
+            "package": entry.package_name,
+            "aliases": entry.aliases,
+            "versions": entry.versions,
+            "file": entry.file.relative_to(bindings_dir).as_posix(),
+            "hash": entry.content_hash,
+        }
+        if entry.version is not None:
+            e["version"] = entry.version
+        if entry.successes > 0:
+            e["successes"] = entry.successes
+        bindings.append(e)
+
+    manifest = bindings_dir.joinpath(MANIFEST_FILENAME)
+    tmp = manifest.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(yaml.safe_dump({"bindings": bindings}, sort_keys=False))
+    os.replace(tmp, manifest)
+
+
+class BindingsCache:
+    """
+    Bindings that Revalkyr generated and that were verified to compile, shared
+    between all projects on this machine, and all processes: changes are made
+    under a file lock to the manifest as it is on disk.
+    """
+
+    def __init__(self, bindings_dir: Path):
+        self.bindings_dir = bindings_dir
+        self._lock = threading.Lock()
+        self._manifest_stat: tuple[int, int] | None = None
+        self.entries: list[KnownBindings] = []
+        self._reload()
+
+    def find(self, module_name: str, version: str | None) -> KnownBindings | None:
+        with self._lock:
+            self._reload()
+            for entry in self.entries:
+                if entry.module_name.lower() != module_name.lower():
+                    continue
+                # Without an installed version to go by, only bindings that
+                # were promoted for any version will do.
+                if version is None and entry.versions == "*":
+                    return entry
+                if version is not None and entry.version == version:
+                    return entry
+        return None
+
+    def promote(
+        self, module_name: str, package_name: str, version: str | None, source: str
+    ) -> KnownBindings:
+        content_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+        with self._lock, file_lock(self.bindings_dir.joinpath(LOCK_FILENAME)):
+            # Another process may have changed the manifest since it was read.
+            self.entries = load_manifest(self.bindings_dir)
+            entry = next(
+                (
+                    e
+                    for e in self.entries
+                    if e.module_name == module_name and e.version == version
+                ),
+                None,
+            )
+
+            if entry is None:
+                file = self.bindings_dir.joinpath(
+                    module_name, version or "unknown", f"{module_name}.res"
+                )
+                entry = KnownBindings(
+                    module_name,
+                    package_name,
+                    file,
+                    versions=version or "*",
+                    version=version,
+                )
+                self.entries.append(entry)
+
+            if entry.content_hash == content_hash:
+                entry.successes += 1
+            else:
+                entry.file.parent.mkdir(parents=True, exist_ok=True)
+                tmp = entry.file.with_suffix(f".{os.getpid()}.tmp")
+                tmp.write_text(source, encoding="utf-8")
+                os.replace(tmp, entry.file)
+                entry.content_hash = content_hash
+                entry.successes = 1
+
+            save_manifest(self.bindings_dir, self.entries)
+            self._manifest_stat = self._stat_manifest()
+
+        return entry
+
+    def _reload(self) -> None:
+        # Only when the manifest changed, find() is called a lot.
+        stat = self._stat_manifest()
+        if stat != self._manifest_stat:
+            self.entries = load_manifest(self.bindings_dir)
+            self._manifest_stat = stat
+
+    def _stat_manifest(self) -> tuple[int, int] | None:
+        try:
+            stat = self.bindings_dir.joinpath(MANIFEST_FILENAME).stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
 
 
 class BindingsStore(Service):
+    def init(self) -> None:
+        # Lower-cased module name, alias or package name -> candidate bindings.
+        self._index: dict[str, list[KnownBindings]] = dict()
+        self._sources: dict[Path, str] = dict()
+
+        self.load_index(self.ctx.config.bindings_dir)
+
+        cache_dir = self.ctx.config.cache_dir.joinpath("bindings")
+        self._cache: BindingsCache = self.ctx.shared.get(
+            "bindings.cache", lambda: BindingsCache(cache_dir)
+        )
+
+    def load_index(self, bindings_dir: Path) -> None:
+        if not bindings_dir.is_dir():
+            return
+
+        entries = load_manifest(bindings_dir)
+
+        # Pick up bindings that haven't been added to the manifest (yet).
+        listed = set(entry.file for entry in entries)
+        for file in bindings_dir.glob("*/*.res"):
+            if file.stem == file.parent.name and file not in listed:
+                entries.append(KnownBindings(file.stem, file.stem.lower(), file))
+
+        for entry in entries:
+            self.add(entry)
+
+        self.log.debug(f"Indexed {len(entries)} known bindings in {bindings_dir}")
+
+    def add(self, entry: KnownBindings) -> None:
+        keys = {entry.module_name, entry.package_name, *entry.aliases}
+        for key in keys:
+            self._index.setdefault(key.lower(), []).append(entry)
+
+    def find_bindings(self, module_name: str) -> KnownBindings | None:
+        npm = self.get_service(NPM)
+
+        # Bindings verified in one of our own projects take precedence.
+        entry = self.find_cached_bindings(module_name)
+        if entry is not None:
+            return entry
+
+        for entry in self._index.get(module_name.lower(), []):
+            version = npm.get_installed_version(entry.package_name)
+            if version is None or satisfies(version, entry.versions):
+                return entry
+
+            self.log.debug(
+                f"Known bindings for {module_name} require {entry.package_name}@{entry.versions}, but {version} is installed"
+            )
+
+        return None
+
+    def find_cached_bindings(self, module_name: str) -> KnownBindings | None:
+        npm = self.get_service(NPM)
+
+        version = npm.get_installed_version(module_name.lower())
+        return self._cache.find(module_name, version)
+
     def has_known_bindings(self, module_name: str) -> bool:
-        path = Path("../..").joinpath("bindings", module_name)
-        return path.exists()
+        return self.find_bindings(module_name) is not None
 
     def get_known_bindings(self, module_name: str) -> str | None:
-        if not self.has_known_bindings(module_name):
+        entry = self.find_bindings(module_name)
+        if entry is None:
             return None
 
         self.log.info(f"Retrieved ready-made bindings for {module_name}")
-        path = Path("../..").joinpath("bindings", module_name, f"{module_name}.res")
-        return path.read_text(encoding="utf-8")
+        return self.read_bindings(entry)
+
+    def promote_bindings(self, module_name: str, source: str) -> None:
+        """
+        Records bindings that made the project compile in the local cache, so
+        that other projects using the same package version can reuse them.
+        """
+
+        npm = self.get_service(NPM)
+
+        package_name = module_name.lower()
+        version = npm.get_installed_version(package_name)
+        entry = self._cache.promote(module_name, package_name, version, source)
+        self._sources.pop(entry.file, None)
+
+        self.log.debug(
+            f"Promoted {module_name} bindings for {package_name}@{version} to the local cache ({entry.successes} successful builds)"
+        )
+
+    def read_bindings(self, entry: KnownBindings) -> str:
+        if entry.file not in self._sources:
+            source = entry.file.read_text(encoding="utf-8")
+
+            content_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()
+            if entry.content_hash is None:
+                entry.content_hash = content_hash
+            elif entry.content_hash != content_hash:
+                self.log.warn(
+                    f"{entry.file} doesn't match the hash in its manifest, it has been modified"
+                )
+
+            self._sources[entry.file] = source
+
+        return self._sources[entry.file]
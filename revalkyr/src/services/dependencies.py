@@ -0,0 +1,166 @@
+import json
+
+from pathlib import Path
+
+from .github import GitHub
+from .npm import NPM
+from .rescript import ReScript
+from .service import Service
+from .session_store import SessionStore
+from ..utils.file_watcher import FileWatcher
+
+LOCKFILES = ["package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml"]
+COMPILER_CONFIGS = ["bsconfig.json", "rescript.json"]
+
+
+class Dependencies(Service):
+    """
+    Watches package.json, the lockfile and the compiler config, and keeps a
+    fingerprint (the resolved version) of every direct dependency. When
+    dependencies change, only what's tied to the packages whose version
+    changed is thrown away; everything else stays cached.
+    """
+
+    def init(self) -> None:
+        root_dir = self.ctx.config.root_dir
+
+        self._watched = [
+            root_dir.joinpath(name)
+            for name in ["package.json", *LOCKFILES, *COMPILER_CONFIGS]
+        ]
+        self._stats: dict[Path, tuple[int, int] | None] = dict()
+
+        self.session = self.get_service(SessionStore)
+        self.fingerprints: dict[str, str] = self.session.get("dependencies", {})
+        self.session.register("dependencies", lambda: self.fingerprints)
+
+    def poll(self) -> set[str]:
+        """
+        Returns the packages whose resolved version changed since the last
+        call (or the last session), after invalidating what was cached for
+        them. The very first call only takes fingerprints.
+        """
+
+        if not self._any_files_changed():
+            return set()
+
+        fingerprints = self.get_fingerprints()
+        previous, self.fingerprints = self.fingerprints, fingerprints
+        if fingerprints != previous:
+            self.session.mark_dirty("dependencies")
+        if not previous:
+            return set()
+
+        # A package that was just added has nothing cached to throw away.
+        changed = {
+            name
+            for name in previous
+            if name in fingerprints and previous[name] != fingerprints[name]
+        }
+        changed |= {
+            name
+            for name in set(previous) ^ set(fingerprints)
+            if name.startswith("file:")
+        }
+        if not changed:
+            return set()
+
+        packages = {name for name in changed if not name.startswith("file:")}
+        for package_name in sorted(packages):
+            self.log.info(
+                f"{package_name} changed from {previous.get(package_name)} to {fingerprints.get(package_name)}"
+            )
+            self.invalidate(package_name)
+
+        if packages != changed:
+            self.log.info("The compiler config changed")
+
+        # Either way, what compiled before might not anymore.
+        self.get_service(ReScript).invalidate()
+
+        return packages
+
+    def invalidate(self, package_name: str) -> None:
+        # GitHub first, it needs the repository URL from the NPM cache.
+        self.get_service(GitHub).invalidate(package_name)
+        self.get_service(NPM).invalidate(package_name)
+
+    def get_fingerprints(self) -> dict[str, str]:
+        """
+        Returns the resolved version of every direct dependency, going by the
+        lockfile, then what's installed, then the range in package.json. The
+        compiler config is fingerprinted by its contents, as file:<name>.
+        """
+
+        root_dir = self.ctx.config.root_dir
+        npm = self.get_service(NPM)
+
+        package = self._read_json(root_dir.joinpath("package.json")) or {}
+        ranges: dict[str, str] = dict()
+        for key in ("dependencies", "devDependencies", "peerDependencies"):
+            ranges.update(package.get(key, {}))
+
+        locked = self._locked_versions()
+
+        fingerprints = dict()
+        for package_name, spec in ranges.items():
+            npm.forget_installed_version(package_name)
+            fingerprints[package_name] = (
+                locked.get(package_name)
+                or npm.get_installed_version(package_name)
+                or spec
+            )
+
+        for name in COMPILER_CONFIGS:
+            file = root_dir.joinpath(name)
+            if file.is_file():
+                fingerprints[f"file:{name}"] = FileWatcher.hash_file(file)
+
+        return fingerprints
+
+    def _any_files_changed(self) -> bool:
+        # Stat only, since this runs on every tick.
+        changed = False
+        for file in self._watched:
+            try:
+                stat = file.stat()
+                current = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                current = None
+
+            if file not in self._stats or self._stats[file] != current:
+                changed = True
+            self._stats[file] = current
+
+        return changed
+
+    def _locked_versions(self) -> dict[str, str]:
+        root_dir = self.ctx.config.root_dir
+
+        for name in ("package-lock.json", "npm-shrinkwrap.json"):
+            lock = self._read_json(root_dir.joinpath(name))
+            if lock is None:
+                continue
+
+            versions = dict()
+            # lockfileVersion 2 and 3.
+            for path, entry in lock.get("packages", {}).items():
+                if path.startswith("node_modules/") and "version" in entry:
+                    package_name = path.removeprefix("node_modules/")
+                    if "/node_modules/" not in package_name:
+                        versions[package_name] = entry["version"]
+            # lockfileVersion 1.
+            for package_name, entry in lock.get("dependencies", {}).items():
+                if isinstance(entry, dict) and "version" in entry:
+                    versions.setdefault(package_name, entry["version"])
+            return versions
+
+        # Other lockfiles aren't parsed; what's installed is the next best
+        # thing.
+        return dict()
+
+    def _read_json(self, file: Path) -> dict | None:
+        try:
+            return json.loads(file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
@@ -1,24 +1,27 @@
 from requests.exceptions import RequestException
 
 from .npm import NPM
+from .scheduler import Priority
 from .service import Service
 from .url_fetcher import URLFetcher
 
 
 class GitHub(Service):
-    def download_readme(self, package_name: str) -> str | None:
+    def download_readme(
+        self, package_name: str, priority: Priority = Priority.USER_BLOCKING
+    ) -> str | None:
         npm = self.get_service(NPM)
         url_fetcher = self.get_service(URLFetcher)
 
         filenames = ["readme.rst", "README.rst", "readme.md", "README.md"]
 
-        repo_url = npm.get_github_repo_url(package_name)
+        repo_url = npm.get_github_repo_url(package_name, priority)
         repo_url = self._raw_github_url(repo_url)
         while len(filenames) > 0:
             try:
                 filename = filenames.pop()
                 url = repo_url + f"/main/{filename}"
-                text = url_fetcher.get_text(url)
+                text = url_fetcher.get_text(url, priority)
                 self.log.debug(f"Downloaded {filename} for package {package_name}")
                 return text
             except RequestException:
@@ -26,7 +29,9 @@ class GitHub(Service):
 
         return None
 
-    def download_source_code(self, package_name: str) -> str | None:
+    def download_source_code(
+        self, package_name: str, priority: Priority = Priority.USER_BLOCKING
+    ) -> str | None:
         npm = self.get_service(NPM)
         url_fetcher = self.get_service(URLFetcher)
 
@@ -45,13 +50,13 @@ class GitHub(Service):
             "src/index.js",
         ]
 
-        repo_url = npm.get_github_repo_url(package_name)
+        repo_url = npm.get_github_repo_url(package_name, priority)
         repo_url = self._raw_github_url(repo_url)
         while len(filenames) > 0:
             try:
                 filename = filenames.pop()
                 url = repo_url + f"/main/{filename}"
-                text = url_fetcher.get_text(url)
+                text = url_fetcher.get_text(url, priority)
                 self.log.debug(f"Downloaded {filename} for package {package_name}")
                 return text
             except RequestException:
@@ -59,5 +64,17 @@ class GitHub(Service):
 
         return None
 
+    def invalidate(self, package_name: str) -> None:
+        """
+        Forgets the downloaded files of the package, going by the repository
+        URL that's already known. Nothing was downloaded without one.
+        """
+
+        repo_url = self.get_service(NPM).get_cached_repo_url(package_name)
+        if repo_url:
+            self.get_service(URLFetcher).invalidate_prefix(
+                self._raw_github_url(repo_url) + "/"
+            )
+
     def _raw_github_url(self, url: str) -> str:
         return url.replace("https://github.com", "https://raw.githubusercontent.com")
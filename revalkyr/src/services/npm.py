@@ -1,45 +1,195 @@
-import requests
+import json
+import threading
 
 from bs4 import BeautifulSoup
+from pathlib import Path
 from requests.exceptions import RequestException
 
+from .scheduler import Priority
 from .service import Service
+from .session_store import SessionStore
+from .url_fetcher import URLFetcher
 from ..context import Context
+from ..utils.typings import Typings, relative_imports
 
 
 class NPM(Service):
     def __init__(self, ctx: Context):
         super().__init__(ctx)
 
-        self._cache: dict[str, str | None] = dict()
+        # Shared between all projects served by this process, and used from
+        # background threads too, so only touched while holding the lock.
+        self._cache: dict[str, str | None] = ctx.shared.get("npm.cache", dict)
+        self._lock = ctx.shared.get("npm.lock", threading.Lock)
+        self._installed_versions: dict[str, str | None] = dict()
+        self._typings: dict[str, Typings | None] = dict()
+        # The packages this project has looked up, the only ones its session
+        # keeps.
+        self._packages: set[str] = set()
 
-    def is_npm_package(self, package_name: str) -> bool:
-        return bool(self.get_github_repo_url(package_name))
+    def init(self) -> None:
+        self.session = self.get_service(SessionStore)
 
-    def get_github_repo_url(self, package_name: str) -> str | None:
-        if package_name not in self._cache:
-            self.log.debug(
-                f"Looking up GitHub repository URL for {package_name} on npmjs.com..."
+        cached = self.session.get("npm.cache", {})
+        with self._lock:
+            self._cache.update(cached)
+            self._packages.update(cached)
+
+        self.session.register("npm.cache", self._get_state)
+
+    def is_npm_package(
+        self, package_name: str, priority: Priority = Priority.USER_BLOCKING
+    ) -> bool:
+        return bool(self.get_github_repo_url(package_name, priority))
+
+    def get_github_repo_url(
+        self, package_name: str, priority: Priority = Priority.USER_BLOCKING
+    ) -> str | None:
+        with self._lock:
+            if package_name not in self._packages:
+                self._packages.add(package_name)
+                self.session.mark_dirty("npm.cache")
+
+            if package_name in self._cache:
+                return self._cache[package_name]
+
+        # Not holding the lock while waiting for the network; two threads
+        # might both look the package up, which is harmless.
+        self.log.debug(
+            f"Looking up GitHub repository URL for {package_name} on npmjs.com..."
+        )
+
+        repo_url = None
+        url = f"https://www.npmjs.com/package/{package_name}"
+        try:
+            res = self.get_service(URLFetcher).get(url, priority)
+            res.raise_for_status()
+
+            soup = BeautifulSoup(res.text, "lxml")
+            repo_url_element = soup.select_one("#repository-link")
+            if repo_url_element:
+                repo_url = repo_url_element.text.strip()
+                if not repo_url.startswith("http"):
+                    repo_url = "https://" + repo_url
+                self.log.debug(f"Found it! {repo_url}")
+            else:
+                self.log.warn("Repository URL not found on the package page.")
+        except RequestException as e:
+            self.log.warn(f"Couldn't retrieve the package page: {e}")
+
+        with self._lock:
+            self._cache[package_name] = repo_url
+
+        return repo_url
+
+    def get_cached_repo_url(self, package_name: str) -> str | None:
+        with self._lock:
+            return self._cache.get(package_name)
+
+    def invalidate(self, package_name: str) -> None:
+        """
+        Forgets everything cached about the package.
+        """
+
+        with self._lock:
+            self._cache.pop(package_name, None)
+            if package_name in self._packages:
+                self._packages.discard(package_name)
+                self.session.mark_dirty("npm.cache")
+        self._installed_versions.pop(package_name, None)
+        self._typings.pop(package_name, None)
+
+    def forget_installed_version(self, package_name: str) -> None:
+        self._installed_versions.pop(package_name, None)
+
+    def get_installed_version(self, package_name: str) -> str | None:
+        if package_name not in self._installed_versions:
+            package_json = self.ctx.config.root_dir.joinpath(
+                "node_modules", package_name, "package.json"
             )
 
-            url = f"https://www.npmjs.com/package/{package_name}"
+            version = None
             try:
-                res = requests.get(url)
-                res.raise_for_status()
-
-                soup = BeautifulSoup(res.text, "lxml")
-                repo_url_element = soup.select_one("#repository-link")
-                if repo_url_element:
-                    repo_url = repo_url_element.text.strip()
-                    if not repo_url.startswith("http"):
-                        repo_url = "https://" + repo_url
-                    self._cache[package_name] = repo_url
-                    self.log.debug(f"Found it! {repo_url}")
-                else:
-                    self._cache[package_name] = None
-                    self.log.warn("Repository URL not found on the package page.")
-            except RequestException as e:
-                self._cache[package_name] = None
-                self.log.warn(f"Couldn't retrieve the package page: {e}")
-
-        return self._cache[package_name]
+                version = json.loads(package_json.read_text(encoding="utf-8")).get(
+                    "version"
+                )
+            except (OSError, ValueError):
+                pass
+
+            self._installed_versions[package_name] = version
+
+        return self._installed_versions[package_name]
+
+    def _get_state(self) -> dict[str, str]:
+        # Failed lookups aren't saved, they might work next time.
+        with self._lock:
+            return {k: self._cache[k] for k in self._packages if self._cache.get(k)}
+
+    def get_typings(self, package_name: str) -> Typings | None:
+        """
+        Reads the installed package's TypeScript declarations, following
+        relative imports from the entry point, or the ones from @types.
+        """
+
+        if package_name not in self._typings:
+            typings = None
+
+            node_modules = self.ctx.config.root_dir.joinpath("node_modules")
+            for package_dir in (
+                node_modules.joinpath(package_name),
+                node_modules.joinpath("@types", package_name),
+            ):
+                entry = self._find_typings_entry(package_dir)
+                if entry is not None:
+                    typings = Typings(self._read_typings(entry))
+                    break
+
+            # Only stored when done, so another thread never sees it half-read.
+            self._typings[package_name] = typings
+
+        return self._typings[package_name]
+
+    def _find_typings_entry(self, package_dir: Path) -> Path | None:
+        try:
+            package = json.loads(
+                package_dir.joinpath("package.json").read_text(encoding="utf-8")
+            )
+        except (OSError, ValueError):
+            return None
+
+        candidates = [package.get("types"), package.get("typings")]
+        exports = package.get("exports")
+        if isinstance(exports, dict) and isinstance(exports.get("."), dict):
+            candidates.append(exports["."].get("types"))
+        candidates.append("index.d.ts")
+
+        for candidate in candidates:
+            if isinstance(candidate, str) and package_dir.joinpath(candidate).is_file():
+                return package_dir.joinpath(candidate)
+
+        return None
+
+    def _read_typings(self, entry: Path, max_files: int = 50) -> str:
+        sources = []
+        seen = set()
+        pending = [entry]
+
+        while pending and len(seen) < max_files:
+            file = pending.pop(0).resolve()
+            if file in seen or not file.is_file():
+                continue
+            seen.add(file)
+
+            source = file.read_text(encoding="utf-8", errors="replace")
+            sources.append(source)
+
+            for path in relative_imports(source):
+                # Compiled declarations import './foo.js' but live in
+                # './foo.d.ts'.
+                base = file.parent.joinpath(path)
+                stem = base.name.removesuffix(".js")
+                pending.extend(
+                    [base.with_name(stem + ".d.ts"), base.joinpath("index.d.ts")]
+                )
+
+        return "\n".join(sources)
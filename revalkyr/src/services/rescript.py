@@ -1,18 +1,27 @@
 import re
 import subprocess
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from .service import Service
+from .source_file_mgr import SourceFileMgr
 from ..context import Context
 from ..rescript.rescript_ast import AST, Node
+from ..rescript.rescript_graph import (
+    ModuleGraph,
+    module_name_of,
+    scan_module_references,
+)
 from ..rescript.rescript_errors import (
     CompilationError,
+    DiagnosticsDiff,
     MissingModuleCompilationError,
     MissingValueCompilationError,
     SyntaxCompilationError,
     UnknownCompilationError,
     WrongTypeCompilationError,
+    number_occurrences,
 )
 from ..utils.file_watcher import FileWatcher
 
@@ -23,72 +32,227 @@ class ReScript(Service):
 
         self.compiler_output: str | None = None
 
+        # The errors of the last build, and how they differ from the build
+        # before it.
+        self.build_id = 0
+        self.diagnostics: list[CompilationError] = []
+        self.diagnostics_diff = DiagnosticsDiff(0, [], [], [])
+        # Consumer -> the build it last looked at and that build's errors.
+        self._seen: dict[str, tuple[int, list[CompilationError]]] = dict()
+
+        # File -> (hash of the source, its parsetree).
+        self._asts: dict[Path, tuple[str, AST]] = dict()
+        self._needs_compile = False
+
     def init(self):
         self.src_dir_watcher = FileWatcher(self.ctx.config.src_dir, "*.res")
+        self.module_graph = ModuleGraph()
 
     def compile(self) -> bool:
+        # Whatever has changed so far is about to be compiled.
+        self.update_module_graph()
+        return self._compile()
+
+    def _compile(self) -> bool:
         self.log.info("Compiling...")
+        # The compiler has to see whatever a batch has staged.
+        self.get_service(SourceFileMgr).flush()
+        self._needs_compile = False
 
         result = self._npm_run("rescript")
         if result.returncode == 0:
             self.compiler_output = None
+            self.update_diagnostics()
 
             self.log.info("Compilation finished successfully")
             return True
 
         self.compiler_output = result.stdout
+        self.update_diagnostics()
 
         self.log.info("Compilation failed with errors")
-
-        # Reset changed state.
-        self.src_dir_watcher.any_files_changed()
         return False
 
+    def update_diagnostics(self) -> None:
+        previous = self.diagnostics
+        self.diagnostics = self._parse_errors(self.compiler_output or "")
+
+        self.build_id += 1
+        self.diagnostics_diff = DiagnosticsDiff.between(
+            previous, self.diagnostics, self.build_id
+        )
+        self.log.debug(str(self.diagnostics_diff))
+
     def compile_if_needed(self) -> None:
-        if self.src_dir_watcher.any_files_changed():
-            self.compile()
+        if self.update_module_graph() or self._needs_compile:
+            self._compile()
+
+    def invalidate(self) -> None:
+        """
+        Makes the next compile_if_needed() compile even if no source file has
+        changed, for when what the sources compile against has.
+        """
+
+        self._asts.clear()
+        self._needs_compile = True
+
+    def update_module_graph(self) -> bool:
+        """
+        Brings the module graph up to date with the files that changed since
+        the last call. Returns whether anything changed.
+        """
+
+        changed, removed = self.src_dir_watcher.get_changes()
+        if not changed and not removed:
+            return False
+
+        for file in removed:
+            self.module_graph.remove(file)
+
+        # Getting the parsetrees means running the compiler once per file,
+        # which is worth doing in parallel when the whole project is new.
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for file, references in zip(
+                changed, executor.map(self._scan_module, changed)
+            ):
+                self.module_graph.update(file, references)
+
+        self.log.debug(
+            f"{len(changed) + len(removed)} files changed, {len(self.module_graph)} modules"
+        )
+        return True
+
+    def _scan_module(self, file: Path) -> set[str]:
+        try:
+            ast = self.get_ast(file)
+            if ast is not None:
+                return ast.find_module_references()
+        except (OSError, IndexError):
+            pass
+
+        return scan_module_references(file.read_text(encoding="utf-8"))
 
     def get_ast(self, filename: Path) -> AST:
+        # Parsing means running the compiler, so the result is kept until the
+        # file changes.
+        file = Path(filename).resolve()
+        source_hash = FileWatcher.hash_file(file)
+        cached = self._asts.get(file)
+        if cached is not None and cached[0] == source_hash:
+            return cached[1]
+
         result = self._npm_run("bsc", "-dparsetree", filename)
         if result.returncode == 0:
             return None
 
-        return AST.parse(result.stderr)
+        ast = AST.parse(result.stderr)
+        self._asts[file] = (source_hash, ast)
+        return ast
 
     def get_compiler_output(self) -> str | None:
         self.compile_if_needed()
         return self.compiler_output
 
-    def get_compilation_error(self) -> CompilationError | None:
+    def has_errors_in(self, file: Path) -> bool:
         compiler_output = self.get_compiler_output()
+        return bool(compiler_output) and str(file.resolve()) in compiler_output
+
+    def get_compilation_errors(self) -> list[CompilationError]:
+        """
+        Returns all errors of the last build, upstream modules first so that
+        errors caused by another module's errors come last.
+        """
+
+        self.compile_if_needed()
+        return list(self.diagnostics)
+
+    def get_diagnostics_diff(self, consumer: str) -> DiagnosticsDiff:
+        """
+        Returns how the errors of the last build differ from the ones the
+        consumer (e.g. a plugin's name) saw on its previous call, however many
+        builds ago that was. Without a build since, nothing is new.
+        """
+
+        self.compile_if_needed()
+
+        build_id, seen = self._seen.get(consumer, (0, []))
+        if build_id == self.build_id:
+            return DiagnosticsDiff(build_id, [], [], list(self.diagnostics))
+
+        self._seen[consumer] = (self.build_id, self.diagnostics)
+        return DiagnosticsDiff.between(seen, self.diagnostics, self.build_id)
+
+    def _parse_errors(self, compiler_output: str) -> list[CompilationError]:
         if not compiler_output:
-            return None
+            return []
 
-        m = re.search(r" *(.+\.res)\:(\d+)", compiler_output)
-        if not m:
-            return None
+        errors = []
+
+        # Every error starts with a header like "We've found a bug for you!"
+        # or "Syntax error!", followed by its location.
+        blocks = list(
+            re.finditer(
+                r"^ *(\S[^\n]*[!\d])\s*\n\s*(\S.*\.res)\:(\d+)", compiler_output, re.M
+            )
+        )
+        if not blocks:
+            # Fall back to the first location, whatever it's preceded by.
+            m = re.search(r" *(.+\.res)\:(\d+)", compiler_output)
+            if not m:
+                return []
+            file = self.ctx.config.root_dir.joinpath(m.group(1))
+            return [self._parse_error(file, int(m.group(2)), compiler_output)]
+
+        for i, m in enumerate(blocks):
+            # Warnings come with a location too, but they're not what's
+            # stopping the build.
+            if "Warning number" in m.group(1):
+                continue
+
+            end = blocks[i + 1].start() if i + 1 < len(blocks) else None
+            errors.append(
+                self._parse_error(
+                    self.ctx.config.root_dir.joinpath(m.group(2)),
+                    int(m.group(3)),
+                    compiler_output[m.start() : end],
+                )
+            )
+        number_occurrences(errors)
+
+        modules = self.module_graph.order(
+            list(dict.fromkeys(module_name_of(error.file) for error in errors))
+        )
+        return sorted(
+            errors, key=lambda error: modules.index(module_name_of(error.file))
+        )
 
-        file = Path(m.group(1)).relative_to(Path.cwd())
-        line = int(m.group(2))
+    def _parse_error(self, file: Path, line: int, text: str) -> CompilationError:
+        error = self._classify_error(file, line, text)
+        error.text = text
+        return error
 
-        m = re.search(r"The module or file (.+) can't be found\.", compiler_output)
+    def _classify_error(self, file: Path, line: int, text: str) -> CompilationError:
+        m = re.search(r"The module or file (.+) can't be found\.", text)
         if m:
             return MissingModuleCompilationError(file, line, m.group(1))
 
-        m = re.search(r"The value (.+) can't be found in (.+)", compiler_output)
+        m = re.search(r"The value (.+) can't be found in (.+)", text)
         if m:
             return MissingValueCompilationError(file, line, m.group(1), m.group(2))
 
-        m = re.search(r"Syntax error!", compiler_output)
+        m = re.search(r"Syntax error!", text)
         if m:
             return SyntaxCompilationError(file, line)
 
-        m = re.search(r"This has type: (.+)\n *Somewhere wanted: (.+)", compiler_output)
+        m = re.search(r"This has type: (.+)\n *Somewhere wanted: (.+)", text)
         if m:
             return WrongTypeCompilationError(file, line, m.group(1), m.group(2))
 
         return UnknownCompilationError(file, line)
 
     def _npm_run(self, command: str, *args: list[str]):
-        command = Path(".").joinpath("node_modules", ".bin", command)
-        return subprocess.run([command, *args], capture_output=True, text=True)
+        root_dir = self.ctx.config.root_dir
+        command = root_dir.joinpath("node_modules", ".bin", command)
+        return subprocess.run(
+            [command, *args], capture_output=True, text=True, cwd=root_dir
+        )
@@ -0,0 +1,223 @@
+import itertools
+import re
+import threading
+import time
+
+from enum import IntEnum
+from typing import Mapping
+
+from .service import Service
+from ..context import Context
+
+
+class Priority(IntEnum):
+    # Lower goes first.
+    USER_BLOCKING = 0
+    BACKGROUND = 1
+
+
+class TokenBucket:
+    """
+    Holds up to capacity tokens and refills at capacity per period seconds.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.period = period
+        self.level = capacity
+        self._updated_at = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(
+            self.capacity,
+            self.level + (now - self._updated_at) * self.capacity / self.period,
+        )
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        self.refill()
+
+        # A request bigger than the whole bucket would never fit, so it's let
+        # through as soon as the bucket is full.
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * self.period / self.capacity
+
+    def take(self, amount: float) -> None:
+        self.refill()
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: float | None, remaining: float | None) -> None:
+        """
+        Adjusts the bucket to what the server says. Requests may have been
+        made since the server counted, so remaining is only ever used to
+        lower the level.
+        """
+
+        self.refill()
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+def parse_duration(s: str) -> float | None:
+    """
+    Parses durations like '1s', '6m0s' or '20ms', as used in rate limit
+    headers, into seconds.
+    """
+
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", s or "")
+    if not parts:
+        try:
+            return float(s)
+        except (TypeError, ValueError):
+            return None
+    return sum(float(n) * units[unit] for n, unit in parts)
+
+
+class _Ticket:
+    def __init__(self, project: str, priority: Priority, tokens: int, seq: int):
+        self.project = project
+        self.priority = priority
+        self.tokens = tokens
+        self.seq = seq
+
+
+class RequestScheduler:
+    """
+    Lets requests through at the rate the provider allows. Waiting requests
+    are served by priority, and within a priority round-robin between
+    projects, so one busy project can't starve the others.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int | None = None,
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self._cond = threading.Condition()
+        self._waiting: list[_Ticket] = []
+        self._seq = itertools.count()
+        # Project -> when it was last served, in ticks of _seq.
+        self._last_served: dict[str, int] = dict()
+        self._paused_until = 0.0
+
+    def acquire(
+        self,
+        project: str,
+        priority: Priority = Priority.USER_BLOCKING,
+        tokens: int = 0,
+    ) -> None:
+        """
+        Blocks until the request may be made.
+        """
+
+        with self._cond:
+            ticket = _Ticket(project, priority, tokens, next(self._seq))
+            self._waiting.append(ticket)
+
+            try:
+                while True:
+                    timeout = None
+                    if self._next() is ticket:
+                        timeout = self._wait_time(ticket)
+                        if timeout <= 0:
+                            break
+                    self._cond.wait(timeout)
+
+                self.requests.take(1)
+                if self.tokens is not None:
+                    self.tokens.take(tokens)
+                self._last_served[project] = next(self._seq)
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def update_limits(self, headers: Mapping[str, str]) -> None:
+        """
+        Syncs the buckets with x-ratelimit-* response headers.
+        """
+
+        def number(name: str) -> float | None:
+            try:
+                return float(headers[name])
+            except (KeyError, TypeError, ValueError):
+                return None
+
+        with self._cond:
+            self.requests.sync(
+                number("x-ratelimit-limit-requests"),
+                number("x-ratelimit-remaining-requests"),
+            )
+            if self.tokens is not None:
+                self.tokens.sync(
+                    number("x-ratelimit-limit-tokens"),
+                    number("x-ratelimit-remaining-tokens"),
+                )
+            self._cond.notify_all()
+
+    def back_off(self, seconds: float) -> None:
+        """
+        Holds back every request for a while, after the server has said
+        we're going too fast.
+        """
+
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def _next(self) -> _Ticket:
+        return min(
+            self._waiting,
+            key=lambda t: (t.priority, self._last_served.get(t.project, -1), t.seq),
+        )
+
+    def _wait_time(self, ticket: _Ticket) -> float:
+        wait = max(self._paused_until - time.monotonic(), self.requests.wait_time(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(ticket.tokens))
+        return wait
+
+
+def retry_after(headers: Mapping[str, str] | None) -> float | None:
+    if not headers:
+        return None
+    return parse_duration(headers.get("retry-after"))
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    return min(base * 2**attempt, cap)
+
+
+class Scheduler(Service):
+    """
+    Gives access to the request schedulers, which are shared by every project
+    served from the same process since they all count against the same
+    limits.
+    """
+
+    def __init__(self, ctx: Context):
+        super().__init__(ctx)
+
+        config = ctx.config
+        self.project = str(config.root_dir)
+        self.ai: RequestScheduler = ctx.shared.get(
+            "scheduler.ai",
+            lambda: RequestScheduler(
+                "ai", config.ai_requests_per_minute, config.ai_tokens_per_minute
+            ),
+        )
+        self.http: RequestScheduler = ctx.shared.get(
+            "scheduler.http",
+            lambda: RequestScheduler("http", config.http_requests_per_minute),
+        )
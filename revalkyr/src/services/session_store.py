@@ -0,0 +1,101 @@
+import atexit
+import json
+import os
+import threading
+
+from typing import Callable
+
+from .service import Service
+from ..context import Context
+
+SESSION_DIRNAME = ".revalkyr"
+SESSION_FILENAME = "session.json"
+
+
+class SessionStore(Service):
+    """
+    Keeps state that's expensive to rebuild (AI threads, runs in flight and
+    lookup caches) in root_dir/.revalkyr/session.json, so a restart can pick
+    up where the last process left off. Other services and plugins read
+    their section with get(), register a function that returns it, and call
+    mark_dirty() when it changes; save() only asks for the dirty sections.
+    """
+
+    def __init__(self, ctx: Context):
+        super().__init__(ctx)
+
+        self.file = ctx.config.root_dir.joinpath(SESSION_DIRNAME, SESSION_FILENAME)
+
+        self._lock = threading.Lock()
+        self._sections: dict[str, any] = dict()
+        self._providers: dict[str, Callable[[], any]] = dict()
+        self._dirty: set[str] = set()
+        self._last_saved: str | None = None
+
+        # Loaded right away so that every service can read it in init(),
+        # whatever order they're initialized in.
+        self._load()
+
+    def init(self) -> None:
+        atexit.register(self.save)
+
+    def get(self, section: str, default: any = None) -> any:
+        return self._sections.get(section, default)
+
+    def register(self, section: str, provider: Callable[[], any]) -> None:
+        self._providers[section] = provider
+
+    def mark_dirty(self, section: str) -> None:
+        self._dirty.add(section)
+
+    def unregister_where(self, predicate: Callable[[Callable[[], any]], bool]) -> None:
+        """
+        Drops the providers the predicate matches, e.g. those of a plugin that
+        has stopped. Their sections keep what was last saved.
+        """
+
+        for section, provider in list(self._providers.items()):
+            if predicate(provider):
+                del self._providers[section]
+
+    def save(self) -> None:
+        """
+        Writes the session if any section has been marked dirty since it was
+        last saved.
+        """
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            if not dirty:
+                return
+
+            for section, provider in list(self._providers.items()):
+                if section not in dirty:
+                    continue
+
+                try:
+                    self._sections[section] = provider()
+                except Exception as e:
+                    # The other sections are still worth saving.
+                    self.log.warn(f"Couldn't save the {section} session: {e}")
+
+            s = json.dumps(self._sections, separators=(",", ":"), sort_keys=True)
+            if s == self._last_saved:
+                return
+
+            try:
+                self.file.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.file.with_suffix(".tmp")
+                tmp.write_text(s, encoding="utf-8")
+                os.replace(tmp, self.file)
+                self._last_saved = s
+            except OSError as e:
+                self.log.warn(f"Couldn't save the session: {e}")
+
+    def _load(self) -> None:
+        try:
+            s = self.file.read_text(encoding="utf-8")
+            self._sections = json.loads(s)
+            self._last_saved = s
+        except (OSError, ValueError):
+            self._sections = dict()
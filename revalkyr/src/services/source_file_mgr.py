@@ -1,3 +1,8 @@
+import json
+import os
+import tempfile
+
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
@@ -6,6 +11,9 @@ from .service import Service
 # Something to put in the sources file we write just so we can identify theme.
 COOKIE = "revalkyr-generated"
 
+# Keeps track of the files we've written, next to the generated sources.
+MANIFEST_FILENAME = ".revalkyr-files.json"
+
 
 class NotCreatedByUsError(RuntimeError):
     """
@@ -25,20 +33,80 @@ class OutOfSourceDirectoryError(RuntimeError):
 
 
 class SourceFileMgr(Service):
+    def init(self) -> None:
+        self._src_dir = self.ctx.config.src_dir.resolve()
+        self._manifest_file = self._src_dir.joinpath(MANIFEST_FILENAME)
+
+        # Relative path -> (mtime_ns, size) of the file as we last wrote it.
+        self._owned: dict[str, tuple[int, int]] = dict()
+        self._load_manifest()
+
+        # Writes staged by batch(), flushed together when the batch ends.
+        self._batch_depth = 0
+        self._staged: dict[Path, str | None] = dict()
+
     def is_revalkyr_file(self, file: Path) -> bool:
-        self._check_permitted(file)
-        if not file.exists():
+        file = self._check_permitted(file)
+
+        if file in self._staged:
+            return self._staged[file] is not None
+
+        try:
+            stat = file.stat()
+        except FileNotFoundError:
             return False
+
+        key = self._key(file)
+        if self._owned.get(key) == (stat.st_mtime_ns, stat.st_size):
+            return True
+
+        # The file has been touched by someone else since we wrote it (or we
+        # never knew about it), so fall back to looking for the cookie.
         with file.open("r", encoding="utf-8") as f:
-            return f.readline().startswith(f"// {COOKIE} ")
+            is_ours = f.readline().startswith(f"// {COOKIE} ")
+
+        if is_ours:
+            self._owned[key] = (stat.st_mtime_ns, stat.st_size)
+        elif key in self._owned:
+            del self._owned[key]
+
+        return is_ours
 
     def get_files(self, pattern: str) -> Path:
         return self.ctx.config.src_dir.rglob(pattern)
 
+    @contextmanager
+    def batch(self):
+        """
+        Stages all writes and deletes made inside the block and applies them
+        together at the end, so that a watching compiler sees one change
+        instead of several half-done ones.
+        """
+
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush()
+
+    def flush(self) -> None:
+        """
+        Applies what a batch has staged so far, e.g. before compiling.
+        """
+
+        if self._staged:
+            self._flush()
+
+    def exists(self, file: Path) -> bool:
+        # Counts what's staged, unlike Path.exists().
+        return self._exists(self._check_permitted(file))
+
     def delete_file(self, file: Path) -> bool:
-        self._check_permitted(file)
+        file = self._check_permitted(file)
 
-        if not file.exists():
+        if not self._exists(file):
             return False
 
         if not self.is_revalkyr_file(file):
@@ -46,13 +114,17 @@ class SourceFileMgr(Service):
                 "Operation aborted: The file was not created by Revalkyr"
             )
 
-        file.unlink()
-        self.log.debug(f"Deleted {file}")
+        self._staged[file] = None
+        if self._batch_depth == 0:
+            self._flush()
 
         return True
 
     def read_file(self, file: Path) -> str:
-        self._check_permitted(file)
+        file = self._check_permitted(file)
+
+        if self._staged.get(file) is not None:
+            return self._without_cookie(self._staged[file])
 
         if not file.exists():
             raise FileNotFoundError(f"File not found: {file}")
@@ -61,9 +133,9 @@ class SourceFileMgr(Service):
         return self._without_cookie(content)
 
     def write_file(self, file: Path, content: str, overwrite: bool = False) -> None:
-        self._check_permitted(file)
+        file = self._check_permitted(file)
 
-        if file.exists():
+        if self._exists(file):
             if not self.is_revalkyr_file(file):
                 raise NotCreatedByUsError()
 
@@ -72,20 +144,71 @@ class SourceFileMgr(Service):
                     f"Operation aborted: The specified file already exists and overwrite flag is not set"
                 )
 
-        file.parent.mkdir(parents=True, exist_ok=True)
+        self._staged[file] = self._with_cookie(content)
+        if self._batch_depth == 0:
+            self._flush()
 
-        file.write_text(self._with_cookie(content), encoding="utf-8")
-        self.log.debug(f"Wrote {file} ({len(content)} chars)")
+    def _flush(self) -> None:
+        staged, self._staged = self._staged, dict()
 
-    def _check_permitted(self, file: Path) -> None:
-        if not self._is_file_in_src_dir(file):
+        for file, content in staged.items():
+            if content is None:
+                file.unlink(missing_ok=True)
+                self._owned.pop(self._key(file), None)
+                self.log.debug(f"Deleted {file}")
+            else:
+                self._write_atomically(file, content)
+                stat = file.stat()
+                self._owned[self._key(file)] = (stat.st_mtime_ns, stat.st_size)
+                self.log.debug(f"Wrote {file} ({len(content)} chars)")
+
+        if staged:
+            self._save_manifest()
+
+    def _write_atomically(self, file: Path, content: str) -> None:
+        file.parent.mkdir(parents=True, exist_ok=True)
+
+        # The temporary file must not match *.res, or watchers will pick it up.
+        fd, tmp = tempfile.mkstemp(
+            dir=file.parent, prefix=f".{file.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, file)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _load_manifest(self) -> None:
+        try:
+            files = json.loads(self._manifest_file.read_text(encoding="utf-8"))
+            self._owned = {key: tuple(value) for key, value in files.items()}
+        except (OSError, ValueError):
+            pass
+
+    def _save_manifest(self) -> None:
+        tmp = self._manifest_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._owned, indent=2), encoding="utf-8")
+        os.replace(tmp, self._manifest_file)
+
+    def _exists(self, file: Path) -> bool:
+        if file in self._staged:
+            return self._staged[file] is not None
+        return file.exists()
+
+    def _key(self, file: Path) -> str:
+        return file.relative_to(self._src_dir).as_posix()
+
+    def _check_permitted(self, file: Path) -> Path:
+        file = file.resolve()
+        if not file.is_relative_to(self._src_dir):
             raise OutOfSourceDirectoryError(
                 f"Operation aborted: The specified file is not in the source file path"
             )
-
-    def _is_file_in_src_dir(self, file: Path) -> bool:
-        src_dir = self.ctx.config.src_dir.resolve()
-        return str(file.resolve()).startswith(str(src_dir))
+        return file
 
     def _with_cookie(self, content: str) -> str:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
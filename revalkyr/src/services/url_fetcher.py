@@ -1,6 +1,9 @@
 import requests
+import threading
 
+from .scheduler import Priority, Scheduler, backoff_delay, retry_after
 from .service import Service
+from .session_store import SessionStore
 from ..context import Context
 
 
@@ -8,12 +11,84 @@ class URLFetcher(Service):
     def __init__(self, ctx: Context):
         super().__init__(ctx)
 
-        self._cache: dict[str, str] = dict()
+        # Shared between all projects served by this process, and used from
+        # background threads too, so only touched while holding the lock.
+        self._cache: dict[str, str] = ctx.shared.get("url_fetcher.cache", dict)
+        self._lock = ctx.shared.get("url_fetcher.lock", threading.Lock)
+        # A requests.Session isn't safe to share between threads, so every
+        # thread gets one of its own.
+        self._sessions = ctx.shared.get("http.sessions", threading.local)
+        # The URLs this project has fetched, the only ones its session keeps.
+        self._urls: set[str] = set()
 
-    def get_text(self, url: str) -> str:
-        if url not in self._cache:
-            res = requests.get(url)
+    def init(self) -> None:
+        self.scheduler = self.get_service(Scheduler)
+
+        self.session = self.get_service(SessionStore)
+
+        cached = self.session.get("url_fetcher.cache", {})
+        with self._lock:
+            self._cache.update(cached)
+            self._urls.update(cached)
+
+        self.session.register("url_fetcher.cache", self._get_state)
+
+    def get(
+        self,
+        url: str,
+        priority: Priority = Priority.USER_BLOCKING,
+        attempts: int = 3,
+    ) -> requests.Response:
+        """
+        Makes a rate limited GET request, backing off and retrying when the
+        server answers 429 Too Many Requests.
+        """
+
+        for attempt in range(attempts):
+            self.scheduler.http.acquire(self.scheduler.project, priority)
+            res = self._get_session().get(url)
+            if res.status_code != 429 or attempt == attempts - 1:
+                return res
+
+            delay = retry_after(res.headers) or backoff_delay(attempt)
+            self.log.debug(f"Rate limited by {url}, backing off for {delay:.1f}s")
+            self.scheduler.http.back_off(delay)
+
+        return res
+
+    def get_text(self, url: str, priority: Priority = Priority.USER_BLOCKING) -> str:
+        with self._lock:
+            text = self._cache.get(url)
+
+        # Not holding the lock while waiting for the network; two threads
+        # might both fetch the same URL, which is harmless.
+        if text is None:
+            res = self.get(url, priority)
             res.raise_for_status()
-            self._cache[url] = res.text
+            text = res.text
+
+        with self._lock:
+            self._cache[url] = text
+            if url not in self._urls:
+                self._urls.add(url)
+                self.session.mark_dirty("url_fetcher.cache")
+
+        return text
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for url in [url for url in self._cache if url.startswith(prefix)]:
+                self._cache.pop(url, None)
+                if url in self._urls:
+                    self._urls.discard(url)
+                    self.session.mark_dirty("url_fetcher.cache")
+
+    def _get_session(self) -> requests.Session:
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            session = self._sessions.session = requests.Session()
+        return session
 
-        return self._cache[url]
+    def _get_state(self) -> dict[str, str]:
+        with self._lock:
+            return {url: self._cache[url] for url in self._urls if url in self._cache}
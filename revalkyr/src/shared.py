@@ -0,0 +1,22 @@
+import threading
+
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SharedResources:
+    """
+    Resources (caches, HTTP sessions and so on) shared by every project served
+    from the same process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resources: dict[str, any] = dict()
+
+    def get(self, name: str, factory: Callable[[], T]) -> T:
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = factory()
+            return self._resources[name]
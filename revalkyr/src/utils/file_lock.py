@@ -0,0 +1,32 @@
+import os
+
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has its own.
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(file: Path):
+    """
+    Holds an exclusive lock on the file, created if need be, for the length of
+    the block. Other processes that lock the same file wait for it, which is
+    what keeps them from overwriting each other's changes to shared files.
+    """
+
+    file.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(file, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        yield
+    finally:
+        # Closing the file releases the lock.
+        os.close(fd)
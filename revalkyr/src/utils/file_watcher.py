@@ -11,33 +11,38 @@ class FileWatcher:
         self.path = path
         self.pattern = pattern
 
-        self._files: dict[str, str] = dict()
+        self._files: dict[Path, str] = dict()
 
     def any_files_changed(self) -> bool:
-        files: dict[str, str] = dict()
+        changed, removed = self.get_changes()
+        return bool(changed or removed)
+
+    def get_changes(self) -> tuple[set[Path], set[Path]]:
+        """
+        Returns the files that were added or changed and the files that were
+        removed since the last call.
+        """
+
+        files: dict[Path, str] = dict()
 
         for file in self.path.rglob(self.pattern):
             if file.is_file():
-                files[file.resolve()] = self._hash_file(file)
+                files[file.resolve()] = self.hash_file(file)
 
         # Compare both ways to catch all changes.
+        changed = {
+            filename
+            for filename, hash in files.items()
+            if hash != self._files.get(filename)
+        }
+        removed = set(self._files) - set(files)
 
-        try:
-            for filename, hash in files.items():
-                other_hash = self._files.get(filename)
-                if hash != other_hash:
-                    return True
-
-            for filename, hash in self._files.items():
-                other_hash = files.get(filename)
-                if hash != other_hash:
-                    return True
-        finally:
-            self._files = files
+        self._files = files
 
-        return False
+        return (changed, removed)
 
-    def _hash_file(self, file: Path) -> str:
+    @staticmethod
+    def hash_file(file: Path) -> str:
         hash_func = hashlib.sha256()
         with file.open("rb") as f:
             # Read 1MB chunks.
@@ -0,0 +1,143 @@
+import re
+
+Version = tuple[int, int, int]
+
+_PARTIAL_VERSION = re.compile(r"^v?(\d+|[xX*])(?:\.(\d+|[xX*]))?(?:\.(\d+|[xX*]))?")
+_PRERELEASE = re.compile(r"^v?\d+\.\d+\.\d+-([0-9A-Za-z.-]+)")
+# npm allows space between an operator and its version, as in '>= 1.0.0'.
+_OPERATOR_SPACE = re.compile(r"(\^|~>?|>=|<=|>|<|=)\s+")
+
+# A version as compared: major, minor, patch, then 0 for a pre-release (which
+# comes before the release) or 1, and the pre-release tag.
+_Key = tuple[int, int, int, int, str]
+
+
+def parse_version(s: str) -> Version | None:
+    """
+    Parses a (possibly partial) version such as '1.2.3', 'v1.2' or '1.x'.
+    Pre-release and build suffixes are ignored. Wildcards and missing parts
+    become zero.
+    """
+
+    parts = _parse_partial(s)
+    if parts is None:
+        return None
+
+    return tuple(p if p is not None else 0 for p in parts)
+
+
+def satisfies(version: str | Version, spec: str) -> bool:
+    """
+    Checks a version against an npm style range, e.g. '^1.2.0', '>=1 <3',
+    '~2.1.0 || 3.x' or '1.0.0 - 2.0.0'. Like npm, a pre-release such as
+    1.2.3-beta only satisfies a range that names a pre-release of 1.2.3.
+    """
+
+    prerelease = None
+    if isinstance(version, str):
+        prerelease = _prerelease(version)
+        version = parse_version(version)
+        if version is None:
+            return False
+
+    key = _key(version, prerelease)
+    spec = _OPERATOR_SPACE.sub(r"\1", spec)
+
+    for alternative in spec.split("||"):
+        comparators = _comparators(alternative.strip())
+        if comparators is None:
+            continue
+
+        if prerelease is not None and not any(
+            other[:3] == version and other[3] == 0 for _, other in comparators
+        ):
+            continue
+
+        if all(_compare(key, op, other) for op, other in comparators):
+            return True
+
+    return False
+
+
+def _prerelease(s: str) -> str | None:
+    m = _PRERELEASE.match(s.strip().lstrip("="))
+    return m.group(1) if m else None
+
+
+def _key(version: Version, prerelease: str | None = None) -> _Key:
+    if prerelease is None:
+        return (*version, 1, "")
+    return (*version, 0, prerelease)
+
+
+def _parse_partial(s: str) -> tuple[int | None, ...] | None:
+    m = _PARTIAL_VERSION.match(s.strip().lstrip("="))
+    if not m:
+        return None
+
+    return tuple(int(g) if g is not None and g.isdigit() else None for g in m.groups())
+
+
+def _comparators(spec: str) -> list[tuple[str, _Key]] | None:
+    if spec in ("", "*", "x", "X", "latest"):
+        return []
+
+    m = re.match(r"^(\S+)\s+-\s+(\S+)$", spec)
+    if m:
+        return _comparators(f">={m.group(1)}") + _comparators(f"<={m.group(2)}")
+
+    comparators = []
+
+    for token in spec.split():
+        m = re.match(r"^(\^|~>?|>=|<=|>|<|=)?(.+)$", token)
+        op, rest = m.group(1) or "=", m.group(2)
+
+        parts = _parse_partial(rest)
+        if parts is None:
+            return None
+
+        major, minor, patch = parts
+        low = _key((major or 0, minor or 0, patch or 0), _prerelease(rest))
+
+        if major is None:
+            continue
+
+        if op == "^":
+            if major > 0 or minor is None:
+                high = _key((major + 1, 0, 0))
+            elif minor > 0 or patch is None:
+                high = _key((0, minor + 1, 0))
+            else:
+                high = _key((0, 0, patch + 1))
+            comparators += [(">=", low), ("<", high)]
+        elif op in ("~", "~>"):
+            high = _key((major + 1, 0, 0) if minor is None else (major, minor + 1, 0))
+            comparators += [(">=", low), ("<", high)]
+        elif minor is None or patch is None:
+            # A partial version stands for every version it covers, e.g. '1.4'
+            # for 1.4.0 up to, but not including, 1.5.0.
+            high = _key((major + 1, 0, 0) if minor is None else (major, minor + 1, 0))
+            if op == "=":
+                comparators += [(">=", low), ("<", high)]
+            elif op == ">":
+                comparators.append((">=", high))
+            elif op == "<=":
+                comparators.append(("<", high))
+            else:
+                comparators.append((op, low))
+        else:
+            comparators.append((op, low))
+
+    return comparators
+
+
+def _compare(version: _Key, op: str, other: _Key) -> bool:
+    if op == ">=":
+        return version >= other
+    if op == "<=":
+        return version <= other
+    if op == ">":
+        return version > other
+    if op == "<":
+        return version < other
+    return version == other
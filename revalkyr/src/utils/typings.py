@@ -0,0 +1,139 @@
+import re
+
+_FUNCTION = re.compile(
+    r"^\s*export\s+(?:declare\s+)?(?:async\s+)?function\s+(\w+)\s*(?:<[^>(]*>)?\s*\(",
+    re.MULTILINE,
+)
+_CONST_FUNCTION = re.compile(
+    r"^\s*export\s+(?:declare\s+)?const\s+(\w+)\s*:\s*(?:<[^>(]*>)?\s*\(",
+    re.MULTILINE,
+)
+_DEFAULT_EXPORT = re.compile(
+    r"^\s*export\s+(?:default|=)\s+(?:(?:declare\s+)?function\s+)?(\w+)",
+    re.MULTILINE,
+)
+_MEMBER = re.compile(
+    r"^\s*(?:readonly\s+)?(\w+)\s*(?:\??\s*:\s*(?:<[^>(]*>)?\s*)?(?:<[^>(]*>)?\s*\(",
+    re.MULTILINE,
+)
+_RELATIVE_IMPORT = re.compile(r"""from\s+['"](\.{1,2}/[^'"]+)['"]""")
+
+
+def _matching(source: str, start: int, open: str, close: str) -> int:
+    # Returns the index just past the bracket matching the one at start.
+    depth = 0
+    for i in range(start, len(source)):
+        if source[i] == open:
+            depth += 1
+        elif source[i] == close:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(source)
+
+
+def count_required_params(params: str) -> int:
+    """
+    Counts the parameters in a TypeScript parameter list that have to be
+    passed, i.e. not optional, rest, defaulted or this parameters.
+    """
+
+    parts, depth, current = [], 0, ""
+    for c in params:
+        if c in "(<[{":
+            depth += 1
+        elif c in ")>]}":
+            depth -= 1
+        if c == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += c
+    parts.append(current)
+
+    count = 0
+    for part in parts:
+        part = part.strip()
+        name = re.match(r"^(\.\.\.)?(\w+)(\?)?", part)
+        if not name or name.group(1) or name.group(3) or name.group(2) == "this":
+            continue
+        if re.match(r"^\w+\s*=", part):
+            continue
+        count += 1
+    return count
+
+
+class Typings:
+    """
+    What Revalkyr can tell about a package from its TypeScript declarations:
+    the functions it exports by name, what the default export is called and
+    which functions are reachable as members of the default export. This is
+    a handful of regexes, not a TypeScript parser, so anything it can't make
+    sense of is simply left out.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+
+        # Name -> number of required parameters.
+        self.functions: dict[str, int] = dict()
+        for pattern in (_FUNCTION, _CONST_FUNCTION):
+            for m in pattern.finditer(source):
+                self.functions[m.group(1)] = self._params_at(m.end() - 1)
+
+        m = _DEFAULT_EXPORT.search(source)
+        self.default_export = m.group(1) if m else None
+
+        self.default_members: dict[str, int] = dict()
+        if self.default_export is not None:
+            self.default_members = self._members_of(self.default_export)
+
+    def get_function(self, name: str) -> tuple[int, bool] | None:
+        """
+        Returns the number of required parameters of the named function and
+        whether it's a member of the default export, or None if there's no
+        such function.
+        """
+
+        if name in self.functions:
+            return (self.functions[name], False)
+        if name in self.default_members:
+            return (self.default_members[name], True)
+        return None
+
+    def _params_at(self, i: int) -> int:
+        end = _matching(self.source, i, "(", ")")
+        return count_required_params(self.source[i + 1 : end - 1])
+
+    def _members_of(self, name: str) -> dict[str, int]:
+        # declare const ky: KyInstance; -> the members of KyInstance.
+        m = re.search(rf"\b(?:const|let|var)\s+{name}\s*:\s*(\w+)", self.source)
+        if not m:
+            return dict()
+
+        m = re.search(
+            rf"\b(?:interface\s+{m.group(1)}\b[^{{]*|type\s+{m.group(1)}\s*=\s*)\{{",
+            self.source,
+        )
+        if not m:
+            return dict()
+
+        start = m.end() - 1
+        body = self.source[start : _matching(self.source, start, "{", "}")]
+
+        members = dict()
+        for member in _MEMBER.finditer(body, 1):
+            # Only the members directly in the body, not in nested types.
+            if body[: member.start()].count("{") - body[: member.start()].count(
+                "}"
+            ) != 1 or member.group(1) in ("new", "readonly"):
+                continue
+
+            i = member.end() - 1
+            end = _matching(body, i, "(", ")")
+            members[member.group(1)] = count_required_params(body[i + 1 : end - 1])
+        return members
+
+
+def relative_imports(source: str) -> list[str]:
+    return _RELATIVE_IMPORT.findall(source)
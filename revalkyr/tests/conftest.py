@@ -0,0 +1,25 @@
+from pathlib import Path
+
+import pytest
+
+from src.config import Config
+from src.context import Context
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Config:
+    tmp_path.joinpath("src").mkdir()
+    return Config(
+        tmp_path,
+        "src",
+        [],
+        log_level="debug",
+        log_buffered=False,
+        cache_dir=tmp_path.joinpath("cache"),
+        ai_backend="replay",
+    )
+
+
+@pytest.fixture
+def ctx(config: Config) -> Context:
+    return Context(config)
@@ -0,0 +1,94 @@
+import pytest
+
+from src.context import Context
+from src.log import Level, Log
+from src.services import OpenAI, Scheduler, ServiceMgr, SessionStore
+from src.services.ai import AssistantThreadPool
+
+
+class FakeThread:
+    def __init__(self, thread_id: str, turns: int = 0):
+        self.thread_id = thread_id
+        self.turns = turns
+        self.history = []
+        self.deleted = False
+
+    def delete(self) -> None:
+        self.deleted = True
+
+
+class FakeAI:
+    def __init__(self):
+        self.log = Log(Level.ERROR)
+        self.next_id = 0
+
+    def create_assistant_thread(self, priority=None, thread_id=None, turns=0):
+        if thread_id is None:
+            self.next_id += 1
+            thread_id = f"thread_{self.next_id}"
+        return FakeThread(thread_id, turns)
+
+
+def test_pool_state_round_trip():
+    ai = FakeAI()
+    pool = AssistantThreadPool(ai)
+    thread, is_new = pool.get("Ky.res")
+    assert is_new
+    thread.turns = 2
+    thread.history.append({"role": "user", "content": "hi"})
+
+    restored = AssistantThreadPool(ai)
+    restored.restore(pool.get_state())
+
+    thread, is_new = restored.get("Ky.res")
+    assert not is_new
+    assert thread.thread_id == "thread_1"
+    assert thread.turns == 2
+    assert thread.history == [{"role": "user", "content": "hi"}]
+
+
+def test_pool_evicts_and_compacts():
+    ai = FakeAI()
+    pool = AssistantThreadPool(ai, max_threads=2, max_turns=3)
+
+    first, _ = pool.get("a")
+    pool.get("b")
+    pool.get("c")
+    assert first.deleted
+    assert "a" not in pool
+
+    thread, _ = pool.get("b")
+    thread.turns = 3
+    compacted, is_new = pool.get("b")
+    assert thread.deleted
+    assert compacted is not thread
+    assert not is_new
+
+
+@pytest.fixture
+def ai(config) -> OpenAI:
+    config.ai_fallback = "```rescript\nlet a = 1\n```"
+    service_mgr = ServiceMgr(Context(config), [Scheduler, SessionStore, OpenAI])
+    service_mgr.init()
+    return service_mgr.get_service(OpenAI)
+
+
+def test_streamed_replies_are_part_of_the_thread(ai):
+    thread = ai.create_assistant_thread()
+    thread.add_message("Write a binding.")
+    thread.run_streamed(lambda decl: None)
+
+    assert thread.get_last_message().content == ai.ctx.config.ai_fallback
+    messages = ai.backend.get_messages(thread.thread_id)
+    assert [m.role for m in messages] == ["user", "assistant"]
+    assert messages[-1].content == ai.ctx.config.ai_fallback
+
+
+def test_run_replies_are_part_of_the_history(ai):
+    thread = ai.create_assistant_thread()
+    thread.add_message("Write a binding.")
+    thread.run()
+    thread.get_last_message()
+    thread.get_last_message()
+
+    assert [m["role"] for m in thread.history] == ["user", "assistant"]
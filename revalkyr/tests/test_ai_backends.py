@@ -0,0 +1,160 @@
+import httpx
+import openai
+import pytest
+
+from pathlib import Path
+
+from src.services.ai_backends import (
+    AIBackend,
+    LiveBackend,
+    Message,
+    RecordingBackend,
+    ReplayBackend,
+)
+
+
+def _message(i: int) -> dict:
+    return {
+        "id": f"msg_{i}",
+        "object": "thread.message",
+        "created_at": i,
+        "thread_id": "thread_1",
+        "role": "assistant" if i % 2 else "user",
+        "content": [{"type": "text", "text": {"value": f"m{i}", "annotations": []}}],
+        "file_ids": [],
+        "assistant_id": None,
+        "run_id": None,
+        "metadata": {},
+    }
+
+
+def _respond(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    headers = {"x-ratelimit-remaining-requests": "42"}
+
+    if path.endswith("/messages"):
+        after = request.url.params.get("after")
+        limit = int(request.url.params.get("limit", 20))
+        start = 0 if after is None else int(after.removeprefix("msg_")) + 1
+        data = [_message(i) for i in range(start, min(start + limit, 5))]
+        body = {"object": "list", "data": data, "has_more": start + limit < 5}
+    elif "/assistants/" in path:
+        body = {
+            "id": "asst_1",
+            "object": "assistant",
+            "created_at": 0,
+            "name": None,
+            "description": None,
+            "model": "gpt-4",
+            "instructions": "Be brief.",
+            "tools": [],
+            "file_ids": [],
+            "metadata": {},
+        }
+    else:
+        body = {"id": "thread_1", "object": "thread.deleted", "deleted": True}
+
+    return httpx.Response(200, headers=headers, json=body)
+
+
+@pytest.fixture
+def backend(monkeypatch) -> tuple[LiveBackend, list]:
+    monkeypatch.setattr(openai, "api_key", "test")
+    monkeypatch.setattr(
+        openai, "http_client", httpx.Client(transport=httpx.MockTransport(_respond))
+    )
+    monkeypatch.setattr(openai, "_client", None)
+
+    seen = []
+    return LiveBackend(lambda headers: seen.append(headers)), seen
+
+
+def test_every_call_reports_its_headers(backend):
+    backend, seen = backend
+
+    backend.delete_thread("thread_1")
+    assert backend.get_last_message("thread_1").content == "m0"
+    assert backend.get_assistant_instructions("asst_1") == "Be brief."
+    messages = backend.get_messages("thread_1", page_size=2)
+
+    assert [m.content for m in messages] == ["m0", "m1", "m2", "m3", "m4"]
+    # One request per page of messages.
+    assert len(seen) == 6
+    assert all(h["x-ratelimit-remaining-requests"] == "42" for h in seen)
+
+
+class EchoBackend(AIBackend):
+    # Answers chats with the last message, and runs with "done".
+
+    def __init__(self):
+        self.threads: dict[str, list[str]] = dict()
+
+    def create_thread(self) -> str:
+        thread_id = f"thread_{len(self.threads)}"
+        self.threads[thread_id] = []
+        return thread_id
+
+    def delete_thread(self, thread_id: str) -> None:
+        del self.threads[thread_id]
+
+    def add_message(self, thread_id: str, content: str, role: str = "user") -> None:
+        self.threads[thread_id].append(content)
+
+    def create_run(self, thread_id, assistant_id, instructions) -> str:
+        self.threads[thread_id].append("done")
+        return "run_1"
+
+    def get_run_status(self, thread_id: str, run_id: str) -> str:
+        return "completed"
+
+    def get_last_message(self, thread_id: str) -> Message:
+        return Message(0, "assistant", self.threads[thread_id][-1])
+
+    def get_messages(self, thread_id: str):
+        return [self.get_last_message(thread_id)]
+
+    def get_assistant_instructions(self, assistant_id: str) -> str:
+        return "Be brief."
+
+    def chat_completion(self, messages, model: str) -> str:
+        return messages[-1]["content"].upper()
+
+    def stream_chat_completion(self, messages, model: str):
+        yield self.chat_completion(messages, model)
+
+
+def test_backends_must_implement_everything():
+    class Incomplete(AIBackend):
+        def create_thread(self) -> str:
+            return "thread"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def _prompt(root_dir: Path) -> list[dict[str, str]]:
+    file = root_dir.joinpath("src", "Main.res")
+    return [{"role": "user", "content": f"Fix this:\n  {file}:3:9-14\n"}]
+
+
+def test_replay_anywhere(tmp_path: Path):
+    recording = tmp_path.joinpath("recording.jsonl")
+    here, there = Path("/home/a/project"), Path("/tmp/ci/checkout")
+
+    recorder = RecordingBackend(EchoBackend(), recording, here)
+    reply = recorder.chat_completion(_prompt(here), "gpt-4")
+    thread_id = recorder.create_thread()
+    recorder.add_message(thread_id, f"Look at {here}/src/Main.res")
+    recorder.create_run(thread_id, "asst_1", None)
+    run_reply = recorder.get_last_message(thread_id).content
+
+    replay = ReplayBackend(recording, root_dir=there)
+    assert replay.chat_completion(_prompt(there), "gpt-4") == reply
+    thread_id = replay.create_thread()
+    replay.add_message(thread_id, f"Look at {there}/src/Main.res")
+    replay.create_run(thread_id, "asst_1", None)
+    assert replay.get_last_message(thread_id).content == run_reply
+
+    # Other requests aren't in the recording.
+    with pytest.raises(KeyError):
+        replay.chat_completion(_prompt(Path("/elsewhere")), "gpt-4")
@@ -0,0 +1,63 @@
+import multiprocessing
+
+from pathlib import Path
+
+from src.services.bindings_store import BindingsCache, load_manifest
+
+
+def test_find_by_version(tmp_path: Path):
+    cache = BindingsCache(tmp_path)
+    cache.promote("Ky", "ky", "1.0.0", "type t\n")
+    cache.promote("Dayjs", "dayjs", None, "type t\n")
+
+    assert cache.find("ky", "1.0.0").module_name == "Ky"
+    assert cache.find("Ky", "1.1.0") is None
+    # Without a version only bindings for any version will do.
+    assert cache.find("Ky", None) is None
+    assert cache.find("Dayjs", None).versions == "*"
+
+
+def test_promote_counts_successes(tmp_path: Path):
+    cache = BindingsCache(tmp_path)
+    assert cache.promote("Ky", "ky", "1.0.0", "type t\n").successes == 1
+    assert cache.promote("Ky", "ky", "1.0.0", "type t\n").successes == 2
+
+    # Different bindings start over.
+    entry = cache.promote("Ky", "ky", "1.0.0", "type u\n")
+    assert entry.successes == 1
+    assert entry.file.read_text() == "type u\n"
+
+
+def test_caches_in_other_processes_merge(tmp_path: Path):
+    a, b = BindingsCache(tmp_path), BindingsCache(tmp_path)
+
+    a.promote("Ky", "ky", "1.0.0", "type t\n")
+    b.promote("Dayjs", "dayjs", "1.11.0", "type t\n")
+    b.promote("Ky", "ky", "1.0.0", "type t\n")
+
+    entries = {e.module_name: e for e in load_manifest(tmp_path)}
+    assert set(entries) == {"Ky", "Dayjs"}
+    assert entries["Ky"].successes == 2
+    # And a sees what b promoted.
+    assert a.find("Dayjs", "1.11.0") is not None
+
+
+def _promote_many(bindings_dir: Path, n: int) -> None:
+    cache = BindingsCache(bindings_dir)
+    for _ in range(n):
+        cache.promote("Ky", "ky", "1.0.0", "type t\n")
+
+
+def test_concurrent_promotions(tmp_path: Path):
+    mp = multiprocessing.get_context("spawn")
+    processes = [
+        mp.Process(target=_promote_many, args=(tmp_path, 10)) for _ in range(4)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(60)
+        assert p.exitcode == 0
+
+    [entry] = load_manifest(tmp_path)
+    assert entry.successes == 40
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pytest
+
+from src.config import load_config, load_plugin_specs
+from src.plugins.registry import plugin_exists
+
+
+def test_plugin_specs():
+    specs = load_plugin_specs(
+        [
+            "AutoBindings",
+            {"name": "Other", "options": {"a": 1}, "isolated": {"timeout": 5}},
+        ],
+        {"memory_mb": 512, "timeout": 60},
+    )
+
+    assert [spec.name for spec in specs] == ["AutoBindings", "Other"]
+    assert specs[0].isolation is None
+    assert specs[1].options == {"a": 1}
+    assert specs[1].isolation.memory_mb == 512
+    assert specs[1].isolation.timeout == 5
+    assert specs[1].isolation.max_restarts == 3
+
+
+@pytest.mark.parametrize("entry", [{"options": {}}, {"name": 1}, ["AutoBindings"]])
+def test_plugin_entries_need_a_name(entry):
+    with pytest.raises(ValueError, match="need a name"):
+        load_plugin_specs([entry], {})
+
+
+def test_unknown_isolation_settings():
+    with pytest.raises(ValueError, match="memory, timout"):
+        load_plugin_specs(
+            [{"name": "AutoBindings", "isolated": {"timout": 5}}], {"memory": 1}
+        )
+
+
+def test_load_config(tmp_path: Path):
+    config_file = tmp_path.joinpath("revalkyr.yaml")
+    config_file.write_text(
+        "plugins:\n"
+        "  - name: AutoBindings\n"
+        "    isolated: true\n"
+        "isolation:\n"
+        "  cpu_seconds: 30\n"
+        "log:\n"
+        "  level: warning\n"
+        "ai:\n"
+        "  backend: replay\n"
+        "  recording: recording.jsonl\n"
+        "http:\n"
+        "  requests_per_minute: 60\n"
+    )
+
+    config = load_config(config_file)
+
+    assert config.root_dir == tmp_path
+    assert config.src_dir == tmp_path.joinpath("src")
+    assert config.plugins[0].isolation.cpu_seconds == 30
+    assert config.log_level == "warn"
+    assert config.ai_backend == "replay"
+    assert config.ai_recording == tmp_path.joinpath("recording.jsonl")
+    assert config.http_requests_per_minute == 60
+
+
+def test_plugin_exists():
+    assert plugin_exists("AutoBindings")
+    assert not plugin_exists("AutoBinding")
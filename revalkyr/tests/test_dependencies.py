@@ -0,0 +1,106 @@
+import json
+import os
+
+from pathlib import Path
+
+import pytest
+
+from src import services
+from src.config import Config
+from src.context import Context
+from src.services import Dependencies, ServiceMgr, SessionStore
+
+
+def _write_json(file: Path, data: dict) -> None:
+    file.write_text(json.dumps(data))
+    # Writes within the same tick still count as changes.
+    stat = file.stat()
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def _lock(versions: dict[str, str]) -> dict:
+    packages = {f"node_modules/{name}": {"version": v} for name, v in versions.items()}
+    packages["node_modules/ky/node_modules/nested"] = {"version": "9.9.9"}
+    return {"lockfileVersion": 3, "packages": packages}
+
+
+@pytest.fixture
+def dependencies(config: Config) -> Dependencies:
+    root_dir = config.root_dir
+    _write_json(
+        root_dir.joinpath("package.json"),
+        {
+            "dependencies": {"ky": "^1.0.0", "uuid": "^9.0.0"},
+            "devDependencies": {"rescript": "^11.0.0"},
+        },
+    )
+    _write_json(
+        root_dir.joinpath("package-lock.json"),
+        _lock({"ky": "1.0.0", "uuid": "9.0.1"}),
+    )
+
+    service_mgr = ServiceMgr(Context(config), services.__all__)
+    service_mgr.init()
+    return service_mgr.get_service(Dependencies)
+
+
+def test_fingerprints(dependencies: Dependencies, config: Config):
+    config.root_dir.joinpath("rescript.json").write_text("{}")
+
+    fingerprints = dependencies.get_fingerprints()
+
+    # Locked versions first, then the range in package.json.
+    assert fingerprints["ky"] == "1.0.0"
+    assert fingerprints["uuid"] == "9.0.1"
+    assert fingerprints["rescript"] == "^11.0.0"
+    assert "nested" not in fingerprints
+    assert "file:rescript.json" in fingerprints
+
+
+def test_installed_versions_without_a_lockfile(dependencies: Dependencies, config):
+    config.root_dir.joinpath("package-lock.json").unlink()
+    package_dir = config.root_dir.joinpath("node_modules", "ky")
+    package_dir.mkdir(parents=True)
+    package_dir.joinpath("package.json").write_text(json.dumps({"version": "1.2.3"}))
+
+    assert dependencies.get_fingerprints()["ky"] == "1.2.3"
+
+
+def test_poll_returns_the_packages_that_changed(dependencies: Dependencies, config):
+    lockfile = config.root_dir.joinpath("package-lock.json")
+
+    # The first poll only takes fingerprints.
+    assert dependencies.poll() == set()
+    assert dependencies.poll() == set()
+
+    _write_json(lockfile, _lock({"ky": "1.1.0", "uuid": "9.0.1"}))
+    assert dependencies.poll() == {"ky"}
+
+    # Added packages have nothing cached.
+    _write_json(lockfile, _lock({"ky": "1.1.0", "uuid": "9.0.1", "zod": "3.0.0"}))
+    assert dependencies.poll() == set()
+
+
+def test_compiler_config_changes(dependencies: Dependencies, config: Config):
+    assert dependencies.poll() == set()
+
+    _write_json(config.root_dir.joinpath("rescript.json"), {"name": "x"})
+    assert dependencies.poll() == set()
+    assert "file:rescript.json" in dependencies.fingerprints
+
+
+def test_fingerprints_are_kept_in_the_session(dependencies: Dependencies, config):
+    dependencies.poll()
+    dependencies.get_service(SessionStore).save()
+
+    service_mgr = ServiceMgr(Context(config), services.__all__)
+    service_mgr.init()
+    restored = service_mgr.get_service(Dependencies)
+    assert restored.fingerprints == dependencies.fingerprints
+
+    # Changes since the last session are picked up on the first poll.
+    _write_json(
+        config.root_dir.joinpath("package-lock.json"),
+        _lock({"ky": "1.0.0", "uuid": "9.0.2"}),
+    )
+    assert restored.poll() == {"uuid"}
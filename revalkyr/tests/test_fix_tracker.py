@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+
+from src.plugins import fix_tracker
+from src.plugins.fix_tracker import FixTracker, Verdict
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(fix_tracker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_keys_ignore_positions():
+    tracker = FixTracker()
+    file = Path("src/Main.res")
+
+    a = tracker.make_key(file, "type", "src/Main.res:3:5-9\n  3 │ x\nBad", "type t")
+    b = tracker.make_key(file, "type", "src/Main.res:7:1\n  7 │ y\nBad", "type t")
+
+    assert a == b
+    assert a != tracker.make_key(file, "type", "Bad", "type u")
+    assert a != tracker.make_key(file, "syntax", "Bad", "type t")
+
+
+def test_repeats_back_off_and_give_up(clock):
+    tracker = FixTracker(max_repeats=3, backoff=2.0)
+
+    assert tracker.check("k", "Main") == Verdict.ATTEMPT
+    assert not tracker.is_repeat("k")
+    tracker.record("k", "Main")
+    assert tracker.is_repeat("k")
+
+    assert tracker.check("k", "Main") == Verdict.WAIT
+    clock[0] += 2.0
+    assert tracker.check("k", "Main") == Verdict.ATTEMPT
+    tracker.record("k", "Main")
+
+    # Twice as long the second time.
+    clock[0] += 2.0
+    assert tracker.check("k", "Main") == Verdict.WAIT
+    clock[0] += 2.0
+    assert tracker.check("k", "Main") == Verdict.ATTEMPT
+    tracker.record("k", "Main")
+
+    clock[0] += 1000.0
+    assert tracker.check("k", "Main") == Verdict.GIVE_UP
+
+
+def test_backoff_is_capped(clock):
+    tracker = FixTracker(max_repeats=10, backoff=2.0, max_backoff=5.0)
+    for _ in range(5):
+        tracker.record("k", "Main")
+
+    clock[0] += 5.0
+    assert tracker.check("k", "Main") == Verdict.ATTEMPT
+
+
+def test_attempt_budget_per_module(clock):
+    tracker = FixTracker(attempt_budget=2)
+    tracker.record("a", "Main")
+    tracker.record("b", "Main")
+
+    assert tracker.check("c", "Main") == Verdict.GIVE_UP
+    assert tracker.check("c", "Other") == Verdict.ATTEMPT
+
+    tracker.forget_module("Main")
+    assert tracker.check("c", "Main") == Verdict.ATTEMPT
+
+
+def test_report_once():
+    tracker = FixTracker()
+
+    assert tracker.report_once("Main")
+    assert not tracker.report_once("Main")
+
+    tracker.reset()
+    assert tracker.report_once("Main")
@@ -0,0 +1,249 @@
+import json
+import multiprocessing
+import os
+import threading
+
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+from src.config import Config
+from src.plugins import PluginResult
+from src.plugins.plugin_host import (
+    ROOT,
+    Channel,
+    ChannelClosed,
+    ProcessLimits,
+    ProcessPlugin,
+    RemoteObject,
+)
+from src.plugins.registry import PluginSpec
+from src.project import Project
+from src.services import SourceFileMgr
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+        self.events = []
+
+    def add(self, n: int = 1) -> int:
+        self.count += n
+        return self.count
+
+    def call(self, callback) -> any:
+        return callback(self.count)
+
+    def lock(self) -> threading.Lock:
+        # Doesn't pickle, so it's sent as a reference.
+        return threading.Lock()
+
+    def fail(self) -> None:
+        raise KeyError("nope")
+
+    @contextmanager
+    def batch(self):
+        self.events.append("enter")
+        try:
+            yield self.count
+        except ValueError:
+            self.events.append("error")
+            raise
+        finally:
+            self.events.append("exit")
+
+    def items(self):
+        yield from range(3)
+
+
+@pytest.fixture
+def channels():
+    host_conn, worker_conn = multiprocessing.Pipe()
+    host, worker = Channel(host_conn, "host"), Channel(worker_conn, "worker")
+
+    def serve():
+        try:
+            host.serve_forever()
+        except ChannelClosed:
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield host, worker
+
+    worker.close()
+    host.close()
+    thread.join(1)
+
+
+@pytest.fixture
+def counter(channels) -> tuple[Counter, RemoteObject]:
+    host, worker = channels
+    counter = Counter()
+    assert host.add(counter) == ROOT
+    return counter, worker.remote(ROOT)
+
+
+def test_attributes_and_calls(counter):
+    counter, remote = counter
+
+    assert remote.add(2) == 2
+    assert remote.count == 2
+    remote.count = 5
+    assert counter.count == 5
+
+
+def test_callbacks_are_served_while_waiting(counter):
+    counter, remote = counter
+    counter.count = 3
+
+    assert remote.call(lambda n: n * 2) == 6
+
+
+def test_unpicklable_values_come_back_as_proxies(channels, counter):
+    host, worker = channels
+    counter, remote = counter
+
+    lock = remote.lock()
+    assert isinstance(lock, RemoteObject)
+    assert worker.owns(lock)
+    assert not host.owns(lock)
+    assert lock.acquire() is True
+    assert lock.locked() is True
+
+
+def test_errors_are_raised_on_the_calling_side(counter):
+    counter, remote = counter
+
+    with pytest.raises(KeyError, match="nope"):
+        remote.fail()
+
+
+def test_context_managers(counter):
+    counter, remote = counter
+    counter.count = 7
+
+    with remote.batch() as value:
+        assert value == 7
+    assert counter.events == ["enter", "exit"]
+
+    counter.events.clear()
+    with pytest.raises(ValueError):
+        with remote.batch():
+            raise ValueError("inside")
+    assert counter.events == ["enter", "error", "exit"]
+
+
+def test_protocols(channels, counter):
+    host, worker = channels
+    counter, remote = counter
+    host.add([1, 2])
+    host.add([])
+
+    assert list(remote.items()) == [0, 1, 2]
+    assert len(worker.remote(1)) == 2
+    assert bool(worker.remote(1)) is True
+    assert bool(worker.remote(2)) is False
+
+
+def test_closed_channel(channels, counter):
+    host, worker = channels
+    counter, remote = counter
+
+    host.close()
+    with pytest.raises(ChannelClosed):
+        remote.add()
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path) -> Path:
+    """
+    A project AutoBindings can run in without a compiler or the network.
+    """
+
+    root_dir = tmp_path.joinpath("project")
+    root_dir.joinpath("src").mkdir(parents=True)
+    root_dir.joinpath("src", "Main.res").write_text("let a = 1\n")
+    root_dir.joinpath("package.json").write_text(
+        json.dumps({"dependencies": {"ky": "^1.0.0"}})
+    )
+    _install(root_dir, "ky", "1.0.0")
+
+    bin_dir = root_dir.joinpath("node_modules", ".bin")
+    bin_dir.mkdir()
+    rescript = bin_dir.joinpath("rescript")
+    rescript.write_text("#!/bin/sh\nexit 0\n")
+    rescript.chmod(0o755)
+
+    return root_dir
+
+
+def _install(root_dir: Path, package_name: str, version: str) -> None:
+    package_dir = root_dir.joinpath("node_modules", package_name)
+    package_dir.mkdir(parents=True, exist_ok=True)
+    package_dir.joinpath("package.json").write_text(json.dumps({"version": version}))
+
+
+@pytest.mark.skipif(os.name != "posix", reason="uses a shell script as compiler")
+def test_auto_bindings_in_a_worker_process(project_dir: Path, tmp_path: Path):
+    config = Config(
+        project_dir,
+        "src",
+        [
+            PluginSpec(
+                "AutoBindings",
+                {"prefetch": False},
+                ProcessLimits(timeout=60, max_restarts=0),
+            )
+        ],
+        log_buffered=False,
+        cache_dir=tmp_path.joinpath("cache"),
+        ai_backend="replay",
+    )
+    project = Project(config)
+    project.init()
+    try:
+        [plugin] = project.plugins
+        assert isinstance(plugin, ProcessPlugin)
+
+        # Takes the dependencies' fingerprints, and there's nothing to fix.
+        assert plugin.run() == PluginResult.NOTHING_TO_DO
+
+        bindings_file = project_dir.joinpath("src", "autobindings", "Ky.res")
+        project.service_mgr.get_service(SourceFileMgr).write_file(
+            bindings_file, "type t\n"
+        )
+
+        # A new version of ky throws away its bindings, in a batch.
+        _install(project_dir, "ky", "1.1.0")
+        project_dir.joinpath("package.json").write_text(
+            json.dumps({"dependencies": {"ky": "^1.1.0"}})
+        )
+        assert plugin.run() == PluginResult.NOTHING_TO_DO
+        assert not bindings_file.exists()
+        assert plugin._crashes == 0
+    finally:
+        plugin._stop()
+
+
+def test_unknown_isolated_plugin(config: Config):
+    config.plugins = [PluginSpec("AutoBinding", {}, ProcessLimits(timeout=60))]
+    project = Project(config)
+
+    with pytest.raises(KeyError, match="No such plugin"):
+        project.create_plugin(config.plugins[0])
+
+
+def test_isolated_plugin_with_bad_options(config: Config):
+    spec = PluginSpec("AutoBindings", {"bogus": 1}, ProcessLimits(timeout=60))
+    config.plugins = [spec]
+    project = Project(config)
+    project.service_mgr.init()
+    plugin = project.create_plugin(spec)
+
+    # Raised in the worker, and reported here rather than as a crash.
+    with pytest.raises(TypeError, match="bogus"):
+        plugin.init()
+    assert plugin._crashes == 0
+    assert plugin._process is None or not plugin._process.is_alive()
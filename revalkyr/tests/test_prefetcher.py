@@ -0,0 +1,125 @@
+import json
+import threading
+
+from pathlib import Path
+
+from src.plugins.prefetcher import Prefetcher
+from src.services import NPM, BindingsStore, SessionStore, URLFetcher
+
+
+class FakeBindingsStore:
+    def has_known_bindings(self, module_name: str) -> bool:
+        return module_name == "Dayjs"
+
+
+class FakePlugin:
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.log = ctx.log
+
+    def get_service(self, service_type):
+        assert service_type is BindingsStore
+        return FakeBindingsStore()
+
+    def get_bindings_dir(self) -> Path:
+        return self.ctx.config.src_dir.joinpath("autobindings")
+
+
+def test_find_candidates(ctx):
+    config = ctx.config
+    config.root_dir.joinpath("package.json").write_text(
+        json.dumps({"dependencies": {"ky": "^1", "dayjs": "^1", "got": "^1"}})
+    )
+    config.src_dir.joinpath("Main.res").write_text(
+        "let a = Ky.get(url)\nlet b = Dayjs.make()\nlet c = Got.post(url)\n"
+        "let d = Js.log(a)\n"
+    )
+    config.src_dir.joinpath("Other.res").write_text("let e = Ky.post(url)\n")
+    bindings_dir = config.src_dir.joinpath("autobindings")
+    bindings_dir.mkdir()
+    # Has bindings already.
+    bindings_dir.joinpath("Got.res").write_text("let post = Foo.bar\n")
+
+    prefetcher = Prefetcher(FakePlugin(ctx), max_workers=2)
+    assert prefetcher.find_candidates() == {"Ky": {"get", "post"}}
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class FakeHTTPSession:
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    def get(self, url: str) -> FakeResponse:
+        self.calls.append(url)
+        return FakeResponse(f"<html>{url}</html>")
+
+
+def _services(ctx):
+    services = {t.__name__: t(ctx) for t in (SessionStore, NPM, URLFetcher)}
+
+    class Scheduler:
+        class http:
+            @staticmethod
+            def acquire(project, priority) -> None:
+                pass
+
+        project = "test"
+
+    def get_service(service_type):
+        name = service_type if isinstance(service_type, str) else service_type.__name__
+        return Scheduler if name == "Scheduler" else services[name]
+
+    for service in services.values():
+        service.get_service = get_service
+        service.init()
+    return services
+
+
+def test_url_fetcher_from_several_threads(ctx):
+    url_fetcher = _services(ctx)["URLFetcher"]
+    calls = []
+
+    def fetch(n: int) -> None:
+        url_fetcher._sessions.session = FakeHTTPSession(calls)
+        for i in range(50):
+            url_fetcher.get_text(f"https://example.com/{n}/{i}")
+
+    threads = [threading.Thread(target=fetch, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(20):
+        url_fetcher._get_state()
+    for thread in threads:
+        thread.join()
+
+    assert len(url_fetcher._get_state()) == 200
+    assert len(calls) == 200
+    assert url_fetcher.get_text("https://example.com/0/0") == (
+        "<html>https://example.com/0/0</html>"
+    )
+
+    url_fetcher.invalidate_prefix("https://example.com/0/")
+    assert len(url_fetcher._get_state()) == 150
+
+
+def test_http_sessions_per_thread(ctx):
+    url_fetcher = _services(ctx)["URLFetcher"]
+    sessions = []
+
+    thread = threading.Thread(
+        target=lambda: sessions.append(url_fetcher._get_session())
+    )
+    thread.start()
+    thread.join()
+
+    assert url_fetcher._get_session() is url_fetcher._get_session()
+    assert sessions[0] is not url_fetcher._get_session()
@@ -0,0 +1,107 @@
+from src.rescript.rescript_decls import (
+    Declaration,
+    DeclarationStream,
+    declared_values,
+    merge_declarations,
+    parse_declarations,
+)
+
+
+SOURCE = """\
+type t
+
+// Makes a client.
+@module("ky") external create: unit => t = "default"
+
+let get = (client, url) =>
+  client->fetch({
+    "url": url,
+  })
+"""
+
+
+def test_parse_declarations():
+    declarations = parse_declarations(SOURCE)
+
+    assert [(d.kind, d.name) for d in declarations] == [
+        ("type", "t"),
+        ("external", "create"),
+        ("let", "get"),
+    ]
+    assert declarations[1].attributes == ["module"]
+    assert declarations[1].source.startswith("// Makes a client.")
+    assert declarations[2].source.endswith("})")
+
+
+def test_recursive_declarations_stay_together():
+    declarations = parse_declarations("type rec a = B(b)\nand b = A(a)\nlet x = 1\n")
+
+    assert [d.name for d in declarations] == ["a", "x"]
+
+
+def test_escaped_names():
+    decl = Declaration('external \\"type": t => string = "type"')
+
+    assert decl.kind == "external"
+    assert decl.name == "type"
+    assert decl.key == ("value", "type")
+
+
+def test_declared_values():
+    assert declared_values(SOURCE) == {"create", "get"}
+
+
+def test_merge_replaces_by_name():
+    merged = merge_declarations(
+        SOURCE, '@module("ky") external create: string => t = "create"\n'
+    )
+
+    assert 'string => t = "create"' in merged
+    assert "unit => t" not in merged
+    assert [d.name for d in parse_declarations(merged)] == ["t", "create", "get"]
+
+
+def test_merge_let_replaces_external():
+    merged = merge_declarations(SOURCE, "let create = () => make()\n")
+
+    [create] = [d for d in parse_declarations(merged) if d.name == "create"]
+    assert create.kind == "let"
+
+
+def test_merge_adds_types_after_types_and_the_rest_at_the_end():
+    merged = merge_declarations(SOURCE, "let post = (c, url) => c\ntype options\n")
+
+    assert [d.name for d in parse_declarations(merged)] == [
+        "t",
+        "options",
+        "create",
+        "get",
+        "post",
+    ]
+
+
+def test_merge_removes():
+    merged = merge_declarations(SOURCE, "// remove: get\nlet put = 1\n")
+
+    assert [d.name for d in parse_declarations(merged)] == ["t", "create", "put"]
+    assert "remove" not in merged
+
+
+def test_stream_hands_out_complete_declarations():
+    stream = DeclarationStream()
+
+    assert stream.feed("Here you go:\n```res") == []
+    assert stream.feed("cript\ntype t\n") == []
+    # The type is only known to be complete once the next one starts.
+    assert [d.name for d in stream.feed("let make = () =>\n")] == ["t"]
+    assert stream.feed("  create()\n") == []
+    assert [d.name for d in stream.feed("```\nThat's all.")] == ["make"]
+    assert stream.finish() == []
+
+
+def test_stream_finish_flushes_an_unclosed_block():
+    stream = DeclarationStream()
+    stream.feed("```\ntype a\ntype b")
+
+    assert [d.name for d in stream.finish()] == ["b"]
+    assert stream.code == "type a\ntype b"
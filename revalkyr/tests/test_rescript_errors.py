@@ -0,0 +1,101 @@
+from pathlib import Path
+
+import pytest
+
+from src.rescript.rescript_errors import (
+    DiagnosticsDiff,
+    MissingValueCompilationError,
+    number_occurrences,
+)
+from src.services import ReScript
+
+
+def missing_value(
+    line: int, value_name: str = "get", file: str = "/p/src/Main.res"
+) -> MissingValueCompilationError:
+    error = MissingValueCompilationError(Path(file), line, value_name, "Ky")
+    error.text = f"""
+  We've found a bug for you!
+  {file}:{line}:9-14
+
+  {line} │ let a = Ky.{value_name}()
+
+  The value {value_name} can't be found in Ky
+"""
+    return error
+
+
+def test_ids_ignore_line_numbers():
+    assert missing_value(3).id == missing_value(7).id
+    assert missing_value(3).id != missing_value(3, "post").id
+    assert missing_value(3).id != missing_value(3, file="/p/src/Other.res").id
+
+
+def test_identical_errors_get_their_own_ids():
+    errors = [missing_value(3), missing_value(5), missing_value(6, "post")]
+    number_occurrences(errors)
+
+    assert [e.occurrence for e in errors] == [0, 1, 0]
+    assert len({e.id for e in errors}) == 3
+
+    # Numbering again doesn't change anything.
+    ids = [e.id for e in errors]
+    number_occurrences(errors)
+    assert [e.id for e in errors] == ids
+
+
+def test_diff_between():
+    previous = [missing_value(3), missing_value(5), missing_value(6, "post")]
+    current = [missing_value(4), missing_value(8, "put")]
+    number_occurrences(previous)
+    number_occurrences(current)
+
+    diff = DiagnosticsDiff.between(previous, current, 2)
+    assert diff.build_id == 2
+    assert [e.value_name for e in diff.new] == ["put"]
+    assert [(e.value_name, e.line) for e in diff.resolved] == [
+        ("get", 5),
+        ("post", 6),
+    ]
+    assert [(e.value_name, e.line) for e in diff.persisting] == [("get", 4)]
+
+
+@pytest.fixture
+def rescript(ctx) -> ReScript:
+    rescript = ReScript(ctx)
+    rescript.init()
+    return rescript
+
+
+def build(rescript: ReScript, *errors: MissingValueCompilationError) -> None:
+    rescript.compiler_output = "".join(e.text for e in errors) or None
+    rescript.update_diagnostics()
+
+
+def test_diagnostics_diff_per_consumer(rescript):
+    build(rescript, missing_value(3))
+
+    diff = rescript.get_diagnostics_diff("a")
+    assert len(diff.new) == 1
+
+    # Nothing is new until the next build.
+    diff = rescript.get_diagnostics_diff("a")
+    assert diff.new == [] and len(diff.persisting) == 1
+
+    build(rescript, missing_value(3), missing_value(4, "post"))
+    build(rescript)
+
+    # A consumer that missed builds sees what changed since it last looked.
+    diff = rescript.get_diagnostics_diff("a")
+    assert diff.new == [] and len(diff.resolved) == 1
+
+    diff = rescript.get_diagnostics_diff("b")
+    assert diff.new == [] and diff.resolved == []
+
+
+def test_identical_errors_in_one_build(rescript):
+    build(rescript, missing_value(3), missing_value(5))
+    assert len(rescript.get_diagnostics_diff("a").new) == 2
+
+    build(rescript, missing_value(3))
+    assert len(rescript.get_diagnostics_diff("a").resolved) == 1
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+from src.rescript.rescript_graph import (
+    ModuleGraph,
+    module_name_of,
+    scan_module_references,
+    scan_qualified_values,
+)
+
+
+SOURCE = """\
+open Belt
+module K = Ky
+// Not.used here
+let s = "Nor.here"
+let get = url => Ky.get(url)->Promise.then(Js.log)
+include Utils
+"""
+
+
+def test_module_name_of():
+    assert module_name_of(Path("src/main.res")) == "Main"
+    assert module_name_of(Path("src/Api_client.res")) == "Api_client"
+
+
+def test_scan_module_references():
+    assert scan_module_references(SOURCE) == {
+        "Belt",
+        "Ky",
+        "Promise",
+        "Js",
+        "Utils",
+    }
+
+
+def test_scan_qualified_values():
+    assert scan_qualified_values(SOURCE) == {
+        "Ky": {"get"},
+        "Promise": {"then"},
+        "Js": {"log"},
+    }
+
+
+def test_order_puts_dependencies_first():
+    graph = ModuleGraph()
+    graph.update(Path("src/App.res"), {"Api", "Ky"})
+    graph.update(Path("src/Api.res"), {"Ky", "Api"})
+    graph.update(Path("src/Ky.res"), set())
+
+    assert len(graph) == 3
+    assert graph.order(["App", "Api", "Ky"]) == ["Ky", "Api", "App"]
+    # Unknown modules have no dependencies.
+    assert graph.order(["App", "Other"]) == ["Other", "App"]
+
+
+def test_order_with_a_cycle():
+    graph = ModuleGraph()
+    graph.update(Path("src/A.res"), {"B"})
+    graph.update(Path("src/B.res"), {"A"})
+    graph.update(Path("src/C.res"), {"A"})
+
+    assert graph.order(["C", "A", "B"])[-1] == "C"
+
+
+def test_remove():
+    graph = ModuleGraph()
+    graph.update(Path("src/App.res"), {"Api"})
+    graph.update(Path("src/Api.res"), set())
+
+    graph.remove(Path("src/App.res"))
+    graph.remove(Path("src/Missing.res"))
+
+    assert "App" not in graph
+    assert "Api" in graph
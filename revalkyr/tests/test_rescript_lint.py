@@ -0,0 +1,65 @@
+from src.rescript.rescript_decls import Declaration
+from src.rescript.rescript_lint import autofix, check_declaration
+
+
+def test_clean_source_is_left_alone():
+    source = """type t
+
+@module("ky") external get: string => promise<t> = "get"
+"""
+    assert autofix(source) == (source, [], [])
+
+
+def test_module_with_send():
+    source = '@module("ky") @send external json: t => promise<Js.Json.t> = "json"\n'
+
+    assert "@module and @send" in check_declaration(Declaration(source))
+
+    fixed_source, fixed, remaining = autofix(source)
+    assert [p.rule for p in fixed] == ["module-with-send"]
+    assert remaining == []
+    assert "@module" not in fixed_source
+    assert "@send external json" in fixed_source
+
+
+def test_builtin_redefinitions_are_dropped():
+    source = """type string = Js.String.t
+
+module Js = {
+  let log = x => x
+}
+
+type t
+"""
+    fixed_source, fixed, remaining = autofix(source)
+    assert [p.rule for p in fixed] == ["builtin-redefinition"] * 2
+    assert fixed_source.strip() == "type t"
+
+
+def test_the_last_duplicate_wins():
+    source = """type t
+
+@module("ky") external get: string => t = "get"
+
+@module("ky") external get: string => promise<t> = "get"
+"""
+    fixed_source, fixed, remaining = autofix(source)
+    assert [p.rule for p in fixed] == ["duplicate"]
+    assert "promise<t>" in fixed_source
+    assert fixed_source.count("external get") == 1
+
+
+def test_a_let_can_shadow_an_external():
+    source = """@module("ky") external get: (string, 'options) => promise<t> = "get"
+
+let get = url => get(url, Js.Obj.empty())
+"""
+    assert autofix(source) == (source, [], [])
+
+
+def test_unbalanced_source():
+    source = "type t = {\n  a: int,\n"
+
+    fixed_source, fixed, remaining = autofix(source)
+    assert fixed_source == source
+    assert [p.rule for p in remaining] == ["unbalanced"]
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from src.services import scheduler
+from src.services.scheduler import (
+    Priority,
+    RequestScheduler,
+    TokenBucket,
+    backoff_delay,
+    parse_duration,
+    retry_after,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(scheduler.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket(clock):
+    bucket = TokenBucket(60, period=60.0)
+
+    assert bucket.wait_time(60) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1) == 1.0
+
+    clock[0] += 30.0
+    assert bucket.wait_time(30) == 0.0
+    assert bucket.wait_time(40) == 10.0
+
+    # Never fills past capacity.
+    clock[0] += 600.0
+    bucket.refill()
+    assert bucket.level == 60
+
+
+def test_token_bucket_lets_oversized_requests_through_when_full(clock):
+    bucket = TokenBucket(10)
+
+    assert bucket.wait_time(100) == 0.0
+    bucket.take(100)
+    assert bucket.level == 0
+
+
+def test_token_bucket_sync(clock):
+    bucket = TokenBucket(60)
+
+    bucket.sync(120, 100)
+    assert bucket.capacity == 120
+    assert bucket.level == 60
+
+    # Remaining only ever lowers the level.
+    bucket.sync(None, 10)
+    assert bucket.capacity == 120
+    assert bucket.level == 10
+
+
+@pytest.mark.parametrize(
+    "s, seconds",
+    [("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("1h", 3600.0), ("2.5", 2.5)],
+)
+def test_parse_duration(s, seconds):
+    assert parse_duration(s) == pytest.approx(seconds)
+
+
+def test_parse_duration_garbage():
+    assert parse_duration("soon") is None
+    assert parse_duration(None) is None
+    assert retry_after({}) is None
+    assert retry_after({"retry-after": "3"}) == 3.0
+
+
+def test_backoff_delay():
+    assert [backoff_delay(attempt, 0.5, 3.0) for attempt in range(4)] == [
+        0.5,
+        1.0,
+        2.0,
+        3.0,
+    ]
+
+
+def test_update_limits():
+    s = RequestScheduler("ai", 500, 1000)
+    s.update_limits(
+        {
+            "x-ratelimit-limit-requests": "100",
+            "x-ratelimit-remaining-requests": "5",
+            "x-ratelimit-limit-tokens": "bad",
+        }
+    )
+
+    assert s.requests.capacity == 100
+    assert s.requests.level <= 5
+    assert s.tokens.capacity == 1000
+
+
+def test_waiting_requests_by_priority_then_round_robin():
+    s = RequestScheduler("http", 6000)
+    s.back_off(0.5)
+    order = []
+
+    def request(name: str, project: str, priority: Priority):
+        s.acquire(project, priority)
+        order.append(name)
+
+    requests = [
+        ("a1", "a", Priority.BACKGROUND),
+        ("a2", "a", Priority.BACKGROUND),
+        ("b1", "b", Priority.BACKGROUND),
+        ("c1", "c", Priority.USER_BLOCKING),
+    ]
+    threads = []
+    for args in requests:
+        thread = threading.Thread(target=request, args=args)
+        thread.start()
+        threads.append(thread)
+        # So that they queue up in order.
+        while len(s._waiting) < len(threads):
+            time.sleep(0.01)
+
+    for thread in threads:
+        thread.join(5)
+
+    # a was served more recently than b, so b goes before a2.
+    assert order == ["c1", "a1", "b1", "a2"]
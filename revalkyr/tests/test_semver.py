@@ -0,0 +1,121 @@
+import pytest
+
+from src.utils.semver import parse_version, satisfies
+
+
+@pytest.mark.parametrize(
+    "s, expected",
+    [
+        ("1.2.3", (1, 2, 3)),
+        ("v1.2.3", (1, 2, 3)),
+        ("=1.2.3", (1, 2, 3)),
+        ("1.2", (1, 2, 0)),
+        ("1.x", (1, 0, 0)),
+        ("1.2.3-beta.1", (1, 2, 3)),
+        ("1.2.3+build", (1, 2, 3)),
+        ("latest", None),
+    ],
+)
+def test_parse_version(s, expected):
+    assert parse_version(s) == expected
+
+
+@pytest.mark.parametrize(
+    "version, spec, expected",
+    [
+        # Exact and wildcard
+        ("1.2.3", "1.2.3", True),
+        ("1.2.4", "1.2.3", False),
+        ("1.2.3", "=1.2.3", True),
+        ("1.2.3", "v1.2.3", True),
+        ("1.2.3", "*", True),
+        ("1.2.3", "", True),
+        ("1.2.3", "x", True),
+        ("1.2.3", "latest", True),
+        ("1.2.3", "1.x", True),
+        ("2.0.0", "1.x", False),
+        ("1.2.9", "1.2.x", True),
+        ("1.3.0", "1.2.x", False),
+        ("1.9.9", "1", True),
+        ("2.0.0", "1", False),
+        ("1.4.5", "1.4", True),
+        ("1.5.0", "1.4", False),
+        # Caret
+        ("1.5.0", "^1.2.0", True),
+        ("1.1.9", "^1.2.0", False),
+        ("2.0.0", "^1.2.0", False),
+        ("0.2.5", "^0.2.3", True),
+        ("0.3.0", "^0.2.3", False),
+        ("0.0.3", "^0.0.3", True),
+        ("0.0.4", "^0.0.3", False),
+        ("0.9.0", "^0", True),
+        ("0.2.9", "^0.2", True),
+        ("0.3.0", "^0.2", False),
+        # Tilde
+        ("1.2.9", "~1.2.3", True),
+        ("1.3.0", "~1.2.3", False),
+        ("1.2.0", "~1.2", True),
+        ("1.9.0", "~1", True),
+        ("2.0.0", "~1", False),
+        ("1.2.5", "~>1.2.3", True),
+        # Comparisons with full versions
+        ("1.0.0", ">=1.0.0", True),
+        ("0.9.9", ">=1.0.0", False),
+        ("1.0.1", ">1.0.0", True),
+        ("1.0.0", ">1.0.0", False),
+        ("1.0.0", "<=1.0.0", True),
+        ("0.9.9", "<1.0.0", True),
+        ("1.0.0", "<1.0.0", False),
+        # Comparisons with partial versions
+        ("1.5.0", ">1", False),
+        ("2.0.0", ">1", True),
+        ("1.4.9", ">1.4", False),
+        ("1.5.0", ">1.4", True),
+        ("1.0.0", ">=1", True),
+        ("0.9.9", ">=1", False),
+        ("1.4.5", "<=1.4", True),
+        ("1.5.0", "<=1.4", False),
+        ("1.9.9", "<=1", True),
+        ("2.0.0", "<=1", False),
+        ("1.3.9", "<1.4", True),
+        ("1.4.0", "<1.4", False),
+        # Whitespace after operators
+        ("1.0.0", ">= 1.0.0", True),
+        ("1.5.0", ">=  1.0.0 < 2", True),
+        ("2.0.0", ">= 1.0.0 < 2", False),
+        ("1.2.5", "^ 1.2.3", True),
+        # Intersections and unions
+        ("1.5.0", ">=1 <3", True),
+        ("3.0.0", ">=1 <3", False),
+        ("2.1.5", "~2.1.0 || 3.x", True),
+        ("3.4.0", "~2.1.0 || 3.x", True),
+        ("2.2.0", "~2.1.0 || 3.x", False),
+        # Hyphen ranges
+        ("1.0.0", "1.0.0 - 2.0.0", True),
+        ("2.0.0", "1.0.0 - 2.0.0", True),
+        ("2.0.1", "1.0.0 - 2.0.0", False),
+        ("2.0.5", "1.0.0 - 2.0", True),
+        ("2.1.0", "1.0.0 - 2.0", False),
+        ("2.9.9", "1.0.0 - 2", True),
+        ("3.0.0", "1.0.0 - 2", False),
+        ("1.0.0", "1 - 2", True),
+        ("0.9.9", "1 - 2", False),
+        # Pre-releases
+        ("1.2.3-beta", "^1.2.3", False),
+        ("1.2.3-beta", "*", False),
+        ("1.2.3-beta", "1.2.3-beta", True),
+        ("1.2.3-beta.2", "^1.2.3-beta.1", True),
+        ("1.2.3-beta.0", "^1.2.3-beta.1", False),
+        ("1.2.4-beta", "^1.2.3-beta.1", False),
+        ("1.2.3", "^1.2.3-beta.1", True),
+        ("1.2.3-alpha", ">=1.2.3-beta", False),
+        # Versions as tuples
+        ((1, 2, 3), "^1", True),
+        ((2, 0, 0), "^1", False),
+        # Versions that aren't versions
+        ("latest", "*", False),
+        ("1.2.3", "not a range", False),
+    ],
+)
+def test_satisfies(version, spec, expected):
+    assert satisfies(version, spec) is expected
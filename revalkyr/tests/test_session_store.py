@@ -0,0 +1,75 @@
+import json
+
+from src.services import SessionStore
+
+
+def test_saves_only_dirty_sections(ctx):
+    session = SessionStore(ctx)
+    calls = []
+
+    def provider(name: str, value: any):
+        def get() -> any:
+            calls.append(name)
+            return value
+
+        return get
+
+    session.register("a", provider("a", {"x": 1}))
+    session.register("b", provider("b", [1, 2]))
+
+    session.save()
+    assert calls == []
+    assert not session.file.exists()
+
+    session.mark_dirty("a")
+    session.save()
+    assert calls == ["a"]
+    assert json.loads(session.file.read_text()) == {"a": {"x": 1}}
+
+    session.mark_dirty("b")
+    session.save()
+    assert calls == ["a", "b"]
+    assert json.loads(session.file.read_text()) == {"a": {"x": 1}, "b": [1, 2]}
+
+    # Saved once, nothing dirty since.
+    session.save()
+    assert calls == ["a", "b"]
+
+
+def test_a_later_session_reads_what_was_saved(ctx):
+    session = SessionStore(ctx)
+    session.register("a", lambda: {"x": 1})
+    session.mark_dirty("a")
+    session.save()
+
+    assert SessionStore(ctx).get("a") == {"x": 1}
+    assert SessionStore(ctx).get("b", "default") == "default"
+
+
+def test_a_failing_provider_doesnt_stop_the_others(ctx):
+    session = SessionStore(ctx)
+
+    def fail() -> any:
+        raise ConnectionError("gone")
+
+    session.register("a", fail)
+    session.register("b", lambda: 2)
+    session.mark_dirty("a")
+    session.mark_dirty("b")
+    session.save()
+
+    assert json.loads(session.file.read_text()) == {"b": 2}
+
+
+def test_unregister_where(ctx):
+    session = SessionStore(ctx)
+    session.register("a", lambda: 1)
+    session.mark_dirty("a")
+    session.save()
+
+    session.unregister_where(lambda provider: provider() == 1)
+    session.mark_dirty("a")
+    session.save()
+
+    # The section keeps what was last saved.
+    assert json.loads(session.file.read_text()) == {"a": 1}